@@ -0,0 +1,130 @@
+import asyncio
+import json
+import time
+
+from metrics import Attempts, swallowed, timed
+from waits import POLL_INTERVAL
+
+
+# Seconds an action may take in total, across every strategy, before it gives up.
+CLICK_BUDGET = 8
+NAVIGATION_BUDGET = 15
+# A popup that may or may not follow a click.
+OPTIONAL_BUDGET = 2
+# How long a clicked strategy gets to show an effect before the next one is tried.
+VERIFY_TIMEOUT = 5
+
+TEXT_SCOPE = "a, button, li, div, span"
+
+# Tries every strategy in order inside the page and clicks the first one that matches,
+# so a miss costs one round trip instead of a find() timeout per strategy.
+CLICK_FIRST_JS = """
+    (function(strategies) {
+        function textOf(element) {
+            return (element.textContent || '').trim();
+        }
+
+        function matchesText(element, strategy) {
+            const text = textOf(element);
+            if (strategy.text !== null && (strategy.exact ? text !== strategy.text : !text.includes(strategy.text))) {
+                return false;
+            }
+            if (strategy.skip_active && element.closest('li._active')) {
+                return false;
+            }
+            return strategy.contains.every(part => text.includes(part));
+        }
+
+        function roots(strategy) {
+            if (!strategy.within) {
+                return [document];
+            }
+            return Array.from(document.querySelectorAll(strategy.within.selector)).filter(container => {
+                const label = container.querySelector(strategy.within.label);
+                return label && textOf(label).includes(strategy.within.text);
+            });
+        }
+
+        function find(strategy) {
+            if (strategy.kind === 'call') {
+                const path = strategy.function.split('.');
+                const name = path.pop();
+                const owner = path.reduce((object, part) => object && object[part], window);
+                return owner && typeof owner[name] === 'function' ? () => owner[name]() : null;
+            }
+
+            for (const root of roots(strategy)) {
+                if (strategy.kind === 'selector') {
+                    const element = root.querySelector(strategy.selector);
+                    if (element) {
+                        const target = (strategy.child && element.querySelector(strategy.child)) || element;
+                        return () => target.click();
+                    }
+                } else {
+                    const elements = Array.from(root.querySelectorAll(strategy.scope)).filter(element => matchesText(element, strategy));
+                    // Ancestors contain the same text, so click the innermost match.
+                    const element = elements.find(element => !elements.some(other => other !== element && element.contains(other)));
+                    if (element) {
+                        return () => element.click();
+                    }
+                }
+            }
+            return null;
+        }
+
+        for (const strategy of strategies) {
+            const click = find(strategy);
+            if (click) {
+                click();
+                return strategy.name;
+            }
+        }
+        return null;
+    })
+"""
+
+
+def by_selector(name: str, selector: str, child: str = None):
+    return {"name": name, "kind": "selector", "selector": selector, "child": child, "within": None}
+
+
+def by_text(name: str, text: str = None, scope: str = TEXT_SCOPE, exact=True, contains=(), skip_active=False, within=None):
+    return {"name": name, "kind": "text", "text": text, "scope": scope, "exact": exact, "contains": list(contains), "skip_active": skip_active, "within": within}
+
+
+def by_call(name: str, function: str):
+    return {"name": name, "kind": "call", "function": function}
+
+
+def within(selector: str, label: str, text: str):
+    return {"selector": selector, "label": label, "text": text}
+
+
+async def click_first(page, action: str, strategies, budget=CLICK_BUDGET, verify=None, verify_timeout=VERIFY_TIMEOUT):
+    attempts = Attempts(action)
+    deadline = time.monotonic() + budget
+    strategies = list(strategies)
+
+    while strategies:
+        try:
+            # A page that hangs mid-navigation never answers, so the evaluate itself is held to the budget.
+            winner = await asyncio.wait_for(page.evaluate(f"{CLICK_FIRST_JS}({json.dumps(strategies)})"), max(0.0, deadline - time.monotonic()))
+        except Exception as e:
+            swallowed(f"{action}.click_first", e)
+            winner = None
+
+        if winner:
+            if verify is None or await verify(max(0.0, min(verify_timeout, deadline - time.monotonic()))):
+                attempts.won(winner)
+                return winner
+            # The click went through but had no effect, so fall back to the next strategy.
+            strategies = [strategy for strategy in strategies if strategy["name"] != winner]
+        elif time.monotonic() < deadline:
+            with timed("wait"):
+                await asyncio.sleep(POLL_INTERVAL)
+
+        if time.monotonic() >= deadline:
+            break
+
+    attempts.lost()
+    return None
@@ -0,0 +1,201 @@
+import argparse
+from array import array
+from datetime import datetime
+
+from stream import iter_ndjson
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# The same time on two dates is two shows. Streams written before the date was recorded have an empty date.
+KEY_FIELDS = ("city", "event_code", "movie_type", "language", "cinema", "date", "time")
+DEFAULT_WINDOW = 60 * 60
+
+
+def require_numpy():
+    if np is None:
+        raise ImportError("analytics.py needs numpy: pip install numpy")
+
+
+class History:
+    def __init__(self, shows, show, scraped_at, available, blocked, total):
+        require_numpy()
+        self.shows = shows
+
+        # Rows are kept ordered by (show, scraped_at) so every show is one contiguous run.
+        order = np.lexsort((scraped_at, show))
+        self.show = show[order]
+        self.scraped_at = scraped_at[order]
+        self.available = available[order]
+        self.blocked = blocked[order]
+        self.total = total[order]
+
+    def __len__(self):
+        return len(self.show)
+
+    def last_rows(self):
+        if not len(self):
+            return np.zeros(0, dtype=np.intp)
+        return np.append(np.flatnonzero(np.diff(self.show)), len(self) - 1)
+
+
+def load_history(filenames) -> History:
+    require_numpy()
+    shows = {}
+    show, scraped_at = array("I"), array("d")
+    available, blocked, total = array("i"), array("i"), array("i")
+
+    for filename in filenames:
+        for record in iter_ndjson(filename):
+            if "scraped_at" not in record:
+                continue
+
+            key = tuple(record.get(field) or "" for field in KEY_FIELDS)
+            show.append(shows.setdefault(key, len(shows)))
+            scraped_at.append(record["scraped_at"])
+            available.append(record["available_seats"])
+            blocked.append(record["blocked_seats"])
+            total.append(record["total_seats"])
+
+    return History(
+        list(shows),
+        np.frombuffer(show, dtype=np.uint32),
+        np.frombuffer(scraped_at, dtype=np.float64),
+        np.frombuffer(available, dtype=np.int32),
+        np.frombuffer(blocked, dtype=np.int32),
+        np.frombuffer(total, dtype=np.int32)
+    )
+
+
+def fill_rates(history: History):
+    rows = history.last_rows()
+    total = history.total[rows]
+    rates = np.divide(history.blocked[rows], total, out=np.zeros(len(rows)), where=total > 0)
+    return history.show[rows], rates
+
+
+def group_fill_rates(history: History, by="cinema") -> dict:
+    rows = history.last_rows()
+    field = KEY_FIELDS.index(by)
+    labels = np.array([history.shows[show][field] for show in history.show[rows]])
+
+    groups, inverse = np.unique(labels, return_inverse=True)
+    blocked = np.bincount(inverse, weights=history.blocked[rows], minlength=len(groups))
+    total = np.bincount(inverse, weights=history.total[rows], minlength=len(groups))
+    rates = np.divide(blocked, total, out=np.zeros(len(groups)), where=total > 0)
+
+    return dict(zip(groups.tolist(), rates.tolist()))
+
+
+def booking_velocity(history: History, window=DEFAULT_WINDOW):
+    if not len(history):
+        return np.zeros(0)
+
+    # Encode (show, time) as one sortable float so a single searchsorted finds the
+    # first row of the same show inside the trailing window.
+    relative = history.scraped_at - history.scraped_at.min()
+    span = relative.max() + window + 1
+    position = history.show.astype(np.float64) * span + relative
+    start = np.searchsorted(position, position - window, side="left")
+
+    elapsed = history.scraped_at - history.scraped_at[start]
+    booked = (history.blocked - history.blocked[start]).astype(np.float64)
+    return np.divide(booked * 3600, elapsed, out=np.zeros(len(history)), where=elapsed > 0)
+
+
+def parse_show_dates(dates, fallback):
+    # "YYYYMMDD" strings to datetime64[D]; anything else takes the fallback day.
+    valid = (np.char.str_len(dates) == 8) & np.char.isdigit(dates)
+    digits = np.where(valid, dates, "19700101").astype(np.int64)
+    months = ((digits // 10000 - 1970) * 12 + digits // 100 % 100 - 1).astype("datetime64[M]")
+    days = months.astype("datetime64[D]") + (digits % 100 - 1)
+    return np.where(valid, days, fallback)
+
+
+def parse_show_times(times):
+    # "10:15 AM" style times to minutes after midnight, NaN where a time does not parse.
+    compact = np.char.replace(np.char.upper(times), " ", "")
+    hours, _, rest = np.moveaxis(np.char.partition(compact, ":"), -1, 0)
+    minutes, meridiem = rest.astype("U2"), np.char.lstrip(rest, "0123456789")
+    valid = (np.char.isdigit(hours) & (np.char.str_len(hours) <= 2) & np.char.isdigit(minutes) & (np.char.str_len(rest) == 4)
+             & ((meridiem == "AM") | (meridiem == "PM")))
+
+    hour = np.where(valid, hours, "0").astype(np.int64)
+    minute = np.where(valid, minutes, "0").astype(np.int64)
+    valid &= (hour >= 1) & (hour <= 12) & (minute < 60)
+    return np.where(valid, (hour % 12 + (meridiem == "PM") * 12) * 60 + minute, np.nan)
+
+
+def show_start_times(history: History, shows):
+    if not len(shows):
+        return np.zeros(0)
+
+    first_rows = np.searchsorted(history.show, shows, side="left")
+    keys = [history.shows[show] for show in shows.tolist()]
+    dates = np.array([key[KEY_FIELDS.index("date")] for key in keys], dtype=str)
+    times = np.array([key[KEY_FIELDS.index("time")] for key in keys], dtype=str)
+
+    # Shows without a date of their own fall back to the local day they were first scraped on.
+    scraped_at = history.scraped_at[first_rows]
+    offset = datetime.fromtimestamp(scraped_at[0]).astimezone().utcoffset().total_seconds()
+    scraped_on = ((scraped_at + offset) // 86400).astype(np.int64).astype("datetime64[D]")
+    days = parse_show_dates(dates, scraped_on)
+
+    # Local midnight is looked up once per distinct day, which also follows DST changes between them.
+    unique_days, inverse = np.unique(days, return_inverse=True)
+    midnights = np.array([datetime.fromisoformat(str(day)).timestamp() for day in unique_days])
+    return midnights[inverse] + parse_show_times(times) * 60
+
+
+def sellout_forecast(history: History, window=DEFAULT_WINDOW) -> dict:
+    rows = history.last_rows()
+    velocity = booking_velocity(history, window)[rows]
+    available = history.available[rows].astype(np.float64)
+    last_seen = history.scraped_at[rows]
+
+    eta = np.full(len(rows), np.inf)
+    selling = velocity > 0
+    eta[selling] = last_seen[selling] + available[selling] / velocity[selling] * 3600
+    eta[available <= 0] = last_seen[available <= 0]
+
+    shows = history.show[rows]
+    starts = show_start_times(history, shows)
+
+    return {
+        "show": shows,
+        "velocity": velocity,
+        "available": history.available[rows],
+        "sellout_at": eta,
+        "show_at": starts,
+        "sells_out": eta <= np.nan_to_num(starts, nan=np.inf)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill rates, booking velocity and sell-out forecasts from NDJSON showtime streams")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--by", default="cinema", choices=KEY_FIELDS)
+    parser.add_argument("--window", type=float, default=DEFAULT_WINDOW, help="Rolling window for booking velocity, in seconds")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    history = load_history(args.files)
+    print(f"Loaded {len(history)} rows for {len(history.shows)} showtimes\n")
+
+    print(f"Fill rate by {args.by}:")
+    for label, rate in sorted(group_fill_rates(history, args.by).items(), key=lambda item: -item[1]):
+        print(f"  {rate:6.1%}  {label}")
+
+    forecast = sellout_forecast(history, args.window)
+    order = np.argsort(-forecast["velocity"])[:args.top]
+    print(f"\nFastest selling showtimes (seats/hour over the last {args.window / 60:.0f} min):")
+    for i in order:
+        key = dict(zip(KEY_FIELDS, history.shows[forecast["show"][i]]))
+        sellout = forecast["sellout_at"][i]
+        when = datetime.fromtimestamp(sellout).strftime("%Y-%m-%d %H:%M") if np.isfinite(sellout) else "-"
+        flag = "sells out" if forecast["sells_out"][i] else ""
+        print(f"  {forecast['velocity'][i]:7.1f}  {key['cinema']} {key['time']} ({key['movie_type']}, {key['language']})"
+              f"  {forecast['available'][i]} left, forecast {when} {flag}")
@@ -0,0 +1,272 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import cloudscraper
+
+import discovery
+from discovery import buytickets_url, parse_initial_state
+from metrics import swallowed
+from models import Cinema, Showtime
+from occupancy import AVAILABLE, BLOCKED, OTHER, seat_map_from_html
+from seats import count_seats_in_html
+
+
+SEAT_LAYOUT_PATH = "/serv/getData"
+DEFAULT_WORKERS = 16
+
+TIME_PATTERN = re.compile(r'(\d{1,2}:\d{2}\s*(?:AM|PM))', re.IGNORECASE)
+
+VENUE_CODE_KEYS = ("venueCode", "VenueCode")
+VENUE_NAME_KEYS = ("venueName", "VenueName", "name", "title")
+SHOWTIMES_KEYS = ("showtimes", "ShowTimes", "sessions")
+SESSION_ID_KEYS = ("sessionId", "SessionId")
+SHOW_TIME_KEYS = ("showTime", "ShowTime", "title")
+SHOW_DATE_KEYS = ("showDate", "ShowDate", "showDateCode", "ShowDateCode", "date")
+SEAT_STATUS_KEYS = ("status", "seatStatus", "SeatStatus")
+SEAT_ID_KEYS = ("id", "seatId", "SeatId", "seatName", "SeatName")
+ROW_LABEL_KEYS = ("row", "rowName", "RowName")
+
+SKIPPED_ERROR = "Skipped, crawl budget used up"
+
+AVAILABLE_STATUSES = {"available", "a"}
+BLOCKED_STATUSES = {"blocked", "booked", "sold", "unavailable", "b"}
+
+
+def skipped_cinema(name: str, venue_code: str = None) -> Cinema:
+    # Left out on purpose, so consumers keep what they already know about the cinema.
+    return Cinema(name, (), venue_code, SKIPPED_ERROR, skipped=True)
+
+
+def _first(data: dict, keys):
+    for key in keys:
+        value = data.get(key)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _with_additional_data(data: dict) -> dict:
+    additional = data.get("additionalData")
+    if isinstance(additional, dict):
+        return {**data, **additional}
+    return data
+
+
+def _iter_dicts(value):
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            yield item
+            stack.extend(reversed(list(item.values())))
+        elif isinstance(item, list):
+            stack.extend(reversed(item))
+
+
+def _parse_showtime(showtime: dict):
+    showtime = _with_additional_data(showtime)
+    session_id = _first(showtime, SESSION_ID_KEYS)
+    time_match = TIME_PATTERN.search(str(_first(showtime, SHOW_TIME_KEYS) or ""))
+
+    if session_id is None or not time_match:
+        return None
+
+    parsed = {"time": time_match.group(1).strip(), "session_id": str(session_id)}
+
+    date_digits = re.sub(r"\D", "", str(_first(showtime, SHOW_DATE_KEYS) or ""))
+    if len(date_digits) >= 8:
+        parsed["date"] = date_digits[:8]
+
+    return parsed
+
+
+def extract_venues(state) -> list:
+    venues = []
+    seen = set()
+
+    for item in _iter_dicts(state):
+        showtimes = _first(item, SHOWTIMES_KEYS)
+        if not isinstance(showtimes, list):
+            continue
+
+        venue = _with_additional_data(item)
+        venue_code = _first(venue, VENUE_CODE_KEYS)
+        if not venue_code or venue_code in seen:
+            continue
+
+        sessions = [parsed for parsed in map(_parse_showtime, showtimes) if parsed]
+        if not sessions:
+            continue
+
+        seen.add(venue_code)
+        venues.append({
+            "name": str(_first(venue, VENUE_NAME_KEYS) or "Unknown Cinema").strip(),
+            "venue_code": venue_code,
+            "sessions": sessions
+        })
+
+    return venues
+
+
+def fetch_venues(session: cloudscraper.CloudScraper, city: str, movie_slug: str, event_code: str):
+    response = session.get(buytickets_url(city, movie_slug, event_code))
+    if response.status_code != 200:
+        return None
+
+    state = parse_initial_state(response.text)
+    if state is None:
+        return None
+
+    return extract_venues(state)
+
+
+def seat_layout_url(venue_code: str, session_id: str) -> str:
+    return f"{discovery.BASE_URL}{SEAT_LAYOUT_PATH}?cmd=GETSEATLAYOUT&venueCode={venue_code}&sessionId={session_id}"
+
+
+def count_seats_in_layout(layout):
+    available = 0
+    blocked = 0
+
+    for item in _iter_dicts(layout):
+        status = _first(item, SEAT_STATUS_KEYS)
+        if status is None:
+            continue
+
+        status = str(status).strip().lower()
+        if status in AVAILABLE_STATUSES:
+            available += 1
+        elif status in BLOCKED_STATUSES:
+            blocked += 1
+
+    return {"available": available, "blocked": blocked, "total": available + blocked}
+
+
+def seat_map_from_layout(layout):
+    seats = []
+    statuses = []
+
+    def visit(value, label):
+        if isinstance(value, list):
+            for item in value:
+                visit(item, label)
+            return
+        if not isinstance(value, dict):
+            return
+
+        status = _first(value, SEAT_STATUS_KEYS)
+        if status is None:
+            label = str(_first(value, ROW_LABEL_KEYS) or label)
+            for item in value.values():
+                visit(item, label)
+            return
+
+        status = str(status).strip().lower()
+        seat_id = _first(value, SEAT_ID_KEYS)
+        seats.append(str(seat_id) if seat_id is not None else f"{label}|{len(seats)}")
+        statuses.append(str(AVAILABLE if status in AVAILABLE_STATUSES else BLOCKED if status in BLOCKED_STATUSES else OTHER))
+
+    visit(layout, "")
+    return {"seats": seats, "statuses": "".join(statuses)} if seats else None
+
+
+def fetch_seat_counts(session: cloudscraper.CloudScraper, venue_code: str, session_id: str, seat_map=False):
+    response = session.get(seat_layout_url(venue_code, session_id))
+    if response.status_code != 200:
+        return None
+
+    if "setmain" in response.text:
+        counts = count_seats_in_html(response.text)
+        if seat_map:
+            counts["seat_map"] = seat_map_from_html(response.text)
+    else:
+        layout = response.json()
+        counts = count_seats_in_layout(layout)
+        if seat_map:
+            counts["seat_map"] = seat_map_from_layout(layout)
+
+    return counts if counts["total"] else None
+
+
+def _fetch_showtime(session, venue, showtime, seat_maps=False):
+    try:
+        return fetch_seat_counts(session, venue["venue_code"], showtime["session_id"], seat_maps)
+    except Exception as e:
+        swallowed("api.fetch_showtime", e)
+        return None
+
+
+def crawl_event_over_http(session: cloudscraper.CloudScraper, city: str, movie_slug: str, event_code: str, limit=None, workers=DEFAULT_WORKERS, select=None, seat_maps=False, completed=None):
+    try:
+        venues = fetch_venues(session, city, movie_slug, event_code)
+    except Exception as e:
+        print(f"Error fetching showtimes over HTTP: {e}")
+        return None
+
+    if not venues:
+        return None
+
+    skipped = []
+    if select:
+        # Venues the planner leaves out are reported as skipped rather than dropped.
+        selected = select(venues)
+        chosen = {id(venue) for venue in selected}
+        skipped = [venue for venue in venues if id(venue) not in chosen]
+        venues = selected
+    else:
+        venues = venues[:limit]
+    # Showtimes a resumed run already streamed are neither fetched nor returned again.
+    done = {venue["venue_code"]: completed(venue) if completed else set() for venue in venues}
+    jobs = [(venue, showtime) for venue in venues for showtime in venue["sessions"] if showtime["time"] not in done[venue["venue_code"]]]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        counts = list(executor.map(lambda job: _fetch_showtime(session, *job, seat_maps), jobs))
+
+    results = dict(zip(((venue["venue_code"], showtime["session_id"]) for venue, showtime in jobs), counts))
+
+    cinemas = []
+    for i, venue in enumerate(venues):
+        cinema_info = {
+            "name": venue["name"],
+            "first_time_slot": venue["sessions"][0]["time"],
+            "position": i + 1,
+            "venue_code": venue["venue_code"],
+            "sessions": venue["sessions"]
+        }
+
+        showtimes_data = []
+        showtime_seat_maps = {}
+        complete = True
+        for showtime in venue["sessions"]:
+            if showtime["time"] in done[venue["venue_code"]]:
+                continue
+
+            seat_data = results[(venue["venue_code"], showtime["session_id"])]
+            if seat_data is None:
+                complete = False
+                break
+
+            showtimes_data.append(Showtime(showtime["time"], seat_data["available"], seat_data["blocked"], seat_data["total"], showtime["session_id"], showtime.get("date")))
+            if seat_data.get("seat_map"):
+                showtime_seat_maps[showtime["session_id"]] = seat_data["seat_map"]
+
+        # Cinemas without a result are left for the browser flow.
+        if complete:
+            cinema_info["result"] = Cinema(venue["name"], tuple(showtimes_data), venue["venue_code"])
+            # Kept apart from the showtimes so the seat maps never reach the output or the checkpoint.
+            if seat_maps:
+                cinema_info["seat_maps"] = showtime_seat_maps
+
+        cinemas.append(cinema_info)
+
+    for venue in skipped:
+        cinemas.append({
+            "name": venue["name"],
+            "first_time_slot": venue["sessions"][0]["time"],
+            "position": None,
+            "venue_code": venue["venue_code"],
+            "sessions": venue["sessions"],
+            "result": skipped_cinema(venue["name"], venue["venue_code"])
+        })
+
+    return cinemas
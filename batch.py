@@ -0,0 +1,317 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import NamedTuple
+
+import cloudscraper
+import zendriver as zd
+
+from discovery import fetch_movie_formats
+from blocking import ResourceBlocker, add_blocking_arguments, blocker_from_args
+from checkpoint import Checkpoint
+from clearance import ClearanceStore, add_clearance_arguments, clearance_from_args
+from daemon import add_daemon_arguments, open_browser
+from main import scrape_movie
+from metrics import profiled, reset, swallowed, write_metrics
+from models import BINARY_SUFFIX
+from occupancy import OccupancyStore
+from planner import CrawlPlanner, add_planner_arguments, load_capacities, planner_from_args
+from ratelimit import RateController, add_ratelimit_arguments, in_thread, limiter_from_args
+from search import SearchCache, get_movie_name, resolve_movies
+from tabpool import DEFAULT_MAX_TABS
+
+
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_OUTPUT_DIR = "outputs"
+
+
+class JobOptions(NamedTuple):
+    # Passed whole from run_batch down to scrape_movie, so adding an option never shifts another one.
+    max_tabs: int = DEFAULT_MAX_TABS
+    output_dir: str = DEFAULT_OUTPUT_DIR
+    changes_file: str = None
+    resume: bool = False
+    occupancy_dir: str = None
+    metrics: bool = False
+    profile: bool = False
+    blocker: ResourceBlocker = None
+    planner: CrawlPlanner = None
+    daemon: str = None
+    clearance: ClearanceStore = None
+    limiter: RateController = None
+    binary: bool = False
+
+
+def parse_job(text: str) -> dict:
+    for separator in (":", ","):
+        if separator in text:
+            city, movie = text.split(separator, 1)
+            return {"city": city.strip(), "movie": movie.strip()}
+    raise ValueError(f"Invalid job '{text}', expected 'city:movie name'")
+
+
+def load_jobs(filename: str) -> list:
+    with open(filename, "r", encoding="utf-8") as f:
+        if filename.endswith(".json"):
+            return [{"city": job["city"], "movie": job["movie"]} for job in json.load(f)]
+
+        jobs = []
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                jobs.append(parse_job(line))
+        return jobs
+
+
+def job_output_file(output_dir: str, city: str, movie_slug: str, binary=False) -> str:
+    return os.path.join(output_dir, f"{city}_{movie_slug}{BINARY_SUFFIX if binary else '.json'}")
+
+
+async def run_job(browser, session, job, options: JobOptions):
+    clearance = options.clearance
+    blocker = options.blocker
+    planner = options.planner
+    # Another worker may have passed the anti-bot check since the last job.
+    if clearance is not None:
+        clearance.apply_session(session)
+        await clearance.apply_browser(browser)
+
+    movie = job.get("resolved") or await in_thread(get_movie_name, job["movie"], session)
+    if not movie:
+        raise ValueError(f"Movie not found: {job['movie']}")
+
+    formatted_data = await in_thread(fetch_movie_formats, session, job["city"], movie["slug"], movie["id"])
+    if formatted_data is not None and clearance is not None:
+        clearance.capture_session(session)
+
+    output_file = job_output_file(options.output_dir, job["city"], movie["slug"], options.binary)
+    base = os.path.splitext(output_file)[0]
+    stream_file = base + ".ndjson"
+    checkpoint = Checkpoint(base + ".checkpoint.ndjson", options.resume)
+    # Each job gets its own occupancy directory so worker processes never share a store.
+    occupancy = OccupancyStore(os.path.join(options.occupancy_dir, f"{job['city']}_{movie['slug']}")) if options.occupancy_dir else None
+    # Metrics are per job, so each worker starts from zero before every job.
+    reset()
+    if blocker is not None:
+        blocker.reset()
+    if planner is not None and planner.value == "capacity":
+        planner.capacities = load_capacities(job["city"])
+    try:
+        with profiled(base + ".prof" if options.profile else None):
+            result = await scrape_movie(
+                browser, job["city"], movie["slug"], movie["id"], max_tabs=options.max_tabs, output_file=output_file, formatted_data=formatted_data,
+                session=session, changes_file=options.changes_file, stream_file=stream_file, checkpoint=checkpoint, occupancy=occupancy,
+                blocker=blocker, planner=planner, clearance=clearance, limiter=options.limiter
+            )
+    finally:
+        checkpoint.close()
+        if occupancy:
+            occupancy.close()
+        if options.metrics:
+            write_metrics(base + ".metrics.json")
+    if result is None:
+        raise ValueError(f"Could not read formats for {movie['slug']}")
+
+    return output_file
+
+
+@asynccontextmanager
+async def job_browser(browser, daemon=None, clearance=None):
+    if daemon is None:
+        yield browser
+        return
+    async with open_browser(daemon, clearance) as leased:
+        yield leased
+
+
+async def worker_loop(worker_id, inbox, outbox, options: JobOptions):
+    loop = asyncio.get_event_loop()
+    clearance = options.clearance
+    session = cloudscraper.create_scraper()
+    if options.limiter is not None:
+        options.limiter.install(session)
+    # With a daemon every job leases a warm browser instead, so the daemon can recycle it between jobs.
+    browser = None if options.daemon else await zd.start(headless=True, user_agent=clearance.user_agent() if clearance else None)
+
+    try:
+        while True:
+            task = await loop.run_in_executor(None, inbox.get)
+            if task is None:
+                break
+
+            index, job, attempt = task
+            try:
+                async with job_browser(browser, options.daemon, clearance) as current:
+                    # Retries always pick up from the checkpoint left by the failed attempt.
+                    output_file = await run_job(current, session, job, options._replace(resume=options.resume or attempt > 1))
+                outbox.put((worker_id, index, True, output_file))
+            except Exception as e:
+                outbox.put((worker_id, index, False, str(e)))
+
+                if browser is not None:
+                    try:
+                        await browser.stop()
+                    except Exception as stop_error:
+                        swallowed("batch.restart_browser", stop_error)
+                    browser = await zd.start(headless=True, user_agent=clearance.user_agent() if clearance else None)
+    finally:
+        if browser is not None:
+            try:
+                await browser.stop()
+            except Exception as e:
+                swallowed("batch.stop_browser", e)
+
+
+def run_worker(worker_id, inbox, outbox, options: JobOptions):
+    asyncio.run(worker_loop(worker_id, inbox, outbox, options))
+
+
+def run_batch(jobs, workers=DEFAULT_WORKERS, max_attempts=DEFAULT_MAX_ATTEMPTS, options: JobOptions = JobOptions()):
+    os.makedirs(options.output_dir, exist_ok=True)
+
+    context = multiprocessing.get_context("spawn")
+    outbox = context.Queue()
+
+    pending = deque(range(len(jobs)))
+    attempts = [0] * len(jobs)
+    results = {}
+    pool = {}
+    next_worker_id = 0
+
+    def spawn_worker():
+        nonlocal next_worker_id
+        inbox = context.Queue()
+        process = context.Process(
+            target=run_worker,
+            args=(next_worker_id, inbox, outbox, options),
+            daemon=True
+        )
+        process.start()
+        pool[next_worker_id] = {"process": process, "inbox": inbox, "job": None}
+        next_worker_id += 1
+
+    def finish(index, ok, detail):
+        results[index] = {"job": jobs[index], "ok": ok, "detail": detail, "attempts": attempts[index]}
+        status = "done" if ok else "failed"
+        print(f"[{len(results)}/{len(jobs)}] {status}: {jobs[index]['city']} / {jobs[index]['movie']} ({detail})")
+
+    def retry_or_fail(index, detail):
+        if attempts[index] >= max_attempts:
+            finish(index, False, detail)
+        else:
+            pending.append(index)
+
+    for _ in range(min(workers, len(jobs))):
+        spawn_worker()
+
+    while len(results) < len(jobs):
+        for worker in pool.values():
+            while worker["job"] is None and pending:
+                index = pending.popleft()
+                if index in results:
+                    continue
+                attempts[index] += 1
+                worker["job"] = index
+                worker["inbox"].put((index, jobs[index], attempts[index]))
+
+        try:
+            worker_id, index, ok, detail = outbox.get(timeout=1)
+            if worker_id in pool and pool[worker_id]["job"] == index:
+                pool[worker_id]["job"] = None
+            if index not in results:
+                if ok:
+                    finish(index, True, detail)
+                else:
+                    retry_or_fail(index, detail)
+        except queue.Empty:
+            pass
+
+        for worker_id in list(pool):
+            worker = pool[worker_id]
+            if worker["process"].is_alive():
+                continue
+
+            del pool[worker_id]
+            index = worker["job"]
+            if index is not None and index not in results:
+                retry_or_fail(index, f"worker crashed with exit code {worker['process'].exitcode}")
+
+        while pending and len(pool) < workers:
+            spawn_worker()
+
+    for worker in pool.values():
+        worker["inbox"].put(None)
+    for worker in pool.values():
+        worker["process"].join(timeout=30)
+        if worker["process"].is_alive():
+            worker["process"].terminate()
+
+    return [results[index] for index in range(len(jobs))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape many (city, movie) jobs across worker processes")
+    parser.add_argument("--jobs", help="Job file with one 'city:movie name' per line, or a JSON list of {city, movie}")
+    parser.add_argument("--job", action="append", default=[], help="Single job as 'city:movie name' (repeatable)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--max-tabs", type=int, default=DEFAULT_MAX_TABS)
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS)
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--changes", help="Append new/removed/changed shows to this NDJSON change feed")
+    parser.add_argument("--resume", action="store_true", help="Continue each job from its checkpoint instead of starting over")
+    parser.add_argument("--occupancy", help="Directory to store per-seat occupancy snapshots in, one sub-directory per job")
+    parser.add_argument("--metrics", action="store_true", help="Write stage timings and counters for each job to <job>.metrics.json")
+    parser.add_argument("--profile", action="store_true", help="Save a cProfile dump of each job to <job>.prof")
+    parser.add_argument("--binary", action="store_true", help=f"Save each job's results in the compact binary format (<job>{BINARY_SUFFIX}) instead of JSON")
+    add_blocking_arguments(parser)
+    add_planner_arguments(parser)
+    add_daemon_arguments(parser)
+    add_clearance_arguments(parser)
+    add_ratelimit_arguments(parser)
+    args = parser.parse_args()
+
+    jobs = [parse_job(job) for job in args.job]
+    if args.jobs:
+        jobs.extend(load_jobs(args.jobs))
+
+    if not jobs:
+        parser.error("no jobs given, use --jobs or --job")
+
+    limiter = limiter_from_args(args)
+    session = cloudscraper.create_scraper()
+    if limiter is not None:
+        limiter.install(session)
+    cache = SearchCache()
+    try:
+        movies = resolve_movies([job["movie"] for job in jobs], session, cache)
+    finally:
+        cache.close()
+
+    for job in jobs:
+        job["resolved"] = movies[job["movie"]]
+
+    options = JobOptions(
+        max_tabs=args.max_tabs,
+        output_dir=args.output_dir,
+        changes_file=args.changes,
+        resume=args.resume,
+        occupancy_dir=args.occupancy,
+        metrics=args.metrics,
+        profile=args.profile,
+        blocker=blocker_from_args(args),
+        planner=planner_from_args(args, concurrency=args.max_tabs),
+        daemon=args.daemon,
+        clearance=clearance_from_args(args),
+        limiter=limiter,
+        binary=args.binary
+    )
+    results = run_batch(jobs, args.workers, args.max_attempts, options)
+
+    with open(os.path.join(args.output_dir, "batch_summary.json"), "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4, ensure_ascii=False)
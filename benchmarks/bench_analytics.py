@@ -0,0 +1,50 @@
+import argparse
+import time
+
+import numpy as np
+
+from analytics import History, booking_velocity, fill_rates, group_fill_rates, sellout_forecast
+
+
+def build_history(rows, shows, cinemas, seed=0):
+    rng = np.random.default_rng(seed)
+
+    show_keys = [
+        ("vadodara", f"ET{show % 6:08d}", "2D", "English", f"Cinema {show % cinemas}", f"202610{show % 7 + 18:02d}", f"{show % 12 + 1:02d}:{(show * 5) % 60:02d} PM")
+        for show in range(shows)
+    ]
+
+    show = rng.integers(0, shows, rows, dtype=np.uint32)
+    scraped_at = 1.7e9 + rng.uniform(0, 3 * 24 * 3600, rows)
+    total = (150 + (np.arange(shows) % 5) * 50).astype(np.int32)[show]
+
+    # Seats fill up over time, so blocked grows with the scrape time.
+    progress = (scraped_at - scraped_at.min()) / (scraped_at.max() - scraped_at.min())
+    blocked = np.minimum(total, (progress * total * rng.uniform(0.2, 1.2, rows)).astype(np.int32))
+    available = total - blocked
+
+    return History(show_keys, show, scraped_at, available, blocked, total)
+
+
+def timed(name, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {elapsed * 1000:10.1f} ms")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark vectorized seat availability analytics")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--shows", type=int, default=50_000)
+    parser.add_argument("--cinemas", type=int, default=300)
+    args = parser.parse_args()
+
+    print(f"Synthetic history: {args.rows:,} rows, {args.shows:,} showtimes, {args.cinemas} cinemas\n")
+
+    history = timed("build + sort", lambda: build_history(args.rows, args.shows, args.cinemas))
+    timed("fill rates per show", lambda: fill_rates(history))
+    timed("fill rates by cinema", lambda: group_fill_rates(history, "cinema"))
+    timed("rolling booking velocity", lambda: booking_velocity(history))
+    timed("sell-out forecast", lambda: sellout_forecast(history))
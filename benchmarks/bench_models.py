@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+
+import cloudscraper
+
+import discovery
+from benchmarks.bench_offline import ameasure, measure
+from benchmarks.standin import FORMATS, StandInSite, show_time, start_server
+from discovery import fetch_movie_formats
+from main import scrape_movie
+from models import Cinema, Format, Movie, Showtime, dumps, loads, open_binary, save_movie, load_movie
+
+
+def movie_records(formats, cinemas, showtimes):
+    return Movie(tuple(
+        Format("Hindi" if f % 2 else "English", f"{2 + f % 2}D", f"ET{f:08d}", tuple(
+            Cinema(f"Cinema {c} - Some Long Mall Name, Vadodara", tuple(
+                Showtime(show_time(10 + s % 12, 15 * (s % 4)), 150 - s, s, 150, f"{f}{c:03d}{s:02d}", "20261018")
+                for s in range(showtimes)
+            ), f"V{c:04d}")
+            for c in range(cinemas)
+        ))
+        for f in range(formats)
+    ), "vadodara", "how-to-train-your-dragon", "ET00000001")
+
+
+def crawl_peak(formats, cinemas, showtimes, repeat):
+    # Peak traced memory of a whole scrape_movie job over HTTP, once holding its records and once streaming them.
+    # The stand-in serves from the same process, so its pages count too; padding is off to keep that small.
+    site = StandInSite(formats=formats, cinemas=cinemas, showtimes=showtimes, padding_kb=0)
+    server, base_url = start_server(site)
+    discovery.BASE_URL = base_url
+    session = cloudscraper.create_scraper()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            formatted_data = fetch_movie_formats(session, site.city, site.slug, site.movie_code)
+            loop = asyncio.new_event_loop()
+            try:
+                for name, stream_file in (("records", None), ("streamed", os.path.join(directory, "output.ndjson"))):
+                    _, movie = ameasure(
+                        f"scrape_movie over HTTP, {name} (shows)",
+                        lambda: scrape_movie(None, site.city, site.slug, site.movie_code, output_file=os.path.join(directory, "output.json"), formatted_data=formatted_data,
+                                             session=session, stream_file=stream_file),
+                        repeat, formats * cinemas * showtimes, loop
+                    )
+                    check(sum(len(cinema.showtimes) for format in movie.formats for cinema in format.cinemas) == formats * cinemas * showtimes, f"the {name} crawl missed showtimes")
+            finally:
+                loop.close()
+    finally:
+        server.shutdown()
+
+
+def retained(build):
+    tracemalloc.start()
+    try:
+        value = build()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return value, size
+
+
+def check(condition, message):
+    if not condition:
+        print(f"CHECK FAILED: {message}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure a crawl's peak memory and compare memory and size of the dict output, the record types and the binary format in models.py")
+    parser.add_argument("--formats", type=int, default=4)
+    parser.add_argument("--cinemas", type=int, default=40)
+    parser.add_argument("--showtimes", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    shows = args.formats * args.cinemas * args.showtimes
+    print(f"{args.formats} formats, {args.formats * args.cinemas} cinemas, {shows} showtimes")
+
+    if args.formats <= len(FORMATS):
+        crawl_peak(args.formats, args.cinemas, args.showtimes, max(1, args.repeat // 10))
+    else:
+        print(f"Skipping the crawl, the stand-in serves at most {len(FORMATS)} formats")
+
+    movie, record_size = retained(lambda: movie_records(args.formats, args.cinemas, args.showtimes))
+    output, dict_size = retained(lambda: json.loads(json.dumps(movie.to_output())))
+    encoded = dumps(movie)
+    decoded, decoded_size = retained(lambda: loads(encoded))
+    print(f"{'in memory, output dicts':<36} {dict_size / 1024:9.0f} KB")
+    print(f"{'in memory, records':<36} {record_size / 1024:9.0f} KB")
+    print(f"{'in memory, records from binary':<36} {decoded_size / 1024:9.0f} KB")
+
+    indented = json.dumps(output, indent=4, ensure_ascii=False).encode("utf-8")
+    compact = json.dumps(output, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    print(f"{'on disk, output.json':<36} {len(indented) / 1024:9.1f} KB")
+    print(f"{'on disk, compact JSON':<36} {len(compact) / 1024:9.1f} KB")
+    print(f"{'on disk, binary':<36} {len(encoded) / 1024:9.1f} KB")
+
+    measure("encode JSON", lambda: json.dumps(movie.to_output(), indent=4, ensure_ascii=False), args.repeat, shows)
+    measure("decode JSON", lambda: Movie.from_output(json.loads(indented)), args.repeat, shows)
+    measure("encode binary", lambda: dumps(movie), args.repeat, shows)
+    measure("decode binary", lambda: loads(encoded), args.repeat, shows)
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "output.bms")
+        save_movie(movie, filename)
+        with open_binary(filename) as reader:
+            _, scan = measure("seat scan, mmap", lambda: sum(counts.available for counts in reader.seat_counts()), args.repeat, shows)
+        check(load_movie(filename) == movie, "binary round trip changed the data")
+
+        filename = os.path.join(directory, "output.json")
+        save_movie(movie, filename)
+        check(load_movie(filename).to_output() == output, "JSON round trip changed the data")
+
+    check(decoded == movie, "decoded records differ")
+    check(scan == sum(showtime.available_seats for format in movie.formats for cinema in format.cinemas for showtime in cinema.showtimes), "seat scan does not match the records")
@@ -0,0 +1,304 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cloudscraper
+
+import discovery
+from api import SEAT_LAYOUT_PATH, crawl_event_over_http, fetch_seat_counts
+from benchmarks.standin import StandInSite, start_server
+from checkpoint import Checkpoint
+from discovery import buytickets_url, fetch_movie_formats
+from main import count_seat_availability, extract_time_slots, get_planned_cinemas, list_cinemas, main, scrape_movie
+from seats import count_seats_in_html
+from stream import iter_ndjson
+from tabpool import TabPool
+
+
+class FixturePage:
+    # Replays a fetched page for the host-side parsing paths. It cannot run JavaScript,
+    # so the snapshot cache never validates it and every call parses the HTML again.
+    def __init__(self, url, html):
+        self.url = url
+        self.html = html
+
+    async def get_content(self):
+        return self.html
+
+    async def evaluate(self, expression):
+        raise NotImplementedError("FixturePage cannot evaluate JavaScript")
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_quietly(func):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func()
+
+
+def measure(name, func, repeat, items=1):
+    run_quietly(func)
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run_quietly(func)
+        timings.append(time.perf_counter() - start)
+
+    # Peak memory comes from one extra traced run so tracing does not skew the timings.
+    tracemalloc.start()
+    try:
+        run_quietly(func)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    stats = {
+        "name": name,
+        "repeat": repeat,
+        "items": items,
+        "throughput": repeat * items / sum(timings) if sum(timings) else 0.0,
+        "p50_ms": percentile(timings, 50) * 1000,
+        "p95_ms": percentile(timings, 95) * 1000,
+        "peak_kb": peak / 1024
+    }
+    print(f"{name:<36} {stats['throughput']:10.1f}/s  p50 {stats['p50_ms']:9.2f} ms  p95 {stats['p95_ms']:9.2f} ms  peak {stats['peak_kb']:9.0f} KB")
+    return stats, result
+
+
+def ameasure(name, make_coroutine, repeat, items=1, loop=None):
+    loop = loop or asyncio.get_event_loop()
+    return measure(name, lambda: loop.run_until_complete(make_coroutine()), repeat, items)
+
+
+def check(condition, message):
+    if not condition:
+        print(f"CHECK FAILED: {message}")
+        sys.exit(1)
+
+
+def check_cinemas(site, cinemas, limit=None):
+    expected = min(limit or len(site.cinemas), len(site.cinemas))
+    check(len(cinemas) == expected, f"expected {expected} cinemas, got {len(cinemas)}")
+    venues = {cinema["venueName"]: cinema for cinema in site.cinemas}
+    for cinema in cinemas:
+        venue = venues[cinema.name]
+        check(len(cinema.showtimes) == len(venue["showtimes"]), f"{cinema.name}: expected {len(venue['showtimes'])} showtimes, got {len(cinema.showtimes)}")
+        for showtime, show in zip(cinema.showtimes, venue["showtimes"]):
+            expected = site.expected_counts(venue["venueCode"], show["sessionId"])
+            check(showtime.available_seats == expected["available"] and showtime.total_seats == expected["total"],
+                  f"{cinema.name} {showtime.time}: seat counts do not match the fixture")
+
+
+def bench_http(site, session, repeat, output_dir):
+    results = []
+    event_code = site.formats[0]["eventCode"]
+    venue = site.cinemas[0]
+    limit = 5
+
+    stats, formats = measure("fetch_movie_formats", lambda: fetch_movie_formats(session, site.city, site.slug, site.movie_code), repeat)
+    check(formats and [f["eventCode"] for f in formats["formats"]] == [f["eventCode"] for f in site.formats], "formats do not match the fixture")
+    results.append(stats)
+
+    stats, counts = measure("fetch_seat_counts", lambda: fetch_seat_counts(session, venue["venueCode"], venue["showtimes"][0]["sessionId"]), repeat)
+    check(counts == site.expected_counts(venue["venueCode"], venue["showtimes"][0]["sessionId"]), "seat counts do not match the fixture")
+    results.append(stats)
+
+    shows = sum(len(cinema["showtimes"]) for cinema in site.cinemas[:limit])
+    stats, cinemas = measure("crawl_event_over_http (shows)", lambda: crawl_event_over_http(session, site.city, site.slug, event_code, limit), repeat, shows)
+    check_cinemas(site, [cinema_info["result"] for cinema_info in cinemas], limit)
+    results.append(stats)
+
+    # Without a budget, scrape_movie plans every cinema in the city.
+    all_shows = sum(len(cinema["showtimes"]) for cinema in site.cinemas)
+    output_file = os.path.join(output_dir, "output.json")
+    loop = asyncio.new_event_loop()
+    try:
+        stats, movie = ameasure(
+            "scrape_movie over HTTP (shows)",
+            lambda: scrape_movie(None, site.city, site.slug, site.movie_code, output_file=output_file, formatted_data=formats,
+                                 session=session, stream_file=os.path.join(output_dir, "output.ndjson")),
+            repeat, all_shows * len(site.formats), loop
+        )
+    finally:
+        loop.close()
+    for format in movie.formats:
+        check_cinemas(site, format.cinemas)
+    results.append(stats)
+
+    return results
+
+
+def check_resume(site, session, output_dir):
+    # Cuts a finished run's checkpoint and stream back to the first half of their showtimes, as if the
+    # run had been interrupted, then resumes it and checks that only the missing showtimes are fetched.
+    output_file = os.path.join(output_dir, "resume.json")
+    stream_file = os.path.join(output_dir, "resume.ndjson")
+    checkpoint_file = os.path.join(output_dir, "resume.checkpoint.ndjson")
+    formats = fetch_movie_formats(session, site.city, site.slug, site.movie_code)
+    fetched = []
+
+    def count_layouts(response, *args, **kwargs):
+        if SEAT_LAYOUT_PATH in response.url:
+            fetched.append(response.url)
+
+    def crawl(resume):
+        checkpoint = run_quietly(lambda: Checkpoint(checkpoint_file, resume))
+        loop = asyncio.new_event_loop()
+        try:
+            return run_quietly(lambda: loop.run_until_complete(scrape_movie(None, site.city, site.slug, site.movie_code, output_file=output_file, formatted_data=formats,
+                                                                     session=session, stream_file=stream_file, checkpoint=checkpoint)))
+        finally:
+            loop.close()
+            checkpoint.close()
+
+    session.hooks["response"].append(count_layouts)
+    try:
+        crawl(False)
+        with open(checkpoint_file, encoding="utf-8") as f:
+            checkpoint_lines = f.readlines()
+        with open(stream_file, encoding="utf-8") as f:
+            stream_lines = f.readlines()
+        total = len(stream_lines)
+
+        kept = checkpoint_lines[:len(checkpoint_lines) // 2]
+        done = sum(1 for line in kept if '"time"' in line)
+        with open(checkpoint_file, "w", encoding="utf-8") as f:
+            f.writelines(kept)
+        with open(stream_file, "w", encoding="utf-8") as f:
+            f.writelines(stream_lines[:done])
+
+        fetched.clear()
+        movie = crawl(True)
+    finally:
+        session.hooks["response"].remove(count_layouts)
+
+    check(len(fetched) == total - done, f"resume fetched {len(fetched)} seat layouts, expected {total - done}")
+    keys = [(record["event_code"], record["cinema"], record["time"]) for record in iter_ndjson(stream_file)]
+    check(len(keys) == total and len(set(keys)) == total, f"resume left {len(keys)} stream lines for {total} showtimes")
+    with open(checkpoint_file, encoding="utf-8") as f:
+        check(len(f.readlines()) == len(checkpoint_lines), "resume wrote showtimes or cinemas to the checkpoint twice")
+    for format in movie.formats:
+        check_cinemas(site, format.cinemas)
+    print(f"{'resume after a partial run':<36} fetched {len(fetched)} of {total} seat layouts again")
+
+
+def bench_parsing(site, session, repeat):
+    results = []
+    event_code = site.formats[0]["eventCode"]
+    venue = site.cinemas[0]
+
+    buytickets = buytickets_url(site.city, site.slug, event_code)
+    cinema_page = FixturePage(buytickets, session.get(buytickets).text)
+    seat_url = discovery.BASE_URL + site.seat_layout_path(event_code, venue["venueCode"], venue["showtimes"][0]["sessionId"])
+    seat_page = FixturePage(seat_url, session.get(seat_url).text)
+
+    loop = asyncio.new_event_loop()
+    try:
+        stats, cinemas = ameasure("list_cinemas (html.parser)", lambda: list_cinemas(cinema_page), repeat, loop=loop)
+        check([cinema["name"] for cinema in cinemas] == [cinema["venueName"] for cinema in site.cinemas], "cinema list does not match the fixture")
+        results.append(stats)
+
+        stats, slots = ameasure("extract_time_slots (html.parser)", lambda: extract_time_slots(seat_page), repeat, loop=loop)
+        check([slot["time"] for slot in slots] == [show["showTime"] for show in venue["showtimes"]], "time slots do not match the fixture")
+        results.append(stats)
+    finally:
+        loop.close()
+
+    stats, counts = measure("count_seats_in_html", lambda: count_seats_in_html(seat_page.html), repeat)
+    check(counts == site.expected_counts(venue["venueCode"], venue["showtimes"][0]["sessionId"]), "seat counts do not match the fixture")
+    results.append(stats)
+
+    return results
+
+
+def bench_browser(site, repeat, output_dir, max_tabs):
+    import zendriver as zd
+
+    results = []
+    event_code = site.formats[0]["eventCode"]
+    venue = site.cinemas[0]
+    seat_url = discovery.BASE_URL + site.seat_layout_path(event_code, venue["venueCode"], venue["showtimes"][0]["sessionId"])
+    shows = sum(len(cinema["showtimes"]) for cinema in site.cinemas)
+
+    loop = asyncio.new_event_loop()
+    try:
+        browser = loop.run_until_complete(zd.start(headless=True))
+        try:
+            page = loop.run_until_complete(browser.get(seat_url))
+
+            stats, slots = ameasure("extract_time_slots (browser)", lambda: extract_time_slots(page), repeat, loop=loop)
+            check(len(slots) == len(venue["showtimes"]), "time slots do not match the fixture")
+            results.append(stats)
+
+            stats, counts = ameasure("count_seat_availability (browser)", lambda: count_seat_availability(page), repeat, loop=loop)
+            check(counts == site.expected_counts(venue["venueCode"], venue["showtimes"][0]["sessionId"]), "seat counts do not match the fixture")
+            results.append(stats)
+
+            pool = TabPool(browser, max_tabs)
+            stats, cinemas = ameasure("get_planned_cinemas (shows)", lambda: get_planned_cinemas(site.city, site.slug, event_code, pool), repeat, shows, loop)
+            check_cinemas(site, cinemas)
+            results.append(stats)
+        finally:
+            loop.run_until_complete(browser.stop())
+
+        stats, _ = ameasure(
+            "main end to end (shows)",
+            lambda: main(site.city, site.slug, site.movie_code, max_tabs, os.path.join(output_dir, "browser_output.json")),
+            repeat, shows * len(site.formats), loop
+        )
+        results.append(stats)
+    finally:
+        loop.close()
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the scraper end to end against a local stand-in server, without network access")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--cinemas", type=int, default=8)
+    parser.add_argument("--showtimes", type=int, default=5)
+    parser.add_argument("--padding-kb", type=int, default=200, help="Filler markup per page, to approximate real page sizes")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay added to every stand-in response")
+    parser.add_argument("--fixtures", help="Directory of recorded pages to serve before the generated ones")
+    parser.add_argument("--browser", action="store_true", help="Also drive headless Chrome against the stand-in pages")
+    parser.add_argument("--max-tabs", type=int, default=4)
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    site = StandInSite(cinemas=args.cinemas, showtimes=args.showtimes, padding_kb=args.padding_kb)
+    server, base_url = start_server(site, fixtures=args.fixtures, latency=args.latency_ms / 1000)
+    discovery.BASE_URL = base_url
+    session = cloudscraper.create_scraper()
+
+    print(f"Stand-in server on {base_url}: {len(site.formats)} formats, {len(site.cinemas)} cinemas, "
+          f"{args.showtimes} showtimes each, {site.seats} seats per show\n")
+
+    results = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        try:
+            results += bench_http(site, session, args.repeat, output_dir)
+            check_resume(site, session, output_dir)
+            results += bench_parsing(site, session, args.repeat)
+            if args.browser:
+                results += bench_browser(site, args.repeat, output_dir, args.max_tabs)
+        finally:
+            server.shutdown()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
@@ -0,0 +1,127 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from bs4 import BeautifulSoup
+
+from seats import available_backends, count_seats_in_html, count_seats_in_page
+
+
+CATEGORIES = [("RECLINER", 450), ("PRIME", 250), ("CLASSIC", 180)]
+
+
+def build_seat_layout_html(rows=30, seats_per_row=40, padding_kb=500):
+    parts = ["<html><head><title>Seat Layout</title></head><body>"]
+    for i in range(padding_kb):
+        parts.append(f"<div class='filler' id='f{i}'>" + "<span>lorem ipsum</span>" * 40 + "</div>")
+
+    parts.append("<table class='setmain'><tbody>")
+    rows_per_category = max(1, rows // len(CATEGORIES))
+    for row in range(rows):
+        if row % rows_per_category == 0 and row // rows_per_category < len(CATEGORIES):
+            name, price = CATEGORIES[row // rows_per_category]
+            parts.append(f"<tr><td colspan='{seats_per_row + 1}'><div class='seatP'>{name}-Rs. {price}.00</div></td></tr>")
+
+        parts.append(f"<tr><td><div class='seatR'>{chr(65 + row % 26)}</div></td>")
+        for seat in range(seats_per_row):
+            status = "_blocked" if (row * seats_per_row + seat) % 7 == 0 else "_available"
+            parts.append(f"<td><div class='seatI'><a class='{status}' id='{row}_{seat}'>{seat + 1}</a></div></td>")
+        parts.append("</tr>")
+
+    parts.append("</tbody></table></body></html>")
+    return "".join(parts)
+
+
+def count_seats_baseline(html):
+    soup = BeautifulSoup(html, "html.parser")
+
+    seat_table = soup.find("table", class_="setmain")
+    if not seat_table:
+        return {"available": 0, "blocked": 0, "total": 0}
+
+    available_seats = len(seat_table.find_all("a", class_="_available"))
+    blocked_seats = len(seat_table.find_all("a", class_="_blocked"))
+
+    return {
+        "available": available_seats,
+        "blocked": blocked_seats,
+        "total": available_seats + blocked_seats
+    }
+
+
+def timeit(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+async def atimeit(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = await func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def report(name, seconds, result, baseline=None):
+    speedup = f"{baseline / seconds:6.1f}x" if baseline else "     -"
+    print(f"{name:<32} {seconds * 1000:9.2f} ms  {speedup}  {result['available']}/{result['total']}")
+
+
+async def bench_browser(html, repeat, baseline):
+    import zendriver as zd
+
+    with tempfile.NamedTemporaryFile("w", suffix=".html", delete=False, encoding="utf-8") as f:
+        f.write(html)
+        path = f.name
+
+    browser = await zd.start(headless=True)
+    try:
+        page = await browser.get(f"file://{path}")
+
+        async def get_content_and_parse():
+            return count_seats_baseline(await page.get_content())
+
+        seconds, result = await atimeit(get_content_and_parse, repeat)
+        report("get_content + html.parser", seconds, result)
+
+        seconds, result = await atimeit(lambda: count_seats_in_page(page), repeat)
+        report("page.evaluate", seconds, result, baseline=baseline)
+
+        seconds, result = await atimeit(lambda: count_seats_in_page(page, categories=True), repeat)
+        report("page.evaluate + categories", seconds, result, baseline=baseline)
+    finally:
+        await browser.stop()
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark seat counting paths")
+    parser.add_argument("--rows", type=int, default=30)
+    parser.add_argument("--seats-per-row", type=int, default=40)
+    parser.add_argument("--padding-kb", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--browser", action="store_true", help="Also benchmark the in-page path in headless Chrome")
+    args = parser.parse_args()
+
+    html = build_seat_layout_html(args.rows, args.seats_per_row, args.padding_kb)
+    print(f"Seat layout page: {len(html) / 1024:.0f} KB, {args.rows * args.seats_per_row} seats\n")
+
+    baseline, result = timeit(lambda: count_seats_baseline(html), args.repeat)
+    report("baseline (html.parser)", baseline, result)
+
+    for backend in available_backends():
+        seconds, result = timeit(lambda: count_seats_in_html(html, backend=backend), args.repeat)
+        report(f"host {backend}", seconds, result, baseline=baseline)
+
+        seconds, result = timeit(lambda: count_seats_in_html(html, categories=True, backend=backend), args.repeat)
+        report(f"host {backend} + categories", seconds, result, baseline=baseline)
+
+    if args.browser:
+        asyncio.run(bench_browser(html, args.repeat, baseline))
@@ -0,0 +1,98 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import cloudscraper
+
+import discovery
+import metrics
+from benchmarks.standin import StandInSite, start_server
+from search import normalise_query
+from service import AvailabilityService
+
+
+async def query(port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split(b" ", 2)[1]), json.loads(body)
+
+
+def scrapes():
+    return sum(value for (name, labels), value in metrics.counters.items()
+               if name == "service_total" and dict(labels).get("event") == "scrape")
+
+
+async def burst(port, path, queries):
+    before = scrapes()
+    started = time.perf_counter()
+    responses = await asyncio.gather(*(query(port, path) for _ in range(queries)))
+    elapsed = time.perf_counter() - started
+    return responses, scrapes() - before, elapsed
+
+
+def check(condition, message):
+    if not condition:
+        print(f"CHECK FAILED: {message}")
+        sys.exit(1)
+
+
+async def run(site, queries, workers):
+    session = cloudscraper.create_scraper()
+    service = AvailabilityService(session, max_age=60, workers=workers)
+    # The stand-in has no search endpoint, so the movie is resolved up front.
+    service.cache.put(("movie", normalise_query(site.slug)), {"slug": site.slug, "id": site.movie_code, "title": site.slug})
+
+    server = await asyncio.start_server(service.handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    event_code = site.formats[0]["eventCode"]
+    venue = site.cinemas[0]
+    show = venue["showtimes"][0]
+    one_show = f"/availability?city={site.city}&movie={site.slug}&event={event_code}&cinema={venue['venueCode']}&time={show['showTime'].replace(' ', '+')}"
+    whole_event = f"/availability?city={site.city}&movie={site.slug}&event={event_code}"
+    shows = sum(len(cinema["showtimes"]) for cinema in site.cinemas)
+
+    try:
+        for name, path, max_age, expected in (
+            ("one showtime, cold", one_show, "", 3),
+            ("one showtime, cached", one_show, "", 0),
+            ("one showtime, max_age=0", one_show, "&max_age=0", 3),
+            ("whole event, cold", whole_event, "&max_age=0", 2 + shows),
+            ("whole event, cached", whole_event, "", 0)
+        ):
+            responses, scraped, elapsed = await burst(port, path + max_age, queries)
+            print(f"{name:<28} {queries} queries in {elapsed * 1000:8.1f} ms, {scraped} scrapes")
+            check(all(status == 200 for status, _ in responses), "a query failed")
+            check(scraped == expected, f"expected {expected} scrapes, got {scraped}")
+
+            _, body = responses[0]
+            for cinema in body["formats"][0]["cinemas"]:
+                for showtime in cinema["showtimes"]:
+                    counts = site.expected_counts(cinema["venue_code"], showtime["session_id"])
+                    check(showtime["available_seats"] == counts["available"], "seat counts do not match the fixture")
+    finally:
+        server.close()
+        service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark request coalescing in service.py against the local stand-in server")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--cinemas", type=int, default=8)
+    parser.add_argument("--showtimes", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=50, help="Delay added to every stand-in response")
+    args = parser.parse_args()
+
+    site = StandInSite(cinemas=args.cinemas, showtimes=args.showtimes, padding_kb=20)
+    server, base_url = start_server(site, latency=args.latency_ms / 1000)
+    discovery.BASE_URL = base_url
+    try:
+        asyncio.run(run(site, args.queries, args.workers))
+    finally:
+        server.shutdown()
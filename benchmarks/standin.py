@@ -0,0 +1,227 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+FORMATS = [("English", "2D"), ("English", "3D"), ("Hindi", "2D"), ("English", "IMAX 2D")]
+CATEGORIES = [("RECLINER", 450), ("PRIME", 250), ("CLASSIC", 180)]
+
+
+def seat_statuses(venue_code, session_id, seats):
+    # Deterministic per show, so the HTML and JSON seat layouts always agree.
+    seed = int(hashlib.sha1(f"{venue_code}/{session_id}".encode("utf-8")).hexdigest()[:8], 16)
+    fill = 0.1 + (seed % 80) / 100
+    return ["_blocked" if ((i * 2654435761 + seed) % 1000) / 1000 < fill else "_available" for i in range(seats)]
+
+
+def show_time(hour, minute):
+    return f"{(hour - 1) % 12 + 1:02d}:{minute:02d} {'AM' if hour % 24 < 12 else 'PM'}"
+
+
+class StandInSite:
+    def __init__(self, city="vadodara", slug="how-to-train-your-dragon", movie_code="ET00000001", formats=3,
+                 cinemas=8, showtimes=5, rows=15, seats_per_row=20, padding_kb=200):
+        self.city = city
+        self.slug = slug
+        self.movie_code = movie_code
+        self.formats = [
+            {"language": language, "dimension": dimension, "eventCode": f"ET{i + 2:08d}"}
+            for i, (language, dimension) in enumerate(FORMATS[:formats])
+        ]
+        self.cinemas = [
+            {
+                "venueCode": f"V{i + 1:04d}",
+                "venueName": f"Stand-in Cinemas {chr(65 + i % 26)}{i // 26 or ''}: Screen Mall, {city.title()}",
+                "showtimes": [
+                    {"sessionId": str(10000 + i * 100 + j), "showTime": show_time((9 + j * 2) % 24, (i * 5 + j * 10) % 60)}
+                    for j in range(showtimes)
+                ]
+            }
+            for i in range(cinemas)
+        ]
+        self.rows = rows
+        self.seats_per_row = seats_per_row
+        self.padding = "".join(f"<div class='filler' id='f{i}'>" + "<span>lorem ipsum</span>" * 40 + "</div>" for i in range(padding_kb))
+
+    @property
+    def seats(self):
+        return self.rows * self.seats_per_row
+
+    def _page(self, title, body, state=None):
+        script = f"<script>window.__INITIAL_STATE__ = {json.dumps(state)};</script>" if state is not None else ""
+        return f"<html><head><title>{title}</title>{script}</head><body>{self.padding}{body}</body></html>"
+
+    def seat_layout_path(self, event_code, venue_code, session_id):
+        return f"/movies/{self.city}/seat-layout/{event_code}/{venue_code}/{session_id}/"
+
+    def movie_page(self):
+        options = {}
+        for format_info in self.formats:
+            options.setdefault(format_info["language"], []).append(
+                {"dimension": format_info["dimension"], "eventCode": format_info["eventCode"]}
+            )
+
+        state = {
+            "synopsisStore": {
+                "synopsisRender": {
+                    "bannerWidget": {
+                        "pageCta": [{"meta": {"options": [{"language": language, "formats": formats} for language, formats in options.items()]}}]
+                    }
+                }
+            },
+            "reviewsStore": {"reviews": [{"id": i, "text": "stand-in review " * 20} for i in range(200)]}
+        }
+        return self._page(self.slug, "<h1>Movie</h1>", state)
+
+    def buytickets_page(self, event_code):
+        containers = []
+        for cinema in self.cinemas:
+            slots = "".join(
+                f"<div class=\"sc-1vhizuf-2 jIiAgZ\" onclick=\"location.href='{self.seat_layout_path(event_code, cinema['venueCode'], show['sessionId'])}'\">{show['showTime']}</div>"
+                for show in cinema["showtimes"]
+            )
+            containers.append(
+                f"<div class=\"sc-e8nk8f-3 hStBrg\"><div class=\"sc-7o7nez-0 hvoTNx\">{cinema['venueName']}</div>{slots}</div>"
+            )
+
+        state = {"showtimesByEvent": {"eventCode": event_code, "venues": self.cinemas}}
+        return self._page("Buy Tickets", "".join(containers), state)
+
+    def seat_layout_page(self, event_code, venue_code, session_id):
+        cinema = next((cinema for cinema in self.cinemas if cinema["venueCode"] == venue_code), None)
+        if cinema is None:
+            return None
+
+        slots = "".join(
+            f"<li id=\"{show['sessionId']}\" class=\"{'_active' if show['sessionId'] == session_id else ''}\">"
+            f"<a href=\"{self.seat_layout_path(event_code, venue_code, show['sessionId'])}\">{show['showTime']}</a></li>"
+            for show in cinema["showtimes"]
+        )
+
+        statuses = seat_statuses(venue_code, session_id, self.seats)
+        table = ["<table class='setmain'><tbody>"]
+        rows_per_category = max(1, self.rows // len(CATEGORIES))
+        for row in range(self.rows):
+            if row % rows_per_category == 0 and row // rows_per_category < len(CATEGORIES):
+                name, price = CATEGORIES[row // rows_per_category]
+                table.append(f"<tr><td colspan='{self.seats_per_row + 1}'><div class='seatP'>{name}-Rs. {price}.00</div></td></tr>")
+            table.append(f"<tr><td><div class='seatR'>{chr(65 + row % 26)}</div></td>")
+            for seat in range(self.seats_per_row):
+                status = statuses[row * self.seats_per_row + seat]
+                table.append(f"<td><div class='seatI'><a class='{status}' id='{row}_{seat}'>{seat + 1}</a></div></td>")
+            table.append("</tr>")
+        table.append("</tbody></table>")
+
+        body = f"<div class='showtime-section'><ul>{slots}</ul></div>{''.join(table)}"
+        return self._page("Seat Layout", body)
+
+    def seat_layout_json(self, venue_code, session_id):
+        statuses = seat_statuses(venue_code, session_id, self.seats)
+        return {
+            "venueCode": venue_code,
+            "sessionId": session_id,
+            "rows": [
+                {"row": chr(65 + row % 26), "seats": [
+                    {"id": f"{row}_{seat}", "status": "available" if statuses[row * self.seats_per_row + seat] == "_available" else "blocked"}
+                    for seat in range(self.seats_per_row)
+                ]}
+                for row in range(self.rows)
+            ]
+        }
+
+    def expected_counts(self, venue_code, session_id):
+        statuses = seat_statuses(venue_code, session_id, self.seats)
+        blocked = statuses.count("_blocked")
+        return {"available": len(statuses) - blocked, "blocked": blocked, "total": len(statuses)}
+
+    def route(self, path, query):
+        parts = [part for part in path.split("/") if part]
+
+        if parts[:1] == ["serv"] and query.get("cmd") == ["GETSEATLAYOUT"]:
+            venue_code = query.get("venueCode", [""])[0]
+            session_id = query.get("sessionId", [""])[0]
+            return "application/json", json.dumps(self.seat_layout_json(venue_code, session_id))
+
+        if len(parts) >= 6 and parts[0] == "movies" and parts[2] == "seat-layout":
+            html = self.seat_layout_page(parts[3], parts[4], parts[5])
+            return ("text/html", html) if html else None
+
+        if len(parts) >= 5 and parts[0] == "movies" and parts[3] == "buytickets":
+            return "text/html", self.buytickets_page(parts[4])
+
+        if len(parts) >= 4 and parts[0] == "movies" and parts[3] == self.movie_code:
+            return "text/html", self.movie_page()
+
+        return None
+
+
+def recorded_fixture(directory, path):
+    name = path.strip("/").replace("/", os.sep)
+    for candidate in (os.path.join(directory, name + ".html"), os.path.join(directory, name, "index.html")):
+        if os.path.isfile(candidate):
+            with open(candidate, "r", encoding="utf-8") as f:
+                return "text/html", f.read()
+    return None
+
+
+def make_handler(site, fixtures=None, latency=0.0):
+    class StandInHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+
+            url = urlparse(self.path)
+            response = recorded_fixture(fixtures, url.path) if fixtures else None
+            if response is None:
+                response = site.route(url.path, parse_qs(url.query))
+
+            if response is None:
+                self.send_error(404)
+                return
+
+            content_type, text = response
+            body = text.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StandInHandler
+
+
+def start_server(site, port=0, fixtures=None, latency=0.0, host="127.0.0.1"):
+    server = ThreadingHTTPServer((host, port), make_handler(site, fixtures, latency))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the BookMyShow pages the scraper reads")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--fixtures", help="Directory of recorded pages, served by URL path before the generated ones")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--cinemas", type=int, default=8)
+    parser.add_argument("--showtimes", type=int, default=5)
+    args = parser.parse_args()
+
+    site = StandInSite(cinemas=args.cinemas, showtimes=args.showtimes)
+    server, base_url = start_server(site, args.port, args.fixtures, args.latency_ms / 1000)
+    print(f"Serving stand-in site on {base_url}")
+    print(f"  movie page: {base_url}/movies/{site.city}/{site.slug}/{site.movie_code}/")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,123 @@
+from collections import Counter
+
+from zendriver import cdp
+
+from metrics import inc, swallowed
+
+
+DEFAULT_BLOCKED_TYPES = ("Image", "Media", "Font")
+DEFAULT_BLOCKED_URLS = (
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*googlesyndication.com*",
+    "*facebook.net*",
+    "*connect.facebook.com*",
+    "*hotjar.com*",
+    "*clarity.ms*",
+    "*branch.io*",
+    "*moengage.com*",
+    "*.mp4*",
+    "*.m3u8*"
+)
+
+# Rough transfer sizes per resource type. Blocked requests never load, so this is
+# only an estimate of what they would have cost.
+ESTIMATED_BYTES = {
+    "Image": 35_000,
+    "Media": 500_000,
+    "Font": 40_000,
+    "Script": 60_000,
+    "Stylesheet": 25_000,
+    "XHR": 5_000,
+    "Fetch": 5_000,
+    "Ping": 500
+}
+DEFAULT_ESTIMATED_BYTES = 10_000
+
+
+def parse_resource_types(names):
+    types = []
+    for name in names:
+        name = name.strip()
+        if not name:
+            continue
+        match = next((value for value in cdp.network.ResourceType if value.value.lower() == name.lower()), None)
+        if match is None:
+            raise ValueError(f"Unknown resource type '{name}', expected one of {', '.join(value.value for value in cdp.network.ResourceType)}")
+        if match == cdp.network.ResourceType.DOCUMENT:
+            raise ValueError("Blocking Document requests would block the pages themselves")
+        types.append(match.value)
+    return tuple(types)
+
+
+class ResourceBlocker:
+    def __init__(self, resource_types=DEFAULT_BLOCKED_TYPES, url_patterns=DEFAULT_BLOCKED_URLS):
+        self.resource_types = parse_resource_types(resource_types)
+        self.url_patterns = tuple(url_patterns)
+        self.blocked = Counter()
+
+    def patterns(self):
+        # Only requests matching a pattern are paused, so everything else loads without a round trip.
+        patterns = [
+            cdp.fetch.RequestPattern(url_pattern="*", resource_type=cdp.network.ResourceType(resource_type), request_stage=cdp.fetch.RequestStage.REQUEST)
+            for resource_type in self.resource_types
+        ]
+        patterns += [
+            cdp.fetch.RequestPattern(url_pattern=pattern, request_stage=cdp.fetch.RequestStage.REQUEST)
+            for pattern in self.url_patterns
+        ]
+        return patterns
+
+    async def attach(self, page):
+        if getattr(page, "_bms_blocker", None) is self:
+            return
+
+        page.add_handler(cdp.fetch.RequestPaused, self._on_request_paused)
+        await page.send(cdp.fetch.enable(patterns=self.patterns()))
+        page._bms_blocker = self
+
+    async def open_tab(self, browser, url):
+        # The tab starts blank so interception is in place before the first request of the page.
+        page = await browser.get("about:blank", new_tab=True)
+        await self.attach(page)
+        await page.get(url)
+        return page
+
+    async def get(self, browser, url):
+        await self.attach(browser.main_tab)
+        return await browser.main_tab.get(url)
+
+    async def _on_request_paused(self, event, connection):
+        resource_type = event.resource_type.value if event.resource_type else "Other"
+        self.blocked[resource_type] += 1
+        inc("blocked_requests_total", type=resource_type)
+
+        try:
+            await connection.send(cdp.fetch.fail_request(event.request_id, cdp.network.ErrorReason.BLOCKED_BY_CLIENT))
+        except Exception as e:
+            swallowed("blocker.fail_request", e)
+
+    def bytes_saved(self):
+        return sum(ESTIMATED_BYTES.get(resource_type, DEFAULT_ESTIMATED_BYTES) * count for resource_type, count in self.blocked.items())
+
+    def reset(self):
+        self.blocked.clear()
+
+    def summary(self):
+        if not self.blocked:
+            return "Blocked 0 requests"
+        counts = ", ".join(f"{count} {resource_type}" for resource_type, count in self.blocked.most_common())
+        return f"Blocked {sum(self.blocked.values())} requests ({counts}), about {self.bytes_saved() / 1024 / 1024:.1f} MB saved"
+
+
+def add_blocking_arguments(parser):
+    parser.add_argument("--no-block", action="store_true", help="Load every resource instead of blocking images, fonts, media and trackers")
+    parser.add_argument("--block-types", default=",".join(DEFAULT_BLOCKED_TYPES), help="Comma-separated CDP resource types to block")
+    parser.add_argument("--block-url", action="append", default=[], help="Extra URL pattern to block, e.g. '*ads.example.com*' (repeatable)")
+
+
+def blocker_from_args(args):
+    if args.no_block:
+        return None
+    return ResourceBlocker(args.block_types.split(","), DEFAULT_BLOCKED_URLS + tuple(args.block_url))
@@ -0,0 +1,75 @@
+from models import Cinema, Showtime
+from stream import NDJSONWriter, iter_ndjson
+
+
+DEFAULT_CHECKPOINT_FILE = "checkpoint.ndjson"
+
+
+class Checkpoint:
+    # Only keys are kept. The counts themselves are in the showtime stream, which a resumed run appends to.
+    def __init__(self, filename=DEFAULT_CHECKPOINT_FILE, resume=False):
+        self.filename = filename
+        self.resume = resume
+        self.showtimes = {}
+        self.cinemas = set()
+
+        if resume:
+            self._load()
+
+        self._writer = NDJSONWriter(filename, "a" if resume else "w")
+
+    def _load(self):
+        try:
+            for record in iter_ndjson(self.filename):
+                key = (record["movie"], record["event_code"], record["cinema"])
+                if "time" in record:
+                    self.showtimes.setdefault(key, set()).add(record["time"])
+                else:
+                    self.cinemas.add(key)
+        except FileNotFoundError:
+            pass
+
+        done = sum(len(showtimes) for showtimes in self.showtimes.values())
+        print(f"Resuming from {self.filename}: {len(self.cinemas)} cinemas and {done} showtimes already done")
+
+    def for_format(self, movie: str, event_code: str):
+        return FormatCheckpoint(self, movie, event_code)
+
+    def close(self):
+        self._writer.close()
+
+
+class FormatCheckpoint:
+    def __init__(self, checkpoint: Checkpoint, movie: str, event_code: str):
+        self.checkpoint = checkpoint
+        self.movie = movie
+        self.event_code = event_code
+
+    def _key(self, cinema_name):
+        return (self.movie, self.event_code, cinema_name)
+
+    def completed_cinema(self, cinema_name):
+        return self._key(cinema_name) in self.checkpoint.cinemas
+
+    def completed_showtimes(self, cinema_name):
+        return self.checkpoint.showtimes.get(self._key(cinema_name), set())
+
+    def record_showtime(self, cinema_name, showtime: Showtime):
+        self.checkpoint.showtimes.setdefault(self._key(cinema_name), set()).add(showtime.time)
+        self.checkpoint._writer.write({
+            "movie": self.movie,
+            "event_code": self.event_code,
+            "cinema": cinema_name,
+            "time": showtime.time
+        })
+
+    def record_cinema(self, cinema: Cinema):
+        if not cinema.scraped or cinema.failed_showtimes or self.completed_cinema(cinema.name):
+            return
+
+        self.checkpoint.cinemas.add(self._key(cinema.name))
+        self.checkpoint._writer.write({
+            "movie": self.movie,
+            "event_code": self.event_code,
+            "cinema": cinema.name
+        })
@@ -0,0 +1,259 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from zendriver import cdp
+
+from metrics import inc, swallowed
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+DEFAULT_CLEARANCE_FILE = "clearance.json"
+# Used when no clearance cookie says how long it is good for.
+DEFAULT_MAX_AGE = 30 * 60
+CLEARANCE_COOKIES = ("cf_clearance",)
+COOKIE_DOMAIN = "bookmyshow.com"
+
+CHALLENGE_INDICATORS = [
+    "Just a moment...",
+    "cf_chl_opt",
+    "cf-chl-",
+    "Attention Required! | Cloudflare",
+    "Enable JavaScript and cookies to continue"
+]
+CHALLENGE_CHECK = f"{json.dumps(CHALLENGE_INDICATORS)}.some(s => document.documentElement.outerHTML.includes(s))"
+
+
+def has_indicator(html: str, indicators) -> bool:
+    return any(indicator in html for indicator in indicators)
+
+
+def is_challenge(html: str) -> bool:
+    return bool(html) and has_indicator(html, CHALLENGE_INDICATORS)
+
+
+@contextmanager
+def file_lock(filename: str):
+    # Worker processes share the same files, so reads and writes go through an exclusive lock file.
+    with open(filename + ".lock", "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def write_json_atomic(filename: str, data):
+    temp_file = f"{filename}.{os.getpid()}.tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4)
+    os.replace(temp_file, filename)
+
+
+class ClearanceStore:
+    def __init__(self, filename=DEFAULT_CLEARANCE_FILE, max_age=DEFAULT_MAX_AGE):
+        self.filename = filename
+        self.max_age = max_age
+
+    def _read(self):
+        try:
+            with open(self.filename, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load(self):
+        with file_lock(self.filename):
+            entry = self._read()
+        if entry is None or entry.get("expires", 0) <= time.time():
+            return None
+        return entry
+
+    def expiry(self, cookies, now):
+        expires = now + self.max_age
+        for cookie in cookies:
+            if cookie["name"] in CLEARANCE_COOKIES and cookie.get("expires"):
+                expires = min(expires, cookie["expires"])
+        return expires
+
+    def save(self, cookies, user_agent: str, source: str, force=False):
+        cookies = [cookie for cookie in cookies if cookie["domain"].lstrip(".").endswith(COOKIE_DOMAIN)]
+        if not cookies:
+            return False
+
+        now = time.time()
+        with file_lock(self.filename):
+            # The first client to pass keeps the entry for its whole window; later ones reuse it.
+            # A client that just solved a new challenge replaces it, since the old one stopped working.
+            current = self._read()
+            if not force and current is not None and current.get("expires", 0) > now:
+                return False
+
+            write_json_atomic(self.filename, {
+                "source": source,
+                "user_agent": user_agent,
+                "captured": now,
+                "expires": self.expiry(cookies, now),
+                "cookies": cookies
+            })
+        inc("clearance_total", event="captured", source=source)
+        print(f"Saved {len(cookies)} cookies from the {source} client to {self.filename}")
+        return True
+
+    def clear(self):
+        with file_lock(self.filename):
+            try:
+                os.remove(self.filename)
+            except FileNotFoundError:
+                pass
+
+    def reject(self, started=None):
+        # A challenge came back, so the stored cookies no longer pass. An entry saved after the
+        # failed request started came from a newer solve and is kept.
+        with file_lock(self.filename):
+            entry = self._read()
+            if entry is None or (started is not None and entry.get("captured", 0) > started):
+                return False
+            try:
+                os.remove(self.filename)
+            except FileNotFoundError:
+                pass
+        inc("clearance_total", event="rejected", source=entry.get("source", "unknown"))
+        print(f"Got a challenge page, dropped the shared cookies in {self.filename}")
+        return True
+
+    def _check_response(self, response, *args, **kwargs):
+        if response.status_code == 200 and "html" not in response.headers.get("Content-Type", ""):
+            return
+        try:
+            if is_challenge(response.text):
+                self.reject(time.time() - response.elapsed.total_seconds())
+        except Exception as e:
+            swallowed("clearance.check_response", e)
+
+    def watch_session(self, session):
+        hooks = session.hooks.setdefault("response", [])
+        if not any(getattr(hook, "__self__", None) is self for hook in hooks):
+            hooks.append(self._check_response)
+        return session
+
+    async def check_page(self, page, started=None):
+        try:
+            challenged = bool(await page.evaluate(CHALLENGE_CHECK))
+        except Exception as e:
+            swallowed("clearance.check_page", e)
+            return False
+        if challenged:
+            self.reject(started)
+        return challenged
+
+    def capture_session(self, session, force=False):
+        cookies = [
+            {
+                "name": cookie.name,
+                "value": cookie.value,
+                "domain": cookie.domain,
+                "path": cookie.path,
+                "expires": cookie.expires,
+                "secure": cookie.secure,
+                "http_only": cookie.has_nonstandard_attr("HttpOnly")
+            }
+            for cookie in session.cookies
+        ]
+        return self.save(cookies, session.headers.get("User-Agent"), "http", force)
+
+    def apply_session(self, session):
+        self.watch_session(session)
+        entry = self.load()
+        if entry is None:
+            return False
+
+        # Clearance cookies are tied to the user agent that earned them.
+        if entry.get("user_agent"):
+            session.headers["User-Agent"] = entry["user_agent"]
+        for cookie in entry["cookies"]:
+            session.cookies.set(cookie["name"], cookie["value"], domain=cookie["domain"], path=cookie["path"],
+                                expires=cookie.get("expires"), secure=cookie.get("secure", False))
+        inc("clearance_total", event="applied", source=entry["source"], client="http")
+        return True
+
+    async def capture_browser(self, browser, force=False):
+        try:
+            version = await browser.connection.send(cdp.browser.get_version())
+            browser_cookies = await browser.connection.send(cdp.storage.get_cookies())
+        except Exception as e:
+            swallowed("clearance.capture_browser", e)
+            return False
+
+        cookies = [
+            {
+                "name": cookie.name,
+                "value": cookie.value,
+                "domain": cookie.domain,
+                "path": cookie.path,
+                "expires": cookie.expires if cookie.expires and cookie.expires > 0 else None,
+                "secure": cookie.secure,
+                "http_only": cookie.http_only
+            }
+            for cookie in browser_cookies
+        ]
+        return self.save(cookies, version[3], "browser", force)
+
+    async def apply_browser(self, browser):
+        entry = self.load()
+        if entry is None:
+            return False
+
+        # A running browser cannot change its user agent, so cookies earned under another one would not pass.
+        try:
+            version = await browser.connection.send(cdp.browser.get_version())
+            if entry.get("user_agent") and entry["user_agent"] != version[3]:
+                return False
+
+            await browser.connection.send(cdp.storage.set_cookies([
+                cdp.network.CookieParam(
+                    name=cookie["name"],
+                    value=cookie["value"],
+                    domain=cookie["domain"],
+                    path=cookie["path"],
+                    secure=cookie.get("secure"),
+                    http_only=cookie.get("http_only"),
+                    expires=cdp.network.TimeSinceEpoch(cookie["expires"]) if cookie.get("expires") else None
+                )
+                for cookie in entry["cookies"]
+            ]))
+        except Exception as e:
+            swallowed("clearance.apply_browser", e)
+            return False
+
+        inc("clearance_total", event="applied", source=entry["source"], client="browser")
+        return True
+
+    def user_agent(self):
+        entry = self.load()
+        return entry.get("user_agent") if entry else None
+
+
+def add_clearance_arguments(parser):
+    parser.add_argument("--clearance", default=DEFAULT_CLEARANCE_FILE, help="File the HTTP client and the browser share anti-bot cookies through")
+    parser.add_argument("--no-clearance", action="store_true", help="Let the HTTP client and the browser each pass the anti-bot check on their own")
+
+
+def clearance_from_args(args):
+    if args.no_clearance:
+        return None
+    return ClearanceStore(args.clearance)
@@ -0,0 +1,316 @@
+import argparse
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+
+import zendriver as zd
+from zendriver import cdp
+
+import discovery
+from clearance import add_clearance_arguments, clearance_from_args
+from metrics import inc, swallowed
+from ratelimit import add_ratelimit_arguments, limiter_from_args, rate_limited
+
+
+DEFAULT_DAEMON_ADDRESS = "127.0.0.1:9223"
+DEFAULT_INSTANCES = 1
+# Chrome keeps growing with every page it has rendered, so an instance is restarted after this many.
+DEFAULT_MAX_PAGES = 200
+DEFAULT_HEALTH_INTERVAL = 30
+HEALTH_TIMEOUT = 5
+
+
+def parse_address(address: str):
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+async def detach(browser):
+    # browser.stop() would send Browser.close and shut the daemon's Chrome down,
+    # so a leased browser only closes its own connections.
+    for target in browser.targets:
+        try:
+            await target.aclose()
+        except Exception as e:
+            swallowed("daemon.detach", e)
+    if browser.connection:
+        await browser.connection.aclose()
+
+
+class BrowserInstance:
+    def __init__(self, instance_id: int, warm_url: str = None, clearance=None, limiter=None):
+        self.id = instance_id
+        self.warm_url = warm_url
+        self.clearance = clearance
+        self.limiter = limiter
+        self.browser = None
+        self.pages = 0
+        self.leases = 0
+        self.started = None
+
+    async def start(self):
+        self.browser = await zd.start(headless=True, user_agent=self.clearance.user_agent() if self.clearance else None)
+        self.browser.connection.add_handler(cdp.target.TargetCreated, self._on_target_created)
+        self.pages = 0
+        self.started = time.time()
+
+        # The first visit to the site pays for the anti-bot check, so do it before any job arrives.
+        if self.warm_url:
+            try:
+                started = time.time()
+                if self.clearance is not None:
+                    await self.clearance.apply_browser(self.browser)
+                page = await rate_limited(self.limiter, lambda: self.browser.get(self.warm_url))
+                if self.clearance is not None and not await self.clearance.check_page(page, started):
+                    await self.clearance.capture_browser(self.browser)
+                await self.browser.main_tab.get("about:blank")
+            except Exception as e:
+                swallowed("daemon.warm_up", e)
+
+    async def stop(self):
+        if self.browser is None:
+            return
+        try:
+            await self.browser.stop()
+        except Exception as e:
+            swallowed("daemon.stop", e)
+        self.browser = None
+
+    async def restart(self, reason: str):
+        print(f"Restarting browser {self.id} ({reason})")
+        inc("daemon_restarts_total", reason=reason)
+        await self.stop()
+        await self.start()
+
+    async def _on_target_created(self, event):
+        if event.target_info.type_ == "page":
+            self.pages += 1
+
+    async def healthy(self):
+        if self.browser is None or self.browser.stopped:
+            return False
+        try:
+            await asyncio.wait_for(self.browser.connection.send(cdp.browser.get_version()), HEALTH_TIMEOUT)
+            return True
+        except Exception as e:
+            swallowed("daemon.health", e)
+            return False
+
+    async def recycle(self):
+        # Leave a single blank tab behind, keeping the cookies and cache the job warmed up.
+        await self.browser.update_targets()
+        tabs = self.browser.tabs
+        for tab in tabs[1:]:
+            try:
+                await tab.close()
+            except Exception as e:
+                swallowed("daemon.recycle", e)
+        if tabs:
+            await tabs[0].get("about:blank")
+        else:
+            await self.browser.get("about:blank", new_tab=True)
+
+    def status(self):
+        return {
+            "id": self.id,
+            "pages": self.pages,
+            "leases": self.leases,
+            "uptime": round(time.time() - self.started, 1) if self.started else None,
+            "address": f"{self.browser.config.host}:{self.browser.config.port}" if self.browser else None
+        }
+
+
+class BrowserDaemon:
+    def __init__(self, instances=DEFAULT_INSTANCES, max_pages=DEFAULT_MAX_PAGES, health_interval=DEFAULT_HEALTH_INTERVAL, warm_url=None, clearance=None, limiter=None):
+        # Warm-ups go through the same limiter as the jobs, so restarting browsers never adds unthrottled visits.
+        self.instances = [BrowserInstance(i, warm_url, clearance, limiter) for i in range(max(1, instances))]
+        self.max_pages = max_pages
+        self.health_interval = health_interval
+        self.leased = set()
+        self._idle = None
+
+    async def start(self):
+        self._idle = asyncio.Queue()
+        for instance in self.instances:
+            await instance.start()
+            self._idle.put_nowait(instance)
+
+    async def stop(self):
+        for instance in self.instances:
+            await instance.stop()
+
+    async def acquire(self):
+        instance = await self._idle.get()
+        try:
+            if not await instance.healthy():
+                await instance.restart("unhealthy")
+        except Exception:
+            self._idle.put_nowait(instance)
+            raise
+        instance.leases += 1
+        self.leased.add(instance.id)
+        return instance
+
+    async def release(self, instance):
+        try:
+            if instance.pages >= self.max_pages:
+                await instance.restart("max_pages")
+            elif not await instance.healthy():
+                await instance.restart("unhealthy")
+            else:
+                await instance.recycle()
+        except Exception as e:
+            swallowed("daemon.release", e)
+            try:
+                await instance.restart("recycle_failed")
+            except Exception as e:
+                swallowed("daemon.restart", e)
+        finally:
+            self.leased.discard(instance.id)
+            self._idle.put_nowait(instance)
+
+    async def check_idle(self):
+        # Only idle instances are checked; leased ones are checked when they come back.
+        for _ in range(self._idle.qsize()):
+            instance = self._idle.get_nowait()
+            try:
+                if not await instance.healthy():
+                    await instance.restart("unhealthy")
+            except Exception as e:
+                swallowed("daemon.check", e)
+            finally:
+                self._idle.put_nowait(instance)
+
+    async def health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await self.check_idle()
+
+    def status(self):
+        return {
+            "ok": True,
+            "idle": self._idle.qsize(),
+            "leased": sorted(self.leased),
+            "max_pages": self.max_pages,
+            "instances": [instance.status() for instance in self.instances]
+        }
+
+    async def handle_client(self, reader, writer):
+        # A lease lasts as long as the client's connection, so a crashed job still gives its browser back.
+        instance = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                message = json.loads(line)
+                command = message.get("cmd")
+                if command == "acquire":
+                    if instance is None:
+                        instance = await self.acquire()
+                    reply = {"ok": True, "id": instance.id, "host": instance.browser.config.host, "port": instance.browser.config.port}
+                elif command == "release":
+                    break
+                elif command == "status":
+                    reply = self.status()
+                else:
+                    reply = {"ok": False, "error": f"Unknown command '{command}'"}
+
+                writer.write(json.dumps(reply).encode("utf-8") + b"\n")
+                await writer.drain()
+        except Exception as e:
+            swallowed("daemon.client", e)
+        finally:
+            if instance is not None:
+                await self.release(instance)
+            writer.close()
+
+    async def serve(self, address=DEFAULT_DAEMON_ADDRESS):
+        host, port = parse_address(address)
+        await self.start()
+        server = await asyncio.start_server(self.handle_client, host, port)
+        health = asyncio.ensure_future(self.health_loop())
+        print(f"Browser daemon on {host}:{port} with {len(self.instances)} warm browser(s)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            health.cancel()
+            await self.stop()
+
+
+async def request(address: str, command: str):
+    host, port = parse_address(address)
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(json.dumps({"cmd": command}).encode("utf-8") + b"\n")
+    await writer.drain()
+    line = await reader.readline()
+    if not line:
+        writer.close()
+        raise ConnectionError("Browser daemon closed the connection")
+    return reader, writer, json.loads(line)
+
+
+@asynccontextmanager
+async def open_browser(daemon: str = None, clearance=None):
+    if daemon:
+        try:
+            _, writer, lease = await request(daemon, "acquire")
+            if not lease.get("ok"):
+                raise ConnectionError(lease.get("error"))
+        except (OSError, ValueError) as e:
+            print(f"Browser daemon at {daemon} is unavailable ({e}), starting a local browser")
+        else:
+            try:
+                browser = await zd.start(host=lease["host"], port=lease["port"])
+                try:
+                    if clearance is not None:
+                        await clearance.apply_browser(browser)
+                    yield browser
+                finally:
+                    await detach(browser)
+            finally:
+                writer.close()
+            return
+
+    # A fresh browser takes the stored user agent, so the stored clearance cookies are valid for it.
+    browser = await zd.start(headless=True, user_agent=clearance.user_agent() if clearance else None)
+    try:
+        if clearance is not None:
+            await clearance.apply_browser(browser)
+        yield browser
+    finally:
+        await browser.stop()
+
+
+def add_daemon_arguments(parser):
+    parser.add_argument("--daemon", nargs="?", const=DEFAULT_DAEMON_ADDRESS,
+                        help=f"Lease a warm browser from daemon.py (default {DEFAULT_DAEMON_ADDRESS}) instead of launching Chrome")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep warm headless browsers running and lease them to scraping jobs over a local socket")
+    parser.add_argument("--address", default=DEFAULT_DAEMON_ADDRESS)
+    parser.add_argument("--instances", type=int, default=DEFAULT_INSTANCES, help="Number of browsers to keep warm, one per concurrent job")
+    parser.add_argument("--max-pages", type=int, default=DEFAULT_MAX_PAGES, help="Restart a browser after it has opened this many tabs")
+    parser.add_argument("--health-interval", type=float, default=DEFAULT_HEALTH_INTERVAL, help="Seconds between health checks of idle browsers")
+    parser.add_argument("--no-warm-up", action="store_true", help="Do not visit the site when a browser starts")
+    parser.add_argument("--status", action="store_true", help="Print the status of a running daemon and exit")
+    add_clearance_arguments(parser)
+    add_ratelimit_arguments(parser)
+    args = parser.parse_args()
+
+    if args.status:
+        async def print_status():
+            _, writer, status = await request(args.address, "status")
+            writer.close()
+            print(json.dumps(status, indent=4))
+        asyncio.run(print_status())
+    else:
+        daemon = BrowserDaemon(args.instances, args.max_pages, args.health_interval, None if args.no_warm_up else discovery.BASE_URL, clearance_from_args(args), limiter_from_args(args))
+        try:
+            asyncio.run(daemon.serve(args.address))
+        except KeyboardInterrupt:
+            pass
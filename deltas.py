@@ -0,0 +1,198 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+from models import Movie
+
+
+DEFAULT_STORE_FILE = "snapshot_store.sqlite3"
+DEFAULT_FEED_FILE = "changes.ndjson"
+
+
+def _show_key(city, event_code, cinema, showtime):
+    return {"city": city, "event_code": event_code, "cinema": cinema, "time": showtime}
+
+
+def _seat_fields(row):
+    return {"available_seats": row[0], "blocked_seats": row[1], "total_seats": row[2]}
+
+
+def iter_scraped_cinemas(movie: Movie):
+    for format in movie.formats:
+        for cinema in format.cinemas:
+            showtimes = {}
+            for showtime in cinema.showtimes if cinema.scraped else ():
+                showtimes[showtime.time] = (showtime.available_seats, showtime.blocked_seats, showtime.total_seats)
+
+            yield format.event_code, cinema.name, cinema.scraped, showtimes
+
+
+def content_hash(showtimes: dict) -> str:
+    return hashlib.sha1(json.dumps(sorted(showtimes.items())).encode("utf-8")).hexdigest()
+
+
+class SnapshotStore:
+    def __init__(self, path=DEFAULT_STORE_FILE):
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS shows (
+                city TEXT NOT NULL,
+                event_code TEXT NOT NULL,
+                cinema TEXT NOT NULL,
+                showtime TEXT NOT NULL,
+                available INTEGER NOT NULL,
+                blocked INTEGER NOT NULL,
+                total INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (city, event_code, cinema, showtime)
+            );
+            CREATE TABLE IF NOT EXISTS cinemas (
+                city TEXT NOT NULL,
+                event_code TEXT NOT NULL,
+                cinema TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                PRIMARY KEY (city, event_code, cinema)
+            );
+        """)
+        self._conn.commit()
+
+    def _cinema_hashes(self, city, event_code):
+        rows = self._conn.execute(
+            "SELECT cinema, hash FROM cinemas WHERE city = ? AND event_code = ?",
+            (city, event_code)
+        )
+        return dict(rows)
+
+    def _showtimes(self, city, event_code, cinema):
+        rows = self._conn.execute(
+            "SELECT showtime, available, blocked, total FROM shows WHERE city = ? AND event_code = ? AND cinema = ?",
+            (city, event_code, cinema)
+        )
+        return {showtime: (available, blocked, total) for showtime, available, blocked, total in rows}
+
+    def _replace_cinema(self, city, event_code, cinema, showtimes, digest, now):
+        self._conn.execute(
+            "DELETE FROM shows WHERE city = ? AND event_code = ? AND cinema = ?",
+            (city, event_code, cinema)
+        )
+        self._conn.executemany(
+            "INSERT INTO shows VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(city, event_code, cinema, showtime, *seats, now) for showtime, seats in showtimes.items()]
+        )
+        if digest is None:
+            self._conn.execute(
+                "DELETE FROM cinemas WHERE city = ? AND event_code = ? AND cinema = ?",
+                (city, event_code, cinema)
+            )
+        else:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cinemas VALUES (?, ?, ?, ?)",
+                (city, event_code, cinema, digest)
+            )
+
+    def apply_run(self, city: str, movie: Movie) -> list:
+        now = time.time()
+        changes = []
+        listed = {}
+
+        for event_code, cinema, scraped, showtimes in iter_scraped_cinemas(movie):
+            if event_code not in listed:
+                listed[event_code] = self._cinema_hashes(city, event_code)
+
+            # Any cinema in the run is still listed. One that failed or was skipped by the
+            # crawl budget keeps its stored shows until a run actually reads it.
+            previous_digest = listed[event_code].pop(cinema, None)
+            if not scraped:
+                continue
+
+            digest = content_hash(showtimes)
+            if digest == previous_digest:
+                continue
+
+            previous = self._showtimes(city, event_code, cinema) if previous_digest else {}
+
+            for showtime, seats in showtimes.items():
+                key = _show_key(city, event_code, cinema, showtime)
+                if showtime not in previous:
+                    changes.append({"type": "new", **key, **_seat_fields(seats)})
+                elif previous[showtime] != seats:
+                    changes.append({
+                        "type": "changed",
+                        **key,
+                        **_seat_fields(seats),
+                        "available_delta": seats[0] - previous[showtime][0]
+                    })
+
+            for showtime in previous.keys() - showtimes.keys():
+                changes.append({"type": "removed", **_show_key(city, event_code, cinema, showtime)})
+
+            self._replace_cinema(city, event_code, cinema, showtimes, digest, now)
+
+        # Cinemas that were stored for a crawled event code but no longer listed have no shows left.
+        for event_code, hashes in listed.items():
+            for cinema in hashes:
+                for showtime in self._showtimes(city, event_code, cinema):
+                    changes.append({"type": "removed", **_show_key(city, event_code, cinema, showtime)})
+                self._replace_cinema(city, event_code, cinema, {}, None, now)
+
+        self._conn.commit()
+        return changes
+
+    def apply_refresh(self, city: str, event_code: str, cinema: str, showtime: str, seats: tuple) -> list:
+        # A single show read again between runs. The cinema's hash is recomputed from its stored shows,
+        # so the next run compares against these counts instead of publishing the same delta again.
+        previous = self._showtimes(city, event_code, cinema)
+        if previous.get(showtime) == seats:
+            return []
+
+        key = _show_key(city, event_code, cinema, showtime)
+        if showtime in previous:
+            change = {"type": "changed", **key, **_seat_fields(seats), "available_delta": seats[0] - previous[showtime][0]}
+        else:
+            change = {"type": "new", **key, **_seat_fields(seats)}
+
+        previous[showtime] = seats
+        self._conn.execute(
+            "INSERT OR REPLACE INTO shows VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (city, event_code, cinema, showtime, *seats, time.time())
+        )
+        self._conn.execute(
+            "INSERT OR REPLACE INTO cinemas VALUES (?, ?, ?, ?)",
+            (city, event_code, cinema, content_hash(previous))
+        )
+        self._conn.commit()
+        return [change]
+
+    def close(self):
+        self._conn.close()
+
+
+def append_change_feed(changes, filename=DEFAULT_FEED_FILE, run_at=None):
+    if not changes:
+        return 0
+
+    run_at = run_at or time.time()
+    lines = "".join(
+        json.dumps({"run_at": run_at, **change}, separators=(",", ":"), ensure_ascii=False) + "\n"
+        for change in changes
+    )
+
+    # One write per run keeps lines from concurrent workers from interleaving.
+    with open(filename, "ab") as f:
+        f.write(lines.encode("utf-8"))
+
+    return len(changes)
+
+
+def publish_changes(city: str, movie: Movie, store_file=DEFAULT_STORE_FILE, feed_file=DEFAULT_FEED_FILE):
+    store = SnapshotStore(store_file)
+    try:
+        changes = store.apply_run(city, movie)
+    finally:
+        store.close()
+
+    count = append_change_feed(changes, feed_file)
+    print(f"Published {count} changes to {feed_file}")
+    return changes
@@ -0,0 +1,124 @@
+import json
+import re
+
+import cloudscraper
+
+
+BASE_URL = "https://in.bookmyshow.com"
+
+STATE_PATTERN = re.compile(r'window\.__INITIAL_STATE__\s*=\s*')
+PAGE_CTA_PATH = ("synopsisStore", "synopsisRender", "bannerWidget", "pageCta")
+
+decoder = json.JSONDecoder()
+
+
+def movie_url(city: str, movie_slug: str, movie_code: str) -> str:
+    return f"{BASE_URL}/movies/{city}/{movie_slug}/{movie_code}/"
+
+
+def buytickets_url(city: str, movie_slug: str, event_code: str) -> str:
+    return f"{BASE_URL}/movies/{city}/{movie_slug}/buytickets/{event_code}/"
+
+
+def seat_layout_page_url(city: str, event_code: str, venue_code: str, session_id: str, show_date: str) -> str:
+    return f"{BASE_URL}/movies/{city}/seat-layout/{event_code}/{venue_code}/{session_id}/{show_date}"
+
+
+def extract_page_cta_formats(json_data):
+    try:
+        page_cta = json_data.get("synopsisStore", {}).get("synopsisRender", {}).get("bannerWidget", {}).get("pageCta", [])
+
+        if not page_cta:
+            return {"formats": []}
+
+        booking_cta = page_cta[0] if page_cta else {}
+        meta = booking_cta.get("meta", {})
+        options = meta.get("options", [])
+
+        formats = []
+
+        for option in options:
+            language = option.get("language", "")
+            language_formats = option.get("formats", [])
+
+            for format_item in language_formats:
+                formats.append({
+                    "dimension": format_item.get("dimension", ""),
+                    "eventCode": format_item.get("eventCode", ""),
+                    "language": language
+                })
+
+        return {"formats": formats}
+
+    except Exception as e:
+        print(f"Error extracting pageCta formats: {e}")
+        return {"formats": []}
+
+
+def find_state_start(html: str):
+    match = STATE_PATTERN.search(html)
+    if not match:
+        return -1
+    return match.end()
+
+
+def parse_initial_state(html: str):
+    start = find_state_start(html)
+    if start == -1:
+        return None
+
+    try:
+        state, _ = decoder.raw_decode(html, start)
+    except json.JSONDecodeError:
+        return None
+
+    return state if isinstance(state, dict) else None
+
+
+def _follow_path(value, path):
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def decode_state_subtree(html: str, path):
+    start = find_state_start(html)
+    if start == -1:
+        return None
+
+    # Decode only the value of the first key on the path instead of the whole state.
+    key_pattern = re.compile(re.escape(json.dumps(path[0])) + r'\s*:\s*')
+    match = key_pattern.search(html, start)
+    if match:
+        try:
+            value, _ = decoder.raw_decode(html, match.end())
+            subtree = _follow_path(value, path[1:])
+            if subtree is not None:
+                return subtree
+        except json.JSONDecodeError:
+            pass
+
+    return _follow_path(parse_initial_state(html), path)
+
+
+def formats_from_html(html: str):
+    page_cta = decode_state_subtree(html, PAGE_CTA_PATH)
+    if page_cta is None:
+        return None
+
+    return extract_page_cta_formats({
+        "synopsisStore": {"synopsisRender": {"bannerWidget": {"pageCta": page_cta}}}
+    })
+
+
+def fetch_movie_formats(session: cloudscraper.CloudScraper, city: str, movie_slug: str, movie_code: str):
+    try:
+        response = session.get(movie_url(city, movie_slug, movie_code))
+        if response.status_code != 200:
+            return None
+        return formats_from_html(response.text)
+    except Exception as e:
+        print(f"Error fetching movie page: {e}")
+        return None
@@ -1,83 +1,57 @@
-import zendriver as zd
+import argparse
 import asyncio
 import cloudscraper
 import json
-import time
-from bs4 import BeautifulSoup
+import os
 import re
-
-
-def extract_page_cta_formats(json_data):
-    try:
-        page_cta = json_data.get("synopsisStore", {}).get("synopsisRender", {}).get("bannerWidget", {}).get("pageCta", [])
-        
-        if not page_cta:
-            return {"formats": []}
-        
-        booking_cta = page_cta[0] if page_cta else {}
-        meta = booking_cta.get("meta", {})
-        options = meta.get("options", [])
-        
-        formats = []
-        
-        for option in options:
-            language = option.get("language", "")
-            language_formats = option.get("formats", [])
-            
-            for format_item in language_formats:
-                formats.append({
-                    "dimension": format_item.get("dimension", ""),
-                    "eventCode": format_item.get("eventCode", ""),
-                    "language": language
-                })
-        
-        return {"formats": formats}
-        
-    except Exception as e:
-        print(f"Error extracting pageCta formats: {e}")
-        return {"formats": []}
-
-
-def get_movie_name(movie_name: str, session: cloudscraper.CloudScraper) -> dict:
-    movie_name = movie_name.replace(" ", "%20")
-    url = f"https://in.bookmyshow.com/quickbook-search.bms?q={movie_name}"
-    response = session.get(url)
-    data = response.json()
-    if not data.get("hits"):
-        return None
-
-    movie = data["hits"][0]
-
-    return {
-        "title": movie.get("TITLE"),
-        "group_title": movie.get("GROUP_TITLE"),
-        "release_date": movie.get("RDATE"),
-        "code": movie.get("CODE"),
-        "id": movie.get("ID"),
-        "slug": movie.get("SLUG"),
-        "poster_url": movie.get("POSTER_URL"),
-        "category": movie.get("TYPE_NAME"),
-        "status": movie.get("ST"),
-        "is_stream": movie.get("IS_STREAM"),
-        "is_online": movie.get("IS_ONLINE")
-    }
+import time
+from datetime import date
+from actions import NAVIGATION_BUDGET, OPTIONAL_BUDGET, by_call, by_selector, by_text, click_first, within
+from discovery import buytickets_url, fetch_movie_formats, formats_from_html, movie_url, parse_initial_state, seat_layout_page_url
+from api import DEFAULT_WORKERS, crawl_event_over_http, extract_venues, skipped_cinema
+from blocking import ResourceBlocker, add_blocking_arguments, blocker_from_args
+from checkpoint import DEFAULT_CHECKPOINT_FILE, Checkpoint, FormatCheckpoint
+from clearance import ClearanceStore, add_clearance_arguments, clearance_from_args, has_indicator
+from daemon import add_daemon_arguments, open_browser
+from occupancy import OccupancyStore, capture_seat_map
+from planner import HTTP_COST, CrawlPlanner, add_planner_arguments, planner_from_args
+from ratelimit import RateController, add_ratelimit_arguments, in_thread, limiter_from_args, rate_limited
+from deltas import publish_changes
+from models import Cinema, Format, Movie, Showtime, save_movie
+from metrics import Attempts, print_summary, profiled, serve_metrics, swallowed, timed, write_metrics
+from search import SearchCache, resolve_movies
+from seats import count_seats_in_html, count_seats_in_page, empty_seat_counts
+from snapshot import get_html, get_soup, snapshot_stats
+from stream import NDJSONWriter, fill_from_stream, showtime_record
+from tabpool import DEFAULT_MAX_TABS, TabPool
+from waits import (
+    CINEMA_LIST_SELECTOR,
+    SEAT_LAYOUT_SELECTOR,
+    TIME_SLOT_PAGE_SELECTOR,
+    get_url,
+    mark_seat_table,
+    wait_for_expression,
+    wait_for_network_idle,
+    wait_for_seat_table,
+    wait_for_selector,
+    wait_for_time_slot_page,
+    wait_for_url_change,
+)
+
+
+SHOWTIME_INDICATORS = [
+    "Select Seats",
+    "proceed-Qty",
+    "bar-btn _primary _full-width _centered"
+]
 
 
 async def verify_showtime_page(page):
     try:
-        html = await page.get_content()
-        showtime_indicators = [
-            "Select Seats",
-            "proceed-Qty",
-            "bar-btn _primary _full-width _centered"
-        ]
-        
-        for indicator in showtime_indicators:
-            if indicator in html:
-                return True
-        
-        return False
+        html = await get_html(page)
+        return has_indicator(html, SHOWTIME_INDICATORS)
     except Exception as e:
+        swallowed("verify_showtime_page", e)
         return False
 
 
@@ -86,16 +60,20 @@ async def click_select_seats_button(page):
         if not await verify_showtime_page(page):
             return False
         
-        current_url = page.url
+        current_url = await get_url(page)
         max_attempts = 3
+        attempts = Attempts("click_select_seats_button")
         
         for attempt in range(max_attempts):
             try:
                 try:
+                    strategy = "find"
                     select_seats_button = await page.find("Select Seats", timeout=5)
                     if select_seats_button:
                         await select_seats_button.click()
                 except Exception as e:
+                    swallowed("click_select_seats_button.find", e)
+                    strategy = "proceed_qty"
                     try:
                         await page.evaluate("""
                             (function() {
@@ -108,12 +86,14 @@ async def click_select_seats_button(page):
                             })();
                         """)
                     except Exception as js_error:
+                        swallowed("click_select_seats_button.proceed_qty", js_error)
                         continue
                 
-                time.sleep(3)
+                await wait_for_url_change(page, current_url)
+                await wait_for_selector(page, TIME_SLOT_PAGE_SELECTOR)
                 
-                new_url = page.url
-                html = await page.get_content()
+                new_url = await get_url(page)
+                html = await get_html(page)
                 
                 seat_page_indicators = [
                     "showtime-section",
@@ -124,25 +104,28 @@ async def click_select_seats_button(page):
                 is_seat_page = any(indicator in html for indicator in seat_page_indicators)
                 
                 if new_url != current_url or is_seat_page:
-                    return True
+                    return attempts.won(strategy)
                 else:
                     if attempt < max_attempts - 1:
-                        time.sleep(2)
+                        with timed("sleep"):
+                            await asyncio.sleep(1)
                         
             except Exception as e:
+                swallowed("click_select_seats_button", e)
                 if attempt < max_attempts - 1:
-                    time.sleep(2)
+                    with timed("sleep"):
+                        await asyncio.sleep(1)
         
-        return False
+        return attempts.lost()
         
     except Exception as e:
+        swallowed("click_select_seats_button", e)
         return False
 
 
 async def extract_time_slots(page):
     try:
-        html = await page.get_content()
-        soup = BeautifulSoup(html, "html.parser")
+        soup = await get_soup(page)
         
         time_slots = []
         
@@ -168,13 +151,13 @@ async def extract_time_slots(page):
                         "original_text": time_text,
                         "element_id": element_id,
                         "is_hidden": is_hidden,
-                        "is_active": is_active,
-                        "element": element
+                        "is_active": is_active
                     })
         
         return time_slots
         
     except Exception as e:
+        swallowed("extract_time_slots", e)
         return []
 
 
@@ -183,406 +166,393 @@ async def click_next_button(page):
         next_button = await page.find("Next", timeout=5)
         if next_button:
             await next_button.click()
-            time.sleep(2)
+            await wait_for_network_idle(page, timeout=2)
             return True
         else:
             return False
     except Exception as e:
+        swallowed("click_next_button", e)
         return False
 
 
-async def count_seat_availability(page):
+async def count_seats(page, categories=False):
     try:
-        time.sleep(3)
-        
-        html = await page.get_content()
-        soup = BeautifulSoup(html, "html.parser")
-        
-        seat_table = soup.find("table", class_="setmain")
-        if not seat_table:
-            return {"available": 0, "blocked": 0, "total": 0}
-        
-        available_seats = 0
-        blocked_seats = 0
-        
-        available_elements = seat_table.find_all("a", class_="_available")
-        available_seats = len(available_elements)
-        
-        blocked_elements = seat_table.find_all("a", class_="_blocked")
-        blocked_seats = len(blocked_elements)
-        
-        total_seats = available_seats + blocked_seats
-        
-        return {
-            "available": available_seats,
-            "blocked": blocked_seats,
-            "total": total_seats
-        }
+        with timed("seat_count", method="in_page"):
+            return await count_seats_in_page(page, categories)
+    except Exception as e:
+        swallowed("count_seats_in_page", e)
+        html = await get_html(page)
+        with timed("seat_count", method="html"):
+            return count_seats_in_html(html, categories)
+
+
+async def count_seat_availability(page, categories=False):
+    try:
+        await wait_for_seat_table(page)
+        return await count_seats(page, categories)
         
     except Exception as e:
-        return {"available": 0, "blocked": 0, "total": 0}
+        swallowed("count_seat_availability", e)
+        return empty_seat_counts()
 
 
 async def click_time_slot(page, time_slot):
     try:
         if time_slot.get("is_active"):
-            time.sleep(1)
             return True
         
+        await mark_seat_table(page)
+        strategies = []
+        
         if time_slot.get("element_id"):
-            try:
-                await page.evaluate(f"""
-                    (function() {{
-                        const targetElement = document.getElementById('{time_slot['element_id']}');
-                        if (targetElement) {{
-                            const anchorElement = targetElement.querySelector('a');
-                            if (anchorElement) {{
-                                anchorElement.click();
-                                return true;
-                            }} else {{
-                                targetElement.click();
-                                return true;
-                            }}
-                        }}
-                        return false;
-                    }})();
-                """)
-                time.sleep(3)
-                return True
-            except Exception as e:
-                pass
+            strategies.append(by_selector("element_id", f"[id={json.dumps(time_slot['element_id'])}]", child="a"))
         
-        try:
-            html = await page.get_content()
-            soup = BeautifulSoup(html, "html.parser")
-            showtime_section = soup.find("div", class_="showtime-section")
-            
-            if showtime_section:
-                time_elements = showtime_section.find_all("a", string=lambda text: text and time_slot["time"] in text)
-                if time_elements:
-                    for elem in time_elements:
-                        parent_li = elem.find_parent("li")
-                        if parent_li and not ("_active" in parent_li.get("class", [])):
-                            element_id = parent_li.get("id")
-                            if element_id:
-                                await page.evaluate(f"""
-                                    (function() {{
-                                        const elem = document.getElementById('{element_id}');
-                                        if (elem) {{
-                                            const anchor = elem.querySelector('a');
-                                            if (anchor) {{
-                                                anchor.click();
-                                                return true;
-                                            }}
-                                        }}
-                                        return false;
-                                    }})();
-                                """)
-                                time.sleep(3)
-                                return True
-        except Exception as e:
-            pass
-        
-        try:
-            time_part = time_slot["time"].split()[0]
-            am_pm = time_slot["time"].split()[1] if len(time_slot["time"].split()) > 1 else ""
-            
-            result = await page.evaluate(f"""
-                (function() {{
-                    const timeSlots = document.querySelectorAll('.showtime-section li a');
-                    for (let i = 0; i < timeSlots.length; i++) {{
-                        const slot = timeSlots[i];
-                        if (slot.textContent.includes('{time_part}') && slot.textContent.includes('{am_pm}')) {{
-                            const parentLi = slot.closest('li');
-                            if (parentLi && !parentLi.classList.contains('_active')) {{
-                                slot.click();
-                                return true;
-                            }}
-                        }}
-                    }}
-                    return false;
-                }})();
-            """)
-            
-            if result:
-                time.sleep(3)
-                return True
-        except Exception as e:
-            pass
-        
-        try:
-            time_element = await page.find(time_slot["time"], timeout=3)
-            if time_element:
-                await time_element.click()
-                time.sleep(3)
-                return True
-        except Exception as e:
-            pass
+        strategies.append(by_text("text_match", scope=".showtime-section li a", contains=time_slot["time"].split(), skip_active=True))
+        strategies.append(by_text("text", time_slot["time"]))
         
-        return False
+        return await click_first(page, "click_time_slot", strategies) is not None
         
     except Exception as e:
+        swallowed("click_time_slot", e)
         return False
 
 
 async def click_back_button(page):
     try:
-        try:
-            await page.evaluate("fnClCallout()")
-            time.sleep(3)
-            return True
-        except Exception as e:
-            pass
-        
-        try:
-            back_element = await page.find("#disback", timeout=5)
-            if back_element:
-                await back_element.click()
-                time.sleep(3)
-                return True
-        except Exception as e:
-            pass
-        
-        try:
-            back_element = await page.find(".st-back-btn", timeout=5)
-            if back_element:
-                await back_element.click()
-                time.sleep(3)
-                return True
-        except Exception as e:
-            pass
+        current_url = await get_url(page)
         
-        try:
-            html = await page.get_content()
-            soup = BeautifulSoup(html, "html.parser")
-            back_elements = soup.find_all(attrs={"onclick": "fnClCallout()"})
-            
-            if back_elements:
-                element_id = back_elements[0].get("id")
-                if element_id:
-                    await page.evaluate(f"document.getElementById('{element_id}').click()")
-                    time.sleep(3)
-                    return True
-        except Exception as e:
-            pass
-        
-        try:
-            await page.evaluate("window.history.back()")
-            time.sleep(3)
-            return True
-        except Exception as e:
-            pass
+        async def navigated(timeout):
+            return await wait_for_url_change(page, current_url, timeout)
         
-        return False
+        strategies = [
+            by_call("callout", "fnClCallout"),
+            by_selector("disback", "#disback"),
+            by_selector("back_button", ".st-back-btn"),
+            by_selector("onclick_id", '[onclick="fnClCallout()"]'),
+            by_call("history_back", "history.back")
+        ]
+        return await click_first(page, "click_back_button", strategies, NAVIGATION_BUDGET, navigated) is not None
         
     except Exception as e:
+        swallowed("click_back_button", e)
         return False
 
 
-async def get_top_5_cinemas(movie_slug: str, event_code: str, page):
-    url = f"https://in.bookmyshow.com/movies/{city}/{movie_slug}/buytickets/{event_code}/"
-    await page.get(url)
-    time.sleep(3)
-    
-    html = await page.get_content()
-    soup = BeautifulSoup(html, "html.parser")
+async def list_cinemas(page, limit=None):
+    soup = await get_soup(page)
     
     cinemas = []
     
     cinema_containers = soup.find_all("div", class_="sc-e8nk8f-3 hStBrg")
     
-    for i, container in enumerate(cinema_containers[:5]):
-        try:
-            cinema_name_element = container.find("div", class_="sc-7o7nez-0 hvoTNx")
-            cinema_name = cinema_name_element.text.strip() if cinema_name_element else "Unknown Cinema"
-            
-            first_time_slot = None
-            time_slots = container.find_all("div", class_="sc-1vhizuf-2 jIiAgZ")
-            if time_slots:
-                first_time_slot = time_slots[0].text.strip()
-            
-            cinema_info = {
-                "name": cinema_name,
-                "first_time_slot": first_time_slot,
-                "position": i + 1
-            }
-            
-            cinemas.append(cinema_info)
-            
-            if first_time_slot:
-                print(f"Processing cinema {i+1}: {cinema_name}")
-                
-                cinema_name_for_targeting = ' '.join(cinema_name.split()[:3])
-                click_success = await click_cinema_time_slot_simple(page, cinema_name_for_targeting, first_time_slot)
-                
-                if click_success:
-                    if await verify_time_slot_page(page):
-                        showtime_data = await process_all_time_slots(page, cinema_name)
-                        cinema_info["showtime_data"] = showtime_data
-                        
-                        await page.get(url)
-                        time.sleep(5)
-                        
-                    else:
-                        cinema_info["showtime_data"] = {"error": "Failed to reach time slot page"}
-                        
-                        await page.get(url)
-                        time.sleep(3)
-                else:
-                    cinema_info["showtime_data"] = {"error": "Failed to click first time slot"}
-            else:
-                cinema_info["showtime_data"] = {"error": "No time slots available"}
-            
-            time.sleep(2)
-            
-        except Exception as e:
-            try:
-                await page.get(url)
-                time.sleep(3)
-            except:
-                pass
-            continue
+    for i, container in enumerate(cinema_containers[:limit]):
+        cinema_name_element = container.find("div", class_="sc-7o7nez-0 hvoTNx")
+        cinema_name = cinema_name_element.text.strip() if cinema_name_element else "Unknown Cinema"
+        
+        first_time_slot = None
+        time_slots = container.find_all("div", class_="sc-1vhizuf-2 jIiAgZ")
+        if time_slots:
+            first_time_slot = time_slots[0].text.strip()
+        
+        cinemas.append({
+            "name": cinema_name,
+            "first_time_slot": first_time_slot,
+            "position": i + 1
+        })
+    
+    return cinemas
+
+
+def match_venues(cinemas, venues):
+    by_name = {venue["name"]: venue for venue in venues}
+    
+    for cinema_info in cinemas:
+        venue = by_name.get(cinema_info["name"])
+        if venue is None:
+            name_prefix = ' '.join(cinema_info["name"].split()[:3])
+            venue = next((venue for venue in venues if venue["name"].startswith(name_prefix)), None)
+        
+        if venue is not None:
+            cinema_info["venue_code"] = venue["venue_code"]
+            cinema_info["sessions"] = venue["sessions"]
+    
+    return cinemas
+
+
+def attach_seat_layout_urls(cinemas, city: str, event_code: str):
+    today = date.today().strftime("%Y%m%d")
+    
+    for cinema_info in cinemas:
+        for session in cinema_info.get("sessions", []):
+            session["url"] = seat_layout_page_url(city, event_code, cinema_info["venue_code"], session["session_id"], session.get("date", today))
     
     return cinemas
 
 
-def save_all_cinema_data_to_json(all_formats_data, filename="output.json"):
+async def confirm_seat_quantity(page):
+    try:
+        return bool(await page.evaluate("""
+            (function() {
+                const button = document.getElementById('proceed-Qty');
+                if (button) {
+                    button.click();
+                    return true;
+                }
+                return false;
+            })();
+        """))
+    except Exception as e:
+        swallowed("confirm_seat_quantity", e)
+        return False
+
+
+async def count_seats_at(page, url, navigate=True, limiter: RateController = None):
+    if navigate:
+        with timed("navigate"):
+            await rate_limited(limiter, lambda: page.get(url))
+    
+    if not await wait_for_selector(page, SEAT_LAYOUT_SELECTOR):
+        return None
+    
+    await confirm_seat_quantity(page)
+    # A table that never finished filling in would give partial counts.
+    if not await wait_for_seat_table(page):
+        return None
+    
+    try:
+        seat_data = await count_seats(page)
+    except Exception as e:
+        swallowed("count_seats_at", e)
+        return None
+    
+    return seat_data if seat_data["total"] else None
+
+
+async def process_seat_layouts(pool, cinema_name, sessions, on_showtime=None, completed=None):
     try:
-        output_data = []
+        completed = completed or set()
+        pending = [session for session in sessions if session["time"] not in completed and session.get("url")]
         
-        for format_data in all_formats_data:
-            format_info = format_data["format_info"]
-            cinemas_data = format_data["cinemas"]
-            
-            format_entry = {
-                "movie_type": format_info["dimension"],
-                "language": format_info["language"],
-                "cinemas": []
-            }
-            
-            for cinema in cinemas_data:
-                showtime_data = cinema.get("showtime_data", {})
+        showtimes_data = []
+        processed_times = set()
+        failed_times = []
+        
+        async def collect(page=None):
+            for session in sessions:
+                if session["time"] in processed_times:
+                    continue
                 
-                if "error" in showtime_data or not showtime_data.get("showtimes"):
+                # Already in the stream from an earlier run.
+                if session["time"] in completed:
+                    processed_times.add(session["time"])
                     continue
                 
-                cinema_entry = {
-                    "name": cinema["name"],
-                    "showtimes": []
-                }
+                if page is None or not session.get("url"):
+                    continue
                 
-                for showtime in showtime_data.get("showtimes", []):
-                    showtime_entry = {
-                        "time": showtime["time"],
-                        "available_seats": showtime["available_seats"],
-                        "blocked_seats": showtime["blocked_seats"],
-                        "total_seats": showtime["total_seats"]
-                    }
-                    cinema_entry["showtimes"].append(showtime_entry)
+                seat_data = await count_seats_at(page, session["url"], session is not pending[0], pool.limiter)
+                if seat_data is None:
+                    failed_times.append(session["time"])
+                    continue
                 
-                if cinema_entry["showtimes"]:
-                    format_entry["cinemas"].append(cinema_entry)
-            
-            if format_entry["cinemas"]:
-                output_data.append(format_entry)
+                showtime_info = Showtime(session["time"], seat_data["available"], seat_data["blocked"], seat_data["total"], session["session_id"], session.get("date"))
+                
+                showtimes_data.append(showtime_info)
+                processed_times.add(session["time"])
+                
+                if on_showtime:
+                    await on_showtime(cinema_name, showtime_info, page)
+        
+        if pending:
+            # One tab per cinema, navigated straight from one seat layout to the next.
+            async with pool.tab(pending[0]["url"]) as page:
+                await collect(page)
+        else:
+            await collect()
+        
+        if not processed_times:
+            return Cinema(cinema_name, (), error="Could not open any seat layout")
         
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(output_data, f, indent=4, ensure_ascii=False)
+        # A cinema with failed showtimes is left out of the checkpoint, so a resumed run retries them.
+        return Cinema(cinema_name, tuple(showtimes_data), failed_showtimes=tuple(failed_times))
         
+    except Exception as e:
+        return Cinema(cinema_name, (), error=str(e))
+
+
+async def crawl_cinema(pool, url: str, cinema_info: dict, on_showtime=None, checkpoint: FormatCheckpoint = None, planner: CrawlPlanner = None, keep_showtimes=True):
+    cinema = await read_cinema(pool, url, cinema_info, on_showtime, checkpoint, planner)
+    # Streamed showtimes are read back from the stream when the crawl ends, so they are not held here too.
+    return cinema if keep_showtimes else cinema._replace(showtimes=())
+
+
+async def read_cinema(pool, url: str, cinema_info: dict, on_showtime=None, checkpoint: FormatCheckpoint = None, planner: CrawlPlanner = None):
+    cinema_name = cinema_info["name"]
+    first_time_slot = cinema_info["first_time_slot"]
+    venue_code = cinema_info.get("venue_code")
+    
+    if checkpoint and checkpoint.completed_cinema(cinema_name):
+        return Cinema(cinema_name, (), venue_code)
+    
+    if planner is not None and planner.expired():
+        return skipped_cinema(cinema_name, venue_code)
+    
+    if cinema_info.get("sessions"):
+        attempts = Attempts("crawl_cinema")
+        completed = checkpoint.completed_showtimes(cinema_name) if checkpoint else None
+        cinema = (await process_seat_layouts(pool, cinema_name, cinema_info["sessions"], on_showtime, completed))._replace(venue_code=venue_code)
+        
+        if cinema.scraped:
+            attempts.won("deep_link")
+            if cinema.failed_showtimes:
+                print(f"Could not read the seat layout of {', '.join(cinema.failed_showtimes)} at {cinema_name}")
+            if checkpoint:
+                checkpoint.record_cinema(cinema)
+            return cinema
+        
+        print(f"Deep links failed for {cinema_name} ({cinema.error}), falling back to the time slot carousel")
+    
+    if not first_time_slot:
+        return Cinema(cinema_name, (), venue_code, "No time slots available")
+    
+    try:
+        async with pool.tab(url) as page:
+            await wait_for_selector(page, CINEMA_LIST_SELECTOR)
+            
+            print(f"Processing cinema {cinema_info['position']}: {cinema_name}")
+            
+            cinema_name_for_targeting = ' '.join(cinema_name.split()[:3])
+            click_success = await click_cinema_time_slot_simple(page, cinema_name_for_targeting, first_time_slot)
+            
+            if not click_success:
+                cinema = Cinema(cinema_name, (), error="Failed to click first time slot")
+            elif not await verify_time_slot_page(page):
+                cinema = Cinema(cinema_name, (), error="Failed to reach time slot page")
+            else:
+                completed = checkpoint.completed_showtimes(cinema_name) if checkpoint else None
+                cinema = await process_all_time_slots(page, cinema_name, on_showtime, completed)
+    
+    except Exception as e:
+        cinema = Cinema(cinema_name, (), error=str(e))
+    
+    cinema = cinema._replace(venue_code=venue_code)
+    if checkpoint:
+        checkpoint.record_cinema(cinema)
+    
+    return cinema
+
+
+async def get_planned_cinemas(city: str, movie_slug: str, event_code: str, pool, on_showtime=None, checkpoint: FormatCheckpoint = None, planner: CrawlPlanner = None, keep_showtimes=True):
+    url = buytickets_url(city, movie_slug, event_code)
+    
+    async with pool.tab(url) as page:
+        await wait_for_selector(page, CINEMA_LIST_SELECTOR)
+        cinemas = await list_cinemas(page)
+        state = parse_initial_state(await get_html(page))
+    
+    # Session IDs from the page state let each showtime be opened directly by its seat layout URL.
+    if state is not None:
+        attach_seat_layout_urls(match_venues(cinemas, extract_venues(state)), city, event_code)
+    
+    planned = planner.plan(cinemas) if planner is not None else cinemas
+    results = await pool.map(lambda cinema_info: crawl_cinema(pool, url, cinema_info, on_showtime, checkpoint, planner, keep_showtimes), planned)
+    return results + (planner.skipped(cinemas, planned) if planner is not None else [])
+
+
+async def crawl_format(city: str, movie_slug: str, format: dict, pool, session: cloudscraper.CloudScraper = None, stream: NDJSONWriter = None, checkpoint: Checkpoint = None, occupancy: OccupancyStore = None, planner: CrawlPlanner = None):
+    format_checkpoint = checkpoint.for_format(f"{city}/{movie_slug}", format["eventCode"]) if checkpoint else None
+    
+    async def on_showtime(cinema_name, showtime, page=None, seat_map=None):
+        scraped_at = time.time()
+        if stream is not None:
+            stream.write(showtime_record(city, format, cinema_name, showtime, scraped_at))
+        if format_checkpoint is not None:
+            format_checkpoint.record_showtime(cinema_name, showtime)
+        if occupancy is not None:
+            if seat_map is None and page is not None:
+                seat_map = await capture_seat_map(page)
+            show_key = (city, format["eventCode"], cinema_name, showtime.time)
+            occupancy.append(show_key, seat_map, scraped_at)
+    
+    try:
+        cinemas = None
+        if session is not None:
+            loop = asyncio.get_event_loop()
+            completed = (lambda venue: format_checkpoint.completed_showtimes(venue["name"])) if format_checkpoint else None
+            
+            def resumed(venue):
+                return completed is not None and all(showtime["time"] in completed(venue) for showtime in venue["sessions"])
+            
+            def select(venues):
+                # Cinemas finished by an earlier run cost nothing, so only the rest count against the budget.
+                chosen = {id(venue) for venue in planner.plan([venue for venue in venues if not resumed(venue)], HTTP_COST, DEFAULT_WORKERS)}
+                return [venue for venue in venues if resumed(venue) or id(venue) in chosen]
+            
+            with timed("http_crawl"):
+                listed = await loop.run_in_executor(None, lambda: crawl_event_over_http(session, city, movie_slug, format["eventCode"], select=select if planner is not None else None,
+                                                                                        seat_maps=occupancy is not None, completed=completed))
+            
+            if listed is not None:
+                for cinema_info in listed:
+                    seat_maps = cinema_info.pop("seat_maps", {})
+                    cinema = cinema_info.get("result")
+                    if cinema is not None and cinema.scraped:
+                        for showtime in cinema.showtimes:
+                            await on_showtime(cinema.name, showtime, seat_map=seat_maps.get(showtime.session_id))
+                        if format_checkpoint:
+                            format_checkpoint.record_cinema(cinema)
+                        if stream is not None:
+                            cinema_info["result"] = cinema._replace(showtimes=())
+                
+                url = buytickets_url(city, movie_slug, format["eventCode"])
+                fallback = [cinema_info for cinema_info in listed if "result" not in cinema_info]
+                attach_seat_layout_urls(fallback, city, format["eventCode"])
+                crawled = iter(await pool.map(lambda cinema_info: crawl_cinema(pool, url, cinema_info, on_showtime, format_checkpoint, planner, stream is None), fallback))
+                cinemas = [cinema_info["result"] if "result" in cinema_info else next(crawled) for cinema_info in listed]
+        
+        if cinemas is None:
+            cinemas = await get_planned_cinemas(city, movie_slug, format["eventCode"], pool, on_showtime, format_checkpoint, planner, stream is None)
+    except Exception as e:
+        print(f"Error crawling format {format['dimension']} ({format['language']}): {e}")
+        cinemas = []
+    
+    # Only the records are kept; the listing with its sessions and seat layout URLs is dropped here.
+    return Format(format["language"], format["dimension"], format["eventCode"], tuple(cinemas))
+
+
+def save_all_cinema_data(movie: Movie, filename="output.json"):
+    try:
+        save_movie(movie, filename)
         print(f"Successfully saved all cinema data to {filename}")
         return True
         
     except Exception as e:
-        print(f"Error saving cinema data to JSON: {e}")
+        print(f"Error saving cinema data to {filename}: {e}")
         return False
 
 
 async def click_cinema_time_slot_simple(page, cinema_name: str, time_slot: str):
     try:
-        max_attempts = 3
-        for attempt in range(max_attempts):
-            try:
-                result = await page.evaluate(f"""
-                    (function() {{
-                        const cinemaContainers = document.querySelectorAll('.sc-e8nk8f-3.hStBrg');
-                        
-                        for (let i = 0; i < cinemaContainers.length; i++) {{
-                            const container = cinemaContainers[i];
-                            
-                            const cinemaNameElement = container.querySelector('.sc-7o7nez-0.hvoTNx');
-                            if (cinemaNameElement) {{
-                                const containerCinemaName = cinemaNameElement.textContent.trim();
-                                
-                                if (containerCinemaName.includes('{cinema_name}')) {{
-                                    const timeSlots = container.querySelectorAll('.sc-1vhizuf-2.jIiAgZ');
-                                    
-                                    for (let j = 0; j < timeSlots.length; j++) {{
-                                        const slot = timeSlots[j];
-                                        const slotText = slot.textContent.trim();
-                                        
-                                        if (slotText === '{time_slot}') {{
-                                            slot.click();
-                                            return true;
-                                        }}
-                                    }}
-                                    
-                                    return false;
-                                }}
-                            }}
-                        }}
-                        
-                        return false;
-                    }})();
-                """)
-                
-                if result:
-                    time.sleep(1)
-                    
-                    try:
-                        continue_button = await page.find("Continue", timeout=2)
-                        if continue_button:
-                            await continue_button.click()
-                            time.sleep(5)
-                        else:
-                            time.sleep(5)
-                    except Exception:
-                        time.sleep(5)
-                    
-                    return True
-                else:
-                    try:
-                        time_element = await page.find(time_slot, timeout=3)
-                        if time_element:
-                            await time_element.click()
-                            time.sleep(1)
-                            
-                            try:
-                                continue_button = await page.find("Continue", timeout=2)
-                                if continue_button:
-                                    await continue_button.click()
-                                    time.sleep(5)
-                                else:
-                                    time.sleep(5)
-                            except Exception:
-                                time.sleep(5)
-                            
-                            return True
-                    except Exception as fallback_error:
-                        pass
-                    
-            except Exception as e:
-                if attempt < max_attempts - 1:
-                    time.sleep(2)
+        current_url = await get_url(page)
+        strategies = [
+            by_text("container", time_slot, scope=".sc-1vhizuf-2.jIiAgZ", within=within(CINEMA_LIST_SELECTOR, ".sc-7o7nez-0.hvoTNx", cinema_name)),
+            by_text("text", time_slot)
+        ]
+        if await click_first(page, "click_cinema_time_slot", strategies) is None:
+            return False
         
-        return False
+        await click_first(page, "click_continue", [by_text("continue", "Continue", scope="button, a, div, span")], OPTIONAL_BUDGET)
+        await wait_for_time_slot_page(page, current_url)
+        return True
         
     except Exception as e:
+        swallowed("click_cinema_time_slot", e)
         return False
 
 
 async def verify_time_slot_page(page):
     try:
-        html = await page.get_content()
+        html = await get_html(page)
         
         time_slot_indicators = [
             "showtime-section",
@@ -597,14 +567,15 @@ async def verify_time_slot_page(page):
         return False
         
     except Exception as e:
+        swallowed("verify_time_slot_page", e)
         return False
 
 
-async def process_all_time_slots(page, cinema_name):
+async def process_all_time_slots(page, cinema_name, on_showtime=None, completed=None):
     try:
         all_time_slots = await extract_time_slots(page)
         if not all_time_slots:
-            return {"cinema": cinema_name, "showtimes": [], "error": "No time slots found"}
+            return Cinema(cinema_name, (), error="No time slots found")
         
         showtimes_data = []
         processed_times = set()
@@ -615,7 +586,10 @@ async def process_all_time_slots(page, cinema_name):
             
             if time_slot["is_hidden"]:
                 await click_next_button(page)
-                time.sleep(2)
+            
+            if completed and time_slot["time"] in completed:
+                processed_times.add(time_slot["time"])
+                continue
             
             if time_slot.get("is_active"):
                 seat_data = await count_seat_availability(page)
@@ -625,95 +599,160 @@ async def process_all_time_slots(page, cinema_name):
                 else:
                     continue
             
-            showtime_info = {
-                "time": time_slot["time"],
-                "available_seats": seat_data["available"],
-                "blocked_seats": seat_data["blocked"],
-                "total_seats": seat_data["total"]
-            }
+            showtime_info = Showtime(time_slot["time"], seat_data["available"], seat_data["blocked"], seat_data["total"])
             
             showtimes_data.append(showtime_info)
             processed_times.add(time_slot["time"])
             
-            time.sleep(1)
+            if on_showtime:
+                await on_showtime(cinema_name, showtime_info, page)
         
-        return {
-            "cinema": cinema_name,
-            "showtimes": showtimes_data,
-            "total_showtimes": len(showtimes_data)
-        }
+        return Cinema(cinema_name, tuple(showtimes_data))
         
     except Exception as e:
-        return {"cinema": cinema_name, "showtimes": [], "error": str(e)}
+        return Cinema(cinema_name, (), error=str(e))
 
 
-async def main(city: str, movie_slug: str, movie_code: str):
-    browser = await zd.start(headless=True)
-    url = f"https://in.bookmyshow.com/movies/{city}/{movie_slug}/{movie_code}/"
-    page = await browser.get(url)
-    time.sleep(5)
-    html = await page.get_content()
+async def discover_formats_in_browser(browser, city: str, movie_slug: str, movie_code: str, blocker: ResourceBlocker = None, clearance: ClearanceStore = None, limiter: RateController = None):
+    started = time.time()
+    with timed("navigate"):
+        if blocker is not None:
+            page = await rate_limited(limiter, lambda: blocker.get(browser, movie_url(city, movie_slug, movie_code)))
+        else:
+            page = await rate_limited(limiter, lambda: browser.get(movie_url(city, movie_slug, movie_code)))
+    # The shared cookies are dropped when they no longer pass, and replaced if the browser solves the challenge.
+    challenged = clearance is not None and await clearance.check_page(page, started)
+    await wait_for_expression(page, "typeof window.__INITIAL_STATE__ !== 'undefined'")
     
-    soup = BeautifulSoup(html, "html.parser")
+    formatted_data = formats_from_html(await get_html(page))
+    if formatted_data is None:
+        print("Could not read window.__INITIAL_STATE__ from the movie page")
+    elif clearance is not None:
+        await clearance.capture_browser(browser, force=challenged)
     
-    scripts = soup.find_all("script", type="text/javascript")
-    target_script = None
+    return formatted_data
+
+
+async def scrape_movie(browser, city: str, movie_slug: str, movie_code: str, *, max_tabs: int = DEFAULT_MAX_TABS, output_file: str = "output.json", formatted_data: dict = None, session: cloudscraper.CloudScraper = None, changes_file: str = None, stream_file: str = None, checkpoint: Checkpoint = None, occupancy: OccupancyStore = None, blocker: ResourceBlocker = None, planner: CrawlPlanner = None, clearance: ClearanceStore = None, limiter: RateController = None):
+    if formatted_data is None:
+        formatted_data = await discover_formats_in_browser(browser, city, movie_slug, movie_code, blocker, clearance, limiter)
+        if formatted_data is None:
+            return None
+        # The browser got through where the HTTP client did not, so the HTTP crawl reuses its cookies.
+        if clearance is not None and session is not None:
+            clearance.apply_session(session)
     
-    for script in scripts:
-        if script.string and "window.__INITIAL_STATE__" in script.string:
-            target_script = script
-            break
+    if checkpoint is not None and checkpoint.resume and not stream_file:
+        raise ValueError("Resuming needs the showtime stream of the interrupted run")
+    # A resumed run keeps the showtimes the interrupted one already streamed.
+    stream = NDJSONWriter(stream_file, "a" if checkpoint is not None and checkpoint.resume else "w") if stream_file else None
     
-    if not target_script or not target_script.string:
-        print("Could not find script tag with window.__INITIAL_STATE__")
-        await browser.stop()
-        return
+    planner = (planner or CrawlPlanner(concurrency=max_tabs)).start()
+    format_planner = planner.for_formats(len(formatted_data["formats"]))
     
+    pool = TabPool(browser, max_tabs, blocker, limiter)
     try:
-        data = target_script.string
-        data = data.split("window.__INITIAL_STATE__ = ")[1]
-        end_markers = ["};</script>", "};\n", "};"]
-        end_pos = -1
-        for marker in end_markers:
-            pos = data.find(marker)
-            if pos != -1:
-                end_pos = pos + 1
-                break
-        
-        if end_pos == -1:
-            end_pos = data.find("</script>")
-            if end_pos != -1:
-                temp_data = data[:end_pos]
-                end_pos = temp_data.rfind("}") + 1
-        
-        if end_pos != -1:
-            data = data[:end_pos]
-        
-        json_data = json.loads(data)
-        
-        formatted_data = extract_page_cta_formats(json_data)
-        
-    except (IndexError, json.JSONDecodeError) as e:
-        print(f"Error parsing JSON data: {e}")
+        formats = await pool.map(
+            lambda format: crawl_format(city, movie_slug, format, pool, session, stream, checkpoint, occupancy, format_planner),
+            formatted_data["formats"]
+        )
+    finally:
+        if stream:
+            stream.close()
+    movie = Movie(tuple(formats), city, movie_slug, movie_code)
+    if stream:
+        movie = fill_from_stream(movie, stream_file)
     
-    all_formats_data = []
+    save_all_cinema_data(movie, output_file)
     
-    for format in formatted_data["formats"]:
-        cinemas = await get_top_5_cinemas(movie_slug, format["eventCode"], page)
-        
-        format_data = {
-            "format_info": format,
-            "cinemas": cinemas
-        }
-        all_formats_data.append(format_data)
+    if changes_file:
+        publish_changes(city, movie, feed_file=changes_file)
+    
+    cache = snapshot_stats()
+    print(f"Snapshot cache: {cache['html_hits']} HTML hits / {cache['html_misses']} misses, "
+          f"{cache['soup_hits']} parse hits / {cache['soup_misses']} misses")
+    if blocker is not None:
+        print(blocker.summary())
+    print_summary()
     
-    save_all_cinema_data_to_json(all_formats_data, "output.json")
+    return movie
+
+
+async def main(city: str, movie_slug: str, movie_code: str, max_tabs: int = DEFAULT_MAX_TABS, output_file: str = "output.json", session: cloudscraper.CloudScraper = None, seats: bool = True, changes_file: str = None, stream_file: str = None, checkpoint_file: str = None, resume: bool = False, occupancy_dir: str = None, metrics_file: str = None, profile_file: str = None, blocker: ResourceBlocker = None, planner: CrawlPlanner = None, daemon: str = None, clearance: ClearanceStore = None, limiter: RateController = None):
+    formatted_data = None
+    if session is not None:
+        if limiter is not None:
+            limiter.install(session)
+        if clearance is not None:
+            clearance.apply_session(session)
+        formatted_data = await in_thread(fetch_movie_formats, session, city, movie_slug, movie_code)
+        if formatted_data is not None and clearance is not None:
+            clearance.capture_session(session)
     
-    await browser.stop()
+    if formatted_data is not None:
+        if not formatted_data["formats"]:
+            print("No formats available for this movie")
+            return formatted_data
+        if not seats:
+            return formatted_data
+    
+    checkpoint = Checkpoint(checkpoint_file or DEFAULT_CHECKPOINT_FILE, resume) if seats and (checkpoint_file or resume) else None
+    if resume and not stream_file:
+        stream_file = os.path.splitext(output_file)[0] + ".ndjson"
+    occupancy = OccupancyStore(occupancy_dir) if seats and occupancy_dir else None
+    
+    try:
+        async with open_browser(daemon, clearance) as browser:
+            if not seats:
+                return await discover_formats_in_browser(browser, city, movie_slug, movie_code, blocker, clearance, limiter)
+            with profiled(profile_file):
+                return await scrape_movie(
+                    browser, city, movie_slug, movie_code, max_tabs=max_tabs, output_file=output_file, formatted_data=formatted_data, session=session,
+                    changes_file=changes_file, stream_file=stream_file, checkpoint=checkpoint, occupancy=occupancy, blocker=blocker, planner=planner,
+                    clearance=clearance, limiter=limiter
+                )
+    finally:
+        if checkpoint:
+            checkpoint.close()
+        if occupancy:
+            occupancy.close()
+        if metrics_file:
+            write_metrics(metrics_file)
 
 if __name__ == "__main__":
-    city = "vadodara"
-    movie_name = "how to train your dragon"
+    parser = argparse.ArgumentParser(description="Scrape showtimes and seat availability for a movie in a city")
+    parser.add_argument("--city", default="vadodara")
+    parser.add_argument("--movie", default="how to train your dragon")
+    parser.add_argument("--resume", action="store_true", help="Skip cinemas and showtimes already recorded in the checkpoint")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_FILE)
+    parser.add_argument("--occupancy", help="Directory to store per-seat occupancy snapshots in")
+    parser.add_argument("--output", default="output.json", help="Where to save the results (.bms for the compact binary format, otherwise JSON)")
+    parser.add_argument("--metrics", help="Write stage timings and counters to this file (.json for JSON, otherwise Prometheus text)")
+    parser.add_argument("--metrics-port", type=int, help="Serve live metrics on http://127.0.0.1:PORT/metrics while scraping")
+    parser.add_argument("--profile", help="Save a cProfile dump of the scrape to this file")
+    add_blocking_arguments(parser)
+    add_planner_arguments(parser)
+    add_daemon_arguments(parser)
+    add_clearance_arguments(parser)
+    add_ratelimit_arguments(parser)
+    args = parser.parse_args()
+    
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
+    
+    city = args.city
+    movie_name = args.movie
     session = cloudscraper.create_scraper()
-    data = get_movie_name(movie_name, session)
-    asyncio.run(main(city, data["slug"], data["id"]))
\ No newline at end of file
+    limiter = limiter_from_args(args)
+    if limiter is not None:
+        limiter.install(session)
+    clearance = clearance_from_args(args)
+    if clearance is not None:
+        clearance.apply_session(session)
+    cache = SearchCache()
+    data = resolve_movies([movie_name], session, cache)[movie_name]
+    cache.close()
+    asyncio.run(main(city, data["slug"], data["id"], output_file=args.output, session=session, stream_file=os.path.splitext(args.output)[0] + ".ndjson",
+                     checkpoint_file=args.checkpoint, resume=args.resume, occupancy_dir=args.occupancy,
+                     metrics_file=args.metrics, profile_file=args.profile, blocker=blocker_from_args(args),
+                     planner=planner_from_args(args, city, DEFAULT_MAX_TABS), daemon=args.daemon, clearance=clearance, limiter=limiter))
\ No newline at end of file
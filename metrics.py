@@ -0,0 +1,249 @@
+import argparse
+import cProfile
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+PREFIX = "bms_"
+# Latency buckets in seconds, from a cached DOM read up to a slow navigation.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+HELP = {
+    "stage_seconds": "Time spent per scraping stage",
+    "strategy_seconds": "Time from the start of an action until a fallback strategy succeeded or it gave up",
+    "strategy_total": "Which fallback strategy an action ended with",
+    "swallowed_exceptions_total": "Exceptions caught and ignored, by location and type",
+    "waits_total": "Polling waits by outcome",
+    "blocked_requests_total": "Browser requests blocked by resource type",
+    "daemon_restarts_total": "Warm browsers restarted by the daemon, by reason",
+    "clearance_total": "Anti-bot cookies captured from or applied to a client",
+    "ratelimit_total": "Rate-limited requests by client and outcome (ok, slow, error, 403, 429, challenge)",
+    "service_total": "Availability service lookups by layer: scrapes, coalesced waits and cache hits"
+}
+
+_lock = threading.Lock()
+counters = {}
+histograms = {}
+# Modules that keep their own per-job statistics register a reset here.
+_reset_hooks = []
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        counters[key] = counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    key = _key(name, labels)
+    with _lock:
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram["buckets"][i] += 1
+                break
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+
+
+@contextmanager
+def timed(stage, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("stage_seconds", time.perf_counter() - started, stage=stage, **labels)
+
+
+def swallowed(where, error):
+    inc("swallowed_exceptions_total", where=where, type=type(error).__name__)
+
+
+class Attempts:
+    def __init__(self, action):
+        self.action = action
+        self.started = time.perf_counter()
+
+    def won(self, strategy):
+        inc("strategy_total", action=self.action, strategy=strategy)
+        observe("strategy_seconds", time.perf_counter() - self.started, action=self.action, strategy=strategy)
+        return True
+
+    def lost(self):
+        inc("strategy_total", action=self.action, strategy="none")
+        observe("strategy_seconds", time.perf_counter() - self.started, action=self.action, strategy="none")
+        return False
+
+
+def on_reset(hook):
+    _reset_hooks.append(hook)
+    return hook
+
+
+def reset():
+    with _lock:
+        counters.clear()
+        histograms.clear()
+    for hook in _reset_hooks:
+        hook()
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def to_prometheus() -> str:
+    with _lock:
+        counter_items = sorted(counters.items())
+        histogram_items = sorted((key, dict(value, buckets=list(value["buckets"]))) for key, value in histograms.items())
+
+    lines = []
+    seen = set()
+
+    def header(name, kind):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {PREFIX}{name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+    for (name, labels), value in counter_items:
+        header(name, "counter")
+        lines.append(f"{PREFIX}{name}{_format_labels(labels)} {value}")
+
+    for (name, labels), histogram in histogram_items:
+        header(name, "histogram")
+        cumulative = 0
+        for bound, count in zip(BUCKETS, histogram["buckets"]):
+            cumulative += count
+            lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+        lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {histogram['sum']:.6f}")
+        lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {histogram['count']}")
+
+    return "\n".join(lines) + "\n"
+
+
+def to_json() -> dict:
+    with _lock:
+        return {
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(counters.items())
+            ],
+            "histograms": [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "buckets": dict(zip([str(bound) for bound in BUCKETS], histogram["buckets"])),
+                    "sum": histogram["sum"],
+                    "count": histogram["count"]
+                }
+                for (name, labels), histogram in sorted(histograms.items())
+            ]
+        }
+
+
+def write_metrics(filename: str):
+    with open(filename, "w", encoding="utf-8") as f:
+        if filename.endswith(".json"):
+            json.dump(to_json(), f, indent=4, ensure_ascii=False)
+        else:
+            f.write(to_prometheus())
+
+
+def summary(top=10) -> list:
+    with _lock:
+        stages = [(dict(labels), h["sum"], h["count"]) for (name, labels), h in histograms.items() if name == "stage_seconds"]
+    return sorted(stages, key=lambda stage: -stage[1])[:top]
+
+
+def print_summary(top=10):
+    print("Time by stage:")
+    for labels, total, count in summary(top):
+        name = labels.pop("stage")
+        detail = f" ({', '.join(f'{k}={v}' for k, v in labels.items())})" if labels else ""
+        print(f"  {total:8.2f}s  {count:6d}x  {name}{detail}")
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body = json.dumps(to_json()).encode("utf-8")
+            content_type = "application/json"
+        elif self.path.startswith("/metrics"):
+            body = to_prometheus().encode("utf-8")
+            content_type = "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port: int, host="127.0.0.1"):
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+@contextmanager
+def profiled(filename: str = None):
+    if not filename:
+        yield None
+        return
+
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        profile.dump_stats(filename)
+        print(f"Saved profile to {filename}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the slowest stages from a saved JSON metrics file")
+    parser.add_argument("metrics_file")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    with open(args.metrics_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    reset()
+    for counter in data["counters"]:
+        inc(counter["name"], counter["value"], **counter["labels"])
+    for histogram in data["histograms"]:
+        histograms[_key(histogram["name"], histogram["labels"])] = {
+            "buckets": list(histogram["buckets"].values()),
+            "sum": histogram["sum"],
+            "count": histogram["count"]
+        }
+
+    print_summary(args.top)
+    print("\nCounters:")
+    for counter in data["counters"]:
+        print(f"  {counter['value']:8d}  {counter['name']} {counter['labels']}")
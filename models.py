@@ -0,0 +1,259 @@
+import argparse
+import json
+import mmap
+import struct
+from contextlib import contextmanager
+from typing import NamedTuple, Tuple
+
+
+BINARY_SUFFIX = ".bms"
+MAGIC = b"BMS1"
+VERSION = 2
+NONE = 0xFFFFFFFF
+
+# Every string is stored once in a table and referenced by index, so repeated cinema
+# names and show times cost four bytes each. Records are fixed width and read in place.
+HEADER = struct.Struct("<4sHHIIIIIII")
+FORMAT = struct.Struct("<IIIII")
+CINEMA = struct.Struct("<IIII")
+# Seat counts are 16-bit; no auditorium comes close to 65535 seats.
+SHOWTIME = struct.Struct("<IIIHHH")
+SEATS = struct.Struct("<HHH")
+
+
+class SeatCounts(NamedTuple):
+    available: int
+    blocked: int
+    total: int
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(data["available"], data["blocked"], data["total"])
+
+
+class Showtime(NamedTuple):
+    time: str
+    available_seats: int
+    blocked_seats: int
+    total_seats: int
+    session_id: str = None
+    # The show date as YYYYMMDD, when the listing gave one.
+    date: str = None
+
+    @property
+    def seats(self):
+        return SeatCounts(self.available_seats, self.blocked_seats, self.total_seats)
+
+    def to_dict(self):
+        return {
+            "time": self.time,
+            "available_seats": self.available_seats,
+            "blocked_seats": self.blocked_seats,
+            "total_seats": self.total_seats
+        }
+
+
+class Cinema(NamedTuple):
+    name: str
+    showtimes: Tuple[Showtime, ...]
+    venue_code: str = None
+    # Set when the cinema could not be read, or was skipped on purpose. Either way it is left out of the output.
+    error: str = None
+    skipped: bool = False
+    failed_showtimes: Tuple[str, ...] = ()
+
+    @property
+    def scraped(self):
+        return self.error is None
+
+    def to_dict(self):
+        return {"name": self.name, "showtimes": [showtime.to_dict() for showtime in self.showtimes]}
+
+
+class Format(NamedTuple):
+    language: str
+    dimension: str
+    event_code: str
+    cinemas: Tuple[Cinema, ...]
+
+    def to_dict(self):
+        return {"movie_type": self.dimension, "language": self.language, "cinemas": [cinema.to_dict() for cinema in self.cinemas]}
+
+
+class Movie(NamedTuple):
+    formats: Tuple[Format, ...]
+    city: str = None
+    slug: str = None
+    code: str = None
+
+    def saved(self):
+        # Cinemas that failed, were skipped or have no showtimes are left out, as in output.json.
+        formats = []
+        for format in self.formats:
+            cinemas = tuple(cinema for cinema in format.cinemas if cinema.scraped and cinema.showtimes)
+            if cinemas:
+                formats.append(format._replace(cinemas=cinemas))
+        return self._replace(formats=tuple(formats))
+
+    @classmethod
+    def from_output(cls, output_data):
+        return cls(tuple(
+            Format(format["language"], format["movie_type"], None, tuple(
+                Cinema(cinema["name"], tuple(
+                    Showtime(showtime["time"], showtime["available_seats"], showtime["blocked_seats"], showtime["total_seats"])
+                    for showtime in cinema["showtimes"]
+                ))
+                for cinema in format["cinemas"]
+            ))
+            for format in output_data
+        ))
+
+    def to_output(self):
+        return [format.to_dict() for format in self.formats]
+
+
+def dumps(movie: Movie) -> bytes:
+    strings = {}
+
+    def ref(text):
+        if text is None:
+            return NONE
+        index = strings.get(text)
+        if index is None:
+            index = strings[text] = len(strings)
+        return index
+
+    movie_refs = (ref(movie.city), ref(movie.slug), ref(movie.code))
+    formats = bytearray()
+    cinemas = bytearray()
+    showtimes = bytearray()
+    cinema_count = 0
+    showtime_count = 0
+
+    for format in movie.formats:
+        formats += FORMAT.pack(ref(format.language), ref(format.dimension), ref(format.event_code), cinema_count, len(format.cinemas))
+        for cinema in format.cinemas:
+            cinemas += CINEMA.pack(ref(cinema.name), ref(cinema.venue_code), showtime_count, len(cinema.showtimes))
+            for showtime in cinema.showtimes:
+                showtimes += SHOWTIME.pack(ref(showtime.time), ref(showtime.session_id), ref(showtime.date), showtime.available_seats, showtime.blocked_seats, showtime.total_seats)
+            cinema_count += 1
+            showtime_count += len(cinema.showtimes)
+
+    encoded = [text.encode("utf-8") for text in strings]
+    ends = []
+    end = 0
+    for text in encoded:
+        end += len(text)
+        ends.append(end)
+
+    return b"".join((
+        HEADER.pack(MAGIC, VERSION, 0, len(encoded), len(movie.formats), cinema_count, showtime_count, *movie_refs),
+        struct.pack(f"<{len(ends)}I", *ends),
+        *encoded,
+        formats,
+        cinemas,
+        showtimes
+    ))
+
+
+class BinaryReader:
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer)
+        if len(self.buffer) < HEADER.size:
+            raise ValueError("Not a binary showtime file: too short")
+
+        magic, version, _, self.string_count, self.format_count, self.cinema_count, self.showtime_count, city, slug, code = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise ValueError("Not a binary showtime file")
+        if version != VERSION:
+            raise ValueError(f"Unsupported binary showtime file version {version}")
+
+        self._ends = HEADER.size
+        self._strings = self._ends + 4 * self.string_count
+        blob_size = struct.unpack_from("<I", self.buffer, self._strings - 4)[0] if self.string_count else 0
+        self._formats = self._strings + blob_size
+        self._cinemas = self._formats + FORMAT.size * self.format_count
+        self._showtimes = self._cinemas + CINEMA.size * self.cinema_count
+        if len(self.buffer) < self._showtimes + SHOWTIME.size * self.showtime_count:
+            raise ValueError("Binary showtime file is truncated")
+
+        # Each string is decoded once, so repeated names and times share one object.
+        self._decoded = {}
+        self.city, self.slug, self.code = self.string(city), self.string(slug), self.string(code)
+
+    def string(self, index: int):
+        if index == NONE:
+            return None
+        text = self._decoded.get(index)
+        if text is not None:
+            return text
+        start = struct.unpack_from("<I", self.buffer, self._ends + 4 * (index - 1))[0] if index else 0
+        end = struct.unpack_from("<I", self.buffer, self._ends + 4 * index)[0]
+        text = self._decoded[index] = str(self.buffer[self._strings + start:self._strings + end], "utf-8")
+        return text
+
+    def showtime(self, index: int) -> Showtime:
+        time, session_id, show_date, available, blocked, total = SHOWTIME.unpack_from(self.buffer, self._showtimes + SHOWTIME.size * index)
+        return Showtime(self.string(time), available, blocked, total, self.string(session_id), self.string(show_date))
+
+    def cinema(self, index: int) -> Cinema:
+        name, venue_code, first, count = CINEMA.unpack_from(self.buffer, self._cinemas + CINEMA.size * index)
+        return Cinema(self.string(name), tuple(self.showtime(i) for i in range(first, first + count)), self.string(venue_code))
+
+    def format(self, index: int) -> Format:
+        language, dimension, event_code, first, count = FORMAT.unpack_from(self.buffer, self._formats + FORMAT.size * index)
+        return Format(self.string(language), self.string(dimension), self.string(event_code), tuple(self.cinema(i) for i in range(first, first + count)))
+
+    def movie(self) -> Movie:
+        return Movie(tuple(self.format(i) for i in range(self.format_count)), self.city, self.slug, self.code)
+
+    def seat_counts(self):
+        # Reads the counts straight from the showtime records, without decoding any strings.
+        for offset in range(self._showtimes + 12, self._showtimes + SHOWTIME.size * self.showtime_count, SHOWTIME.size):
+            yield SeatCounts(*SEATS.unpack_from(self.buffer, offset))
+
+    def release(self):
+        self.buffer.release()
+
+
+def loads(data) -> Movie:
+    return BinaryReader(data).movie()
+
+
+@contextmanager
+def open_binary(filename: str):
+    # Maps the file and reads records straight out of the mapping.
+    with open(filename, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        reader = BinaryReader(mapped)
+        try:
+            yield reader
+        finally:
+            reader.release()
+
+
+def save_movie(movie: Movie, filename: str):
+    movie = movie.saved()
+    if filename.endswith(BINARY_SUFFIX):
+        with open(filename, "wb") as f:
+            f.write(dumps(movie))
+    else:
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(movie.to_output(), f, indent=4, ensure_ascii=False)
+
+
+def load_movie(filename: str) -> Movie:
+    if filename.endswith(BINARY_SUFFIX):
+        with open(filename, "rb") as f:
+            return loads(f.read())
+    with open(filename, "r", encoding="utf-8") as f:
+        return Movie.from_output(json.load(f))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=f"Convert scraper output between JSON and the compact binary format ({BINARY_SUFFIX})")
+    parser.add_argument("input_file")
+    parser.add_argument("output_file")
+    args = parser.parse_args()
+
+    save_movie(load_movie(args.input_file), args.output_file)
+    print(f"Converted {args.input_file} into {args.output_file}")
@@ -0,0 +1,254 @@
+import argparse
+import hashlib
+import json
+import os
+from array import array
+from html.parser import HTMLParser
+
+from metrics import swallowed
+from stream import NDJSONWriter, iter_ndjson
+
+
+AVAILABLE = 0
+BLOCKED = 1
+OTHER = 2
+
+CAPTURE_SEAT_MAP_JS = """
+    (function() {
+        const table = document.querySelector('table.setmain');
+        if (!table) {
+            return null;
+        }
+
+        const seats = [];
+        let statuses = '';
+
+        for (const row of table.rows) {
+            const anchors = row.querySelectorAll('a');
+            if (!anchors.length) {
+                continue;
+            }
+
+            const label = row.cells.length ? row.cells[0].textContent.trim() : '';
+            anchors.forEach(function(seat, index) {
+                seats.push(seat.id || (label + '|' + (seat.textContent.trim() || index)));
+                if (seat.classList.contains('_available')) {
+                    statuses += '0';
+                } else if (seat.classList.contains('_blocked')) {
+                    statuses += '1';
+                } else {
+                    statuses += '2';
+                }
+            });
+        }
+
+        return {seats: seats, statuses: statuses};
+    })();
+"""
+
+# Each byte holds four 2-bit statuses, first seat in the lowest bits.
+_DECODE = ["".join(str((byte >> shift) & 3) for shift in (0, 2, 4, 6)) for byte in range(256)]
+_ENCODE = {digits: byte for byte, digits in enumerate(_DECODE)}
+
+
+def encode_statuses(statuses: str) -> bytes:
+    padded = statuses + "0" * (-len(statuses) % 4)
+    return bytes(_ENCODE[padded[i:i + 4]] for i in range(0, len(padded), 4))
+
+
+def decode_statuses(data: bytes, seat_count: int) -> str:
+    return "".join(_DECODE[byte] for byte in data)[:seat_count]
+
+
+def packed_size(seat_count: int) -> int:
+    return (seat_count + 3) // 4
+
+
+def layout_id(seats) -> str:
+    return hashlib.sha1("\n".join(seats).encode("utf-8")).hexdigest()[:16]
+
+
+class SeatMapParser(HTMLParser):
+    # Host-side version of CAPTURE_SEAT_MAP_JS for seat layouts fetched over HTTP.
+    def __init__(self):
+        super().__init__()
+        self.seats = []
+        self.statuses = []
+        self._table_depth = 0
+        self._row = None
+        self._cell = 0
+        self._label = ""
+        self._seat = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = (attrs.get("class") or "").split()
+        if tag == "table":
+            if self._table_depth or "setmain" in classes:
+                self._table_depth += 1
+        elif not self._table_depth:
+            return
+        elif tag == "tr":
+            self._row = []
+            self._cell = 0
+            self._label = ""
+        elif tag == "td" and self._row is not None:
+            self._cell += 1
+        elif tag == "a" and self._row is not None:
+            status = AVAILABLE if "_available" in classes else BLOCKED if "_blocked" in classes else OTHER
+            self._seat = {"id": attrs.get("id"), "status": status, "text": ""}
+
+    def handle_data(self, data):
+        if self._seat is not None:
+            self._seat["text"] += data
+        elif self._row is not None and self._cell == 1:
+            self._label += data
+
+    def handle_endtag(self, tag):
+        if not self._table_depth:
+            return
+        if tag == "table":
+            self._table_depth -= 1
+        elif tag == "a" and self._seat is not None:
+            self._row.append(self._seat)
+            self._seat = None
+        elif tag == "tr" and self._row is not None:
+            label = self._label.strip()
+            for index, seat in enumerate(self._row):
+                self.seats.append(seat["id"] or f"{label}|{seat['text'].strip() or index}")
+                self.statuses.append(str(seat["status"]))
+            self._row = None
+
+
+def seat_map_from_html(html: str):
+    parser = SeatMapParser()
+    parser.feed(html)
+    parser.close()
+    return {"seats": parser.seats, "statuses": "".join(parser.statuses)} if parser.seats else None
+
+
+async def capture_seat_map(page):
+    try:
+        return await page.evaluate(CAPTURE_SEAT_MAP_JS)
+    except Exception as e:
+        swallowed("occupancy.capture_seat_map", e)
+        return None
+
+
+class OccupancyStore:
+    COLUMNS = {
+        "scraped_at": "d",
+        "show": "I",
+        "layout": "I",
+        "offset": "Q"
+    }
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        self.layouts = {}
+        self.layout_sizes = []
+        self.shows = {}
+
+        for record in iter_ndjson_if_exists(self._path("layouts.ndjson")):
+            self.layouts[record["layout_id"]] = len(self.layout_sizes)
+            self.layout_sizes.append(len(record["seats"]))
+        for record in iter_ndjson_if_exists(self._path("shows.ndjson")):
+            self.shows[tuple(record["key"])] = len(self.shows)
+
+        self._layout_writer = NDJSONWriter(self._path("layouts.ndjson"))
+        self._show_writer = NDJSONWriter(self._path("shows.ndjson"))
+        self._columns = {name: open(self._path(f"{name}.col"), "ab") for name in self.COLUMNS}
+        self._bits = open(self._path("statuses.bin"), "ab")
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _layout_index(self, seats):
+        key = layout_id(seats)
+        if key not in self.layouts:
+            self.layouts[key] = len(self.layout_sizes)
+            self.layout_sizes.append(len(seats))
+            self._layout_writer.write({"layout_id": key, "seats": seats})
+        return self.layouts[key]
+
+    def _show_index(self, show_key):
+        show_key = tuple(show_key)
+        if show_key not in self.shows:
+            self.shows[show_key] = len(self.shows)
+            self._show_writer.write({"key": list(show_key)})
+        return self.shows[show_key]
+
+    def append(self, show_key, seat_map: dict, scraped_at: float):
+        if not seat_map or not seat_map.get("seats"):
+            return False
+
+        values = {
+            "scraped_at": scraped_at,
+            "show": self._show_index(show_key),
+            "layout": self._layout_index(seat_map["seats"]),
+            "offset": self._bits.tell()
+        }
+
+        self._bits.write(encode_statuses(seat_map["statuses"]))
+        self._bits.flush()
+        for name, typecode in self.COLUMNS.items():
+            self._columns[name].write(array(typecode, [values[name]]).tobytes())
+            self._columns[name].flush()
+
+        return True
+
+    def read_columns(self):
+        columns = {}
+        for name, typecode in self.COLUMNS.items():
+            column = array(typecode)
+            with open(self._path(f"{name}.col"), "rb") as f:
+                column.frombytes(f.read())
+            columns[name] = column
+
+        # A row is complete only once every column has been written.
+        rows = min(len(column) for column in columns.values())
+        return {name: column[:rows] for name, column in columns.items()}
+
+    def iter_snapshots(self):
+        columns = self.read_columns()
+        show_keys = list(self.shows)
+
+        with open(self._path("statuses.bin"), "rb") as f:
+            bits = f.read()
+
+        for i in range(len(columns["show"])):
+            seat_count = self.layout_sizes[columns["layout"][i]]
+            offset = columns["offset"][i]
+            yield {
+                "scraped_at": columns["scraped_at"][i],
+                "show": show_keys[columns["show"][i]],
+                "layout": columns["layout"][i],
+                "statuses": decode_statuses(bits[offset:offset + packed_size(seat_count)], seat_count)
+            }
+
+    def close(self):
+        self._layout_writer.close()
+        self._show_writer.close()
+        for column in self._columns.values():
+            column.close()
+        self._bits.close()
+
+
+def iter_ndjson_if_exists(filename: str):
+    if os.path.exists(filename):
+        yield from iter_ndjson(filename)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dump captured seat occupancy snapshots")
+    parser.add_argument("directory")
+    args = parser.parse_args()
+
+    store = OccupancyStore(args.directory)
+    try:
+        for snapshot in store.iter_snapshots():
+            print(json.dumps(snapshot, ensure_ascii=False))
+    finally:
+        store.close()
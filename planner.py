@@ -0,0 +1,166 @@
+import os
+import sqlite3
+import time
+
+from api import skipped_cinema
+from deltas import DEFAULT_STORE_FILE
+from scheduler import parse_show_time
+
+
+VALUES = ("proximity", "capacity", "showtimes")
+DEFAULT_VALUE = "proximity"
+DEFAULT_BUDGET_SECONDS = 10 * 60
+
+# (seconds per cinema, seconds per showtime, requests per showtime) for each crawl path.
+HTTP_COST = (0.0, 0.3, 1)
+BROWSER_COST = (2.0, 4.0, 1)
+
+# Used when a cinema's showtimes or seat capacity are not known before crawling it.
+DEFAULT_SHOWTIMES_PER_CINEMA = 4
+DEFAULT_SEATS_PER_SHOW = 200
+UNKNOWN_TIME_VALUE = 0.5
+CHAIN_WEIGHT = 2.0
+
+
+def load_capacities(city: str, store_file=DEFAULT_STORE_FILE) -> dict:
+    if not os.path.exists(store_file):
+        return {}
+
+    conn = sqlite3.connect(store_file)
+    try:
+        rows = conn.execute("SELECT cinema, AVG(total) FROM shows WHERE city = ? GROUP BY cinema", (city,))
+        return {cinema: capacity for cinema, capacity in rows}
+    except sqlite3.Error:
+        return {}
+    finally:
+        conn.close()
+
+
+class CrawlPlanner:
+    def __init__(self, budget_seconds=None, budget_requests=None, value=DEFAULT_VALUE, prefer_chains=(), capacities=None, concurrency=1):
+        if value not in VALUES:
+            raise ValueError(f"Unknown planner value '{value}', expected one of {', '.join(VALUES)}")
+
+        self.budget_seconds = budget_seconds
+        self.budget_requests = budget_requests
+        self.value = value
+        self.prefer_chains = tuple(chain.lower() for chain in prefer_chains)
+        self.capacities = capacities or {}
+        self.concurrency = max(1, concurrency)
+        self.deadline = None
+
+    def start(self):
+        self.deadline = time.monotonic() + self.budget_seconds if self.budget_seconds else None
+        return self
+
+    def for_formats(self, formats: int):
+        # Formats are crawled side by side, so they share the tabs and the request budget
+        # but all run against the same deadline.
+        share = CrawlPlanner(
+            self.budget_seconds,
+            self.budget_requests / formats if self.budget_requests and formats else self.budget_requests,
+            self.value,
+            self.prefer_chains,
+            self.capacities,
+            self.concurrency / formats if formats else self.concurrency
+        )
+        share.deadline = self.deadline
+        return share
+
+    def remaining_seconds(self):
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def expired(self):
+        remaining = self.remaining_seconds()
+        return remaining is not None and remaining <= 0
+
+    def showtime_count(self, cinema):
+        sessions = cinema.get("sessions")
+        return len(sessions) if sessions else DEFAULT_SHOWTIMES_PER_CINEMA
+
+    def estimate(self, cinema, cost=BROWSER_COST):
+        per_cinema, per_showtime, requests_per_showtime = cost
+        showtimes = self.showtime_count(cinema)
+        return per_cinema + per_showtime * showtimes, requests_per_showtime * showtimes
+
+    def worth(self, cinema, now=None):
+        if self.value == "proximity":
+            now = now or time.time()
+            sessions = cinema.get("sessions")
+            if not sessions:
+                worth = UNKNOWN_TIME_VALUE * DEFAULT_SHOWTIMES_PER_CINEMA
+            else:
+                worth = 0.0
+                for session in sessions:
+                    show_at = parse_show_time(session["time"])
+                    if show_at is None:
+                        worth += UNKNOWN_TIME_VALUE
+                    elif show_at > now:
+                        # A show an hour away is worth half of one starting now.
+                        worth += 1 / (1 + (show_at - now) / 3600)
+        elif self.value == "capacity":
+            worth = self.capacities.get(cinema["name"], DEFAULT_SEATS_PER_SHOW) * self.showtime_count(cinema)
+        else:
+            worth = float(self.showtime_count(cinema))
+
+        name = cinema["name"].lower()
+        if any(chain in name for chain in self.prefer_chains):
+            worth *= CHAIN_WEIGHT
+
+        return worth
+
+    def plan(self, cinemas, cost=BROWSER_COST, concurrency=None):
+        concurrency = max(1, concurrency or self.concurrency)
+        now = time.time()
+        scored = []
+        for cinema in cinemas:
+            seconds, requests = self.estimate(cinema, cost)
+            scored.append((self.worth(cinema, now), seconds, requests, cinema))
+
+        remaining = self.remaining_seconds()
+        seconds_left = remaining * concurrency if remaining is not None else None
+        requests_left = self.budget_requests
+
+        # Greedy knapsack: take the most value per second of crawling while it still fits.
+        chosen = []
+        for worth, seconds, requests, cinema in sorted(scored, key=lambda item: -item[0] / max(item[1], 1e-6)):
+            if seconds_left is not None and seconds > seconds_left:
+                continue
+            if requests_left is not None and requests > requests_left:
+                continue
+            if seconds_left is not None:
+                seconds_left -= seconds
+            if requests_left is not None:
+                requests_left -= requests
+            chosen.append((worth, seconds, cinema))
+
+        chosen.sort(key=lambda item: -item[0])
+        planned = [cinema for _, _, cinema in chosen]
+
+        if len(planned) < len(cinemas):
+            estimate = sum(seconds for _, seconds, _ in chosen) / concurrency
+            print(f"Planned {len(planned)} of {len(cinemas)} cinemas by {self.value}, about {estimate / 60:.1f} min of crawling")
+
+        for i, cinema in enumerate(planned):
+            cinema["position"] = i + 1
+
+        return planned
+
+    def skipped(self, cinemas, planned):
+        # Unplanned cinemas stay in the results, so the change feed does not take them for delisted.
+        chosen = {id(cinema) for cinema in planned}
+        return [skipped_cinema(cinema["name"], cinema.get("venue_code")) for cinema in cinemas if id(cinema) not in chosen]
+
+
+def add_planner_arguments(parser):
+    parser.add_argument("--budget-seconds", type=float, default=DEFAULT_BUDGET_SECONDS, help="Crawl only as many cinemas as fit in this many seconds (0 for no limit)")
+    parser.add_argument("--budget-requests", type=int, help="Crawl only as many showtimes as fit in this many seat-layout requests")
+    parser.add_argument("--value", choices=VALUES, default=DEFAULT_VALUE, help="What to crawl first when the budget does not cover every cinema")
+    parser.add_argument("--prefer-chain", action="append", default=[], help="Give cinemas whose name contains this chain twice the value (repeatable)")
+
+
+def planner_from_args(args, city: str = None, concurrency=1):
+    capacities = load_capacities(city) if city and args.value == "capacity" else None
+    return CrawlPlanner(args.budget_seconds or None, args.budget_requests, args.value, args.prefer_chain, capacities, concurrency)
@@ -0,0 +1,317 @@
+import asyncio
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from requests.adapters import BaseAdapter
+
+import discovery
+from clearance import CHALLENGE_CHECK, file_lock, is_challenge
+from metrics import inc, swallowed, timed
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+DEFAULT_RATE_FILE = "ratelimit.state"
+# Requests per second shared by every task and process using the same rate file.
+DEFAULT_RATE = 2.0
+MIN_RATE = 0.2
+MAX_RATE = 20.0
+DEFAULT_CONCURRENCY = 8
+
+# AIMD: each success adds about ADDITIVE_INCREASE requests/s per second of traffic,
+# a throttled response halves the rate and a slow or failed one trims it.
+ADDITIVE_INCREASE = 0.2
+DECREASE_FACTOR = 0.5
+SLOW_DECREASE_FACTOR = 0.9
+# Requests already in flight when the site pushes back fail together, so that only counts once.
+DECREASE_COOLDOWN = 5
+# A response this many times slower than the running average counts as the site slowing down.
+SLOW_FACTOR = 3.0
+LATENCY_SMOOTHING = 0.1
+POLL_INTERVAL = 0.05
+
+THROTTLE_STATUSES = (403, 429)
+
+
+class Call:
+    def __init__(self):
+        self.reason = None
+
+    def report(self, status: int = None, html: str = None):
+        if status in THROTTLE_STATUSES:
+            self.reason = str(status)
+        elif html and is_challenge(html):
+            self.reason = "challenge"
+
+    async def check_page(self, page):
+        try:
+            if await page.evaluate(CHALLENGE_CHECK):
+                self.reason = "challenge"
+        except Exception as e:
+            swallowed("ratelimit.check_page", e)
+
+
+# The shared bucket is a fixed record in a memory-mapped file: rate, tokens, last refill, last decrease.
+STATE = struct.Struct("<4sdddd")
+STATE_MAGIC = b"RL01"
+
+
+class SharedState:
+    def __init__(self, filename: str, initial_rate: float):
+        self.filename = filename
+        self.initial_rate = initial_rate
+        self._fd = None
+        self._map = None
+        # flock is per open file, so threads of one process also need their own lock.
+        self._thread_lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        with self._thread_lock:
+            if fcntl is None:
+                with file_lock(self.filename):
+                    yield
+                return
+            if self._fd is None:
+                self._fd = os.open(self.filename, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def update(self, change):
+        with self._locked():
+            if self._map is None:
+                if self._fd is None:
+                    self._fd = os.open(self.filename, os.O_RDWR | os.O_CREAT, 0o644)
+                if os.fstat(self._fd).st_size < STATE.size:
+                    os.ftruncate(self._fd, STATE.size)
+                self._map = mmap.mmap(self._fd, STATE.size)
+
+            magic, rate, tokens, updated, decreased = STATE.unpack_from(self._map)
+            now = time.time()
+            if magic == STATE_MAGIC:
+                state = {"rate": rate, "tokens": tokens, "updated": updated, "decreased": decreased}
+            else:
+                state = {"rate": self.initial_rate, "tokens": 1.0, "updated": now, "decreased": 0.0}
+
+            result = change(state, now)
+            STATE.pack_into(self._map, 0, STATE_MAGIC, state["rate"], state["tokens"], state["updated"], state["decreased"])
+        return result
+
+
+class RateController:
+    def __init__(self, filename=DEFAULT_RATE_FILE, initial_rate=DEFAULT_RATE, min_rate=MIN_RATE, max_rate=MAX_RATE, max_concurrency=DEFAULT_CONCURRENCY, process_rate=None):
+        self.filename = filename
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.max_concurrency = max(1, max_concurrency)
+        # A cap for this process alone. It is never written to the shared state, so other processes keep their rate.
+        self.process_rate = process_rate
+        self._reset_local()
+
+    def _reset_local(self):
+        # The rate is shared through the file; the concurrency window is per process.
+        self.limit = max(1, self.max_concurrency // 2)
+        self.in_flight = 0
+        self._successes = 0
+        self._latency = {}
+        self._next_local = 0.0
+        self._condition = threading.Condition()
+        self._state = SharedState(self.filename, self.initial_rate)
+
+    def __getstate__(self):
+        return {key: value for key, value in self.__dict__.items() if key in ("filename", "initial_rate", "min_rate", "max_rate", "max_concurrency", "process_rate")}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset_local()
+
+    def _shared(self, change):
+        return self._state.update(change)
+
+    def _take(self, state, now):
+        rate = min(self.max_rate, max(self.min_rate, state["rate"]))
+        state["tokens"] = min(max(1.0, rate), state["tokens"] + max(0.0, now - state["updated"]) * rate)
+        state["updated"] = now
+        if state["tokens"] >= 1:
+            state["tokens"] -= 1
+            return 0.0
+        return (1 - state["tokens"]) / rate
+
+    def _take_local(self):
+        if self.process_rate is None:
+            return 0.0
+        with self._condition:
+            now = time.monotonic()
+            self._next_local = max(now, self._next_local + 1 / self.process_rate)
+            return self._next_local - now
+
+    def _adjust(self, state, now, reason):
+        if reason is None:
+            state["rate"] = min(self.max_rate, state["rate"] + ADDITIVE_INCREASE / state["rate"])
+            return None
+
+        if now - state["decreased"] < DECREASE_COOLDOWN:
+            return None
+        throttled = reason not in ("slow", "error")
+        state["rate"] = max(self.min_rate, state["rate"] * (DECREASE_FACTOR if throttled else SLOW_DECREASE_FACTOR))
+        state["decreased"] = now
+        if throttled:
+            state["tokens"] = 0.0
+        return state["rate"]
+
+    def rate(self):
+        return self._shared(lambda state, now: state["rate"])
+
+    def _try_enter(self):
+        with self._condition:
+            if self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def _enter(self):
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+
+    def _finish(self, kind, latency, call):
+        reason = call.reason
+        if reason is None:
+            average = self._latency.get(kind)
+            if average is not None and latency > average * SLOW_FACTOR:
+                reason = "slow"
+            else:
+                self._latency[kind] = latency if average is None else average + LATENCY_SMOOTHING * (latency - average)
+
+        slowed_to = self._shared(lambda state, now: self._adjust(state, now, reason))
+
+        with self._condition:
+            self.in_flight -= 1
+            if reason in (None, "slow", "error"):
+                self._successes += 1
+                if self._successes >= self.limit:
+                    self.limit = min(self.max_concurrency, self.limit + 1)
+                    self._successes = 0
+            else:
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+            self._condition.notify_all()
+
+        inc("ratelimit_total", kind=kind, outcome=reason or "ok")
+        if slowed_to is not None:
+            print(f"Site pushed back ({reason}), slowing down to {slowed_to:.2f} requests/s and {self.limit} at once")
+
+    @contextmanager
+    def slot(self, kind="http"):
+        self._enter()
+        call = Call()
+        started = time.perf_counter()
+        try:
+            with timed("rate_wait", kind=kind):
+                wait = self._take_local()
+                if wait > 0:
+                    time.sleep(wait)
+                wait = self._shared(self._take)
+                while wait > 0:
+                    time.sleep(wait)
+                    wait = self._shared(self._take)
+            started = time.perf_counter()
+            yield call
+        except Exception:
+            call.reason = call.reason or "error"
+            raise
+        finally:
+            self._finish(kind, time.perf_counter() - started, call)
+
+    async def acquire(self, kind="browser"):
+        # Waits for a token from the shared bucket without blocking the event loop.
+        with timed("rate_wait", kind=kind):
+            wait = self._take_local()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            wait = self._shared(self._take)
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = self._shared(self._take)
+
+    @asynccontextmanager
+    async def aslot(self, kind="browser"):
+        while not self._try_enter():
+            await asyncio.sleep(POLL_INTERVAL)
+        call = Call()
+        started = time.perf_counter()
+        try:
+            await self.acquire(kind)
+            started = time.perf_counter()
+            yield call
+        except Exception:
+            call.reason = call.reason or "error"
+            raise
+        finally:
+            self._finish(kind, time.perf_counter() - started, call)
+
+    def install(self, session):
+        adapter = session.get_adapter(discovery.BASE_URL)
+        if isinstance(adapter, RateLimitedAdapter) and adapter.controller is self:
+            return session
+        # Wraps the session's own adapter, so cloudscraper keeps its TLS settings.
+        session.mount(discovery.BASE_URL, RateLimitedAdapter(self, adapter))
+        return session
+
+
+class RateLimitedAdapter(BaseAdapter):
+    def __init__(self, controller, adapter):
+        super().__init__()
+        self.controller = controller
+        self.adapter = adapter
+
+    def send(self, request, **kwargs):
+        with self.controller.slot("http") as call:
+            response = self.adapter.send(request, **kwargs)
+            html = response.text if not kwargs.get("stream") and "html" in response.headers.get("Content-Type", "") else None
+            call.report(response.status_code, html)
+            return response
+
+    def close(self):
+        self.adapter.close()
+
+
+async def in_thread(func, *args):
+    # Requests made through a rate-limited session wait for their token in the calling thread,
+    # so coroutines send them from a worker thread instead of stalling the event loop.
+    return await asyncio.get_event_loop().run_in_executor(None, lambda: func(*args))
+
+
+async def rate_limited(limiter, open_page):
+    if limiter is None:
+        return await open_page()
+
+    async with limiter.aslot("browser") as call:
+        page = await open_page()
+        await call.check_page(page)
+        return page
+
+
+def add_ratelimit_arguments(parser):
+    parser.add_argument("--rate-file", default=DEFAULT_RATE_FILE, help="File the adaptive request rate is shared through across processes")
+    parser.add_argument("--max-rate", type=float, default=MAX_RATE, help="Never go above this many requests per second")
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Never have more than this many requests in flight per process")
+    parser.add_argument("--no-rate-limit", action="store_true", help="Send requests as fast as the crawl issues them")
+
+
+def limiter_from_args(args, process_rate=None):
+    if args.no_rate_limit:
+        return None
+    return RateController(args.rate_file, min(DEFAULT_RATE, args.max_rate), MIN_RATE, args.max_rate, args.max_concurrency, process_rate)
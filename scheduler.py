@@ -0,0 +1,242 @@
+import argparse
+import asyncio
+import heapq
+import itertools
+import time
+from datetime import date, datetime
+
+import cloudscraper
+
+from api import fetch_seat_counts
+from deltas import SnapshotStore, append_change_feed
+from models import Movie
+from ratelimit import add_ratelimit_arguments, in_thread, limiter_from_args
+
+
+DEFAULT_REQUESTS_PER_MINUTE = 30
+DEFAULT_CONCURRENCY = 4
+MIN_INTERVAL = 60
+MAX_INTERVAL = 60 * 60
+# Refresh a show about this many times between now and its start.
+REFRESHES_PER_LEAD_TIME = 12
+# Each seat booked per minute divides the interval by (1 + CHURN_WEIGHT).
+CHURN_WEIGHT = 0.5
+CHURN_SMOOTHING = 0.3
+
+
+def parse_show_time(show_time: str, show_date: date = None):
+    try:
+        parsed = datetime.strptime(" ".join(show_time.split()).upper(), "%I:%M %p")
+    except ValueError:
+        return None
+    return datetime.combine(show_date or date.today(), parsed.time()).timestamp()
+
+
+def http_scraper(session: cloudscraper.CloudScraper):
+    async def scrape(item):
+        return await in_thread(fetch_seat_counts, session, item["venue_code"], item["session_id"])
+
+    return scrape
+
+
+class RefreshScheduler:
+    def __init__(self, scrape, concurrency=DEFAULT_CONCURRENCY, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL, on_result=None):
+        self.scrape = scrape
+        self.concurrency = concurrency
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.on_result = on_result
+        self._queue = []
+        self._entries = {}
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, item: dict, show_at: float, seats: dict = None):
+        # Without both codes there is nothing to fetch, so the show never takes a slot.
+        if not item.get("venue_code") or not item.get("session_id"):
+            return
+
+        key = (item["city"], item["event_code"], item["cinema"], item["time"])
+        entry = {
+            "key": key,
+            "item": item,
+            "show_at": show_at,
+            "seats": seats,
+            "churn": 0.0,
+            "checked_at": time.time() if seats else None
+        }
+        self._entries[key] = entry
+        self._push(entry, time.time() + self.next_interval(entry) if seats else time.time())
+
+    def add_results(self, city: str, movie: Movie, show_date: date = None):
+        for format in movie.formats:
+            for cinema in format.cinemas:
+                if not cinema.scraped:
+                    continue
+
+                for showtime in cinema.showtimes:
+                    show_at = parse_show_time(showtime.time, datetime.strptime(showtime.date, "%Y%m%d").date() if showtime.date else show_date)
+                    if show_at is None or show_at <= time.time():
+                        continue
+
+                    self.add(
+                        {
+                            "city": city,
+                            "event_code": format.event_code,
+                            "cinema": cinema.name,
+                            "time": showtime.time,
+                            "venue_code": cinema.venue_code,
+                            "session_id": showtime.session_id
+                        },
+                        show_at,
+                        {
+                            "available": showtime.available_seats,
+                            "blocked": showtime.blocked_seats,
+                            "total": showtime.total_seats
+                        }
+                    )
+
+    def next_interval(self, entry, now=None):
+        now = now or time.time()
+        lead_time = entry["show_at"] - now
+        interval = lead_time / REFRESHES_PER_LEAD_TIME
+        interval /= 1 + entry["churn"] * CHURN_WEIGHT
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def _push(self, entry, due_at):
+        entry["due_at"] = due_at
+        heapq.heappush(self._queue, (due_at, next(self._counter), entry["key"]))
+
+    def _record(self, entry, seats):
+        now = time.time()
+        previous = entry["seats"]
+
+        if previous and entry["checked_at"]:
+            minutes = max((now - entry["checked_at"]) / 60, 1 / 60)
+            rate = abs(seats["blocked"] - previous["blocked"]) / minutes
+            entry["churn"] = CHURN_SMOOTHING * rate + (1 - CHURN_SMOOTHING) * entry["churn"]
+
+        entry["seats"] = seats
+        entry["checked_at"] = now
+
+        if self.on_result:
+            self.on_result(entry["item"], previous, seats)
+
+    async def _refresh(self, entry):
+        try:
+            seats = await self.scrape(entry["item"])
+        except Exception as e:
+            print(f"Error refreshing {entry['key']}: {e}")
+            seats = None
+
+        if seats:
+            self._record(entry, seats)
+
+        if entry["show_at"] > time.time():
+            self._push(entry, time.time() + self.next_interval(entry))
+        else:
+            self._entries.pop(entry["key"], None)
+
+    async def run(self, until: float = None):
+        tasks = set()
+
+        while self._queue or tasks:
+            if until and time.time() >= until:
+                break
+
+            # Only take the next show once a refresh slot is free, so whatever is most due
+            # when it frees up goes first.
+            if not self._queue or len(tasks) >= self.concurrency:
+                await asyncio.wait(list(tasks), return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            due_at, _, key = self._queue[0]
+            delay = due_at - time.time()
+            if delay > 0:
+                await asyncio.sleep(min(delay, 1))
+                continue
+
+            heapq.heappop(self._queue)
+            entry = self._entries.get(key)
+            if entry is None or entry["due_at"] != due_at:
+                continue
+
+            if entry["show_at"] <= time.time():
+                self._entries.pop(key, None)
+                continue
+
+            task = asyncio.ensure_future(self._refresh(entry))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        for task in list(tasks):
+            task.cancel()
+
+
+def change_feed_writer(feed_file, store: SnapshotStore):
+    # Refreshes are compared against the same stored counts as full runs, so each change is published once.
+    def on_result(item, previous, seats):
+        changes = store.apply_refresh(item["city"], item["event_code"], item["cinema"], item["time"], (seats["available"], seats["blocked"], seats["total"]))
+        append_change_feed(changes, feed_file)
+
+    return on_result
+
+
+async def run_scheduler(city, movie_name, concurrency, changes_file, hours, limiter=None):
+    from main import main
+    from search import SearchCache, resolve_movies
+
+    session = cloudscraper.create_scraper()
+    # Every refresh goes through the shared limiter, which is the scheduler's request budget.
+    if limiter is not None:
+        limiter.install(session)
+    cache = SearchCache()
+    try:
+        movie = resolve_movies([movie_name], session, cache)[movie_name]
+    finally:
+        cache.close()
+
+    if not movie:
+        print(f"Movie not found: {movie_name}")
+        return
+
+    # The first crawl publishes through the snapshot store too, so refreshes start from its counts.
+    scraped = await main(city, movie["slug"], movie["id"], session=session, changes_file=changes_file, limiter=limiter)
+    if not isinstance(scraped, Movie):
+        return
+
+    store = SnapshotStore() if changes_file else None
+    scheduler = RefreshScheduler(
+        http_scraper(session),
+        concurrency=concurrency,
+        on_result=change_feed_writer(changes_file, store) if changes_file else None
+    )
+    scheduler.add_results(city, scraped)
+    print(f"Scheduling {len(scheduler)} showtimes")
+
+    try:
+        await scheduler.run(until=time.time() + hours * 60 * 60 if hours else None)
+    finally:
+        if store is not None:
+            store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep seat availability fresh, prioritising shows that start soon or sell fast")
+    parser.add_argument("--city", required=True)
+    parser.add_argument("--movie", required=True)
+    parser.add_argument("--requests-per-minute", type=int, help=f"Cap this process's requests on top of the shared rate (default: {DEFAULT_REQUESTS_PER_MINUTE})")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--changes", default="changes.ndjson", help="NDJSON change feed to append refreshed counts to")
+    parser.add_argument("--hours", type=float, default=0, help="Stop after this many hours (default: until the last show starts)")
+    add_ratelimit_arguments(parser)
+    args = parser.parse_args()
+
+    if args.no_rate_limit and args.requests_per_minute:
+        parser.error("--requests-per-minute is enforced by the rate limiter, so it cannot be combined with --no-rate-limit")
+
+    limiter = limiter_from_args(args, (args.requests_per_minute or DEFAULT_REQUESTS_PER_MINUTE) / 60)
+
+    asyncio.run(run_scheduler(args.city, args.movie, args.concurrency, args.changes, args.hours, limiter))
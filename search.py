@@ -0,0 +1,170 @@
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import cloudscraper
+
+import discovery
+from ratelimit import add_ratelimit_arguments, limiter_from_args
+
+
+DEFAULT_CACHE_FILE = "search_cache.sqlite3"
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 10000
+# A requests session keeps at most 10 pooled connections per host.
+DEFAULT_WORKERS = 10
+SQLITE_MAX_PARAMS = 500
+
+
+def normalise_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def search_url(query: str) -> str:
+    return f"{discovery.BASE_URL}/quickbook-search.bms?q={quote(query)}"
+
+
+def parse_search_hit(movie: dict) -> dict:
+    return {
+        "title": movie.get("TITLE"),
+        "group_title": movie.get("GROUP_TITLE"),
+        "release_date": movie.get("RDATE"),
+        "code": movie.get("CODE"),
+        "id": movie.get("ID"),
+        "slug": movie.get("SLUG"),
+        "poster_url": movie.get("POSTER_URL"),
+        "category": movie.get("TYPE_NAME"),
+        "status": movie.get("ST"),
+        "is_stream": movie.get("IS_STREAM"),
+        "is_online": movie.get("IS_ONLINE")
+    }
+
+
+def get_movie_name(movie_name: str, session: cloudscraper.CloudScraper) -> dict:
+    response = session.get(search_url(movie_name))
+    data = response.json()
+    if not data.get("hits"):
+        return None
+
+    return parse_search_hit(data["hits"][0])
+
+
+class SearchCache:
+    def __init__(self, path=DEFAULT_CACHE_FILE, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS search_cache (
+                query TEXT PRIMARY KEY,
+                result TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS search_cache_accessed ON search_cache (accessed_at)")
+        self._conn.commit()
+
+    def get_many(self, queries):
+        now = time.time()
+        found = {}
+
+        with self._lock:
+            for i in range(0, len(queries), SQLITE_MAX_PARAMS):
+                chunk = queries[i:i + SQLITE_MAX_PARAMS]
+                rows = self._conn.execute(
+                    f"SELECT query, result FROM search_cache WHERE fetched_at > ? AND query IN ({','.join('?' * len(chunk))})",
+                    [now - self.ttl, *chunk]
+                )
+                for query, result in rows:
+                    found[query] = json.loads(result)
+
+            if found:
+                self._conn.executemany(
+                    "UPDATE search_cache SET accessed_at = ? WHERE query = ?",
+                    [(now, query) for query in found]
+                )
+                self._conn.commit()
+
+        return found
+
+    def put_many(self, results: dict):
+        now = time.time()
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO search_cache (query, result, fetched_at, accessed_at) VALUES (?, ?, ?, ?)",
+                [(query, json.dumps(result), now, now) for query, result in results.items()]
+            )
+            self._conn.execute("DELETE FROM search_cache WHERE fetched_at <= ?", (now - self.ttl,))
+            self._conn.execute("""
+                DELETE FROM search_cache WHERE query IN (
+                    SELECT query FROM search_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+def _search(session, query):
+    try:
+        return query, get_movie_name(query, session), True
+    except Exception as e:
+        print(f"Error searching for '{query}': {e}")
+        return query, None, False
+
+
+def resolve_movies(titles, session: cloudscraper.CloudScraper = None, cache: SearchCache = None, workers=DEFAULT_WORKERS) -> dict:
+    queries = list(dict.fromkeys(normalise_query(title) for title in titles))
+    found = cache.get_many(queries) if cache else {}
+
+    missing = [query for query in queries if query not in found]
+    if missing:
+        session = session or cloudscraper.create_scraper()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            fetched = {query: result for query, result, ok in executor.map(lambda query: _search(session, query), missing) if ok}
+
+        found.update(fetched)
+        if cache and fetched:
+            cache.put_many(fetched)
+
+    return {title: found.get(normalise_query(title)) for title in titles}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resolve movie titles to BookMyShow slugs and IDs")
+    parser.add_argument("titles", nargs="*")
+    parser.add_argument("--file", help="Watchlist file with one title per line")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_FILE)
+    parser.add_argument("--ttl", type=int, default=DEFAULT_TTL, help="Cache lifetime in seconds")
+    parser.add_argument("--max-entries", type=int, default=DEFAULT_MAX_ENTRIES)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    add_ratelimit_arguments(parser)
+    args = parser.parse_args()
+
+    titles = list(args.titles)
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            titles.extend(line.strip() for line in f if line.strip())
+
+    # Cache misses hit the site, so they share the crawl's rate instead of firing all at once.
+    session = cloudscraper.create_scraper()
+    limiter = limiter_from_args(args)
+    if limiter is not None:
+        limiter.install(session)
+
+    cache = SearchCache(args.cache, args.ttl, args.max_entries)
+    try:
+        results = resolve_movies(titles, session, cache, args.workers)
+    finally:
+        cache.close()
+
+    print(json.dumps(results, indent=4, ensure_ascii=False))
@@ -0,0 +1,207 @@
+import re
+
+from bs4 import BeautifulSoup
+
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+
+COUNT_SEATS_JS = """
+    (function(withCategories) {
+        const table = document.querySelector('table.setmain');
+        if (!table) {
+            return null;
+        }
+
+        const result = {
+            available: table.querySelectorAll('a._available').length,
+            blocked: table.querySelectorAll('a._blocked').length
+        };
+
+        if (withCategories) {
+            result.categories = [];
+            let category = null;
+
+            for (const row of table.rows) {
+                const seats = row.querySelectorAll('a._available, a._blocked');
+                if (!seats.length) {
+                    const label = row.textContent.trim();
+                    if (label) {
+                        category = {name: label, available: 0, blocked: 0};
+                        result.categories.push(category);
+                    }
+                    continue;
+                }
+
+                if (!category) {
+                    category = {name: '', available: 0, blocked: 0};
+                    result.categories.push(category);
+                }
+
+                for (const seat of seats) {
+                    if (seat.classList.contains('_available')) {
+                        category.available++;
+                    } else {
+                        category.blocked++;
+                    }
+                }
+            }
+        }
+
+        return result;
+    })(%s);
+"""
+
+PRICE_PATTERN = re.compile(r'(?:Rs\.?|₹)\s*([\d,]+(?:\.\d+)?)', re.IGNORECASE)
+
+CLASS_XPATH = "contains(concat(' ', normalize-space(@class), ' '), ' {} ')"
+
+
+def empty_seat_counts():
+    return {"available": 0, "blocked": 0, "total": 0}
+
+
+def parse_price(label: str):
+    match = PRICE_PATTERN.search(label or "")
+    if not match:
+        return None
+    return float(match.group(1).replace(",", ""))
+
+
+def finish_seat_counts(counts):
+    if not counts:
+        return empty_seat_counts()
+
+    result = {
+        "available": counts["available"],
+        "blocked": counts["blocked"],
+        "total": counts["available"] + counts["blocked"]
+    }
+
+    if "categories" in counts:
+        result["categories"] = [
+            {
+                "name": category["name"],
+                "price": parse_price(category["name"]),
+                "available": category["available"],
+                "blocked": category["blocked"],
+                "total": category["available"] + category["blocked"]
+            }
+            for category in counts["categories"]
+        ]
+
+    return result
+
+
+async def count_seats_in_page(page, categories=False):
+    counts = await page.evaluate(COUNT_SEATS_JS % ("true" if categories else "false"))
+    return finish_seat_counts(counts)
+
+
+def _add_category_row(categories, label, available, blocked):
+    if not available and not blocked:
+        if label:
+            categories.append({"name": label, "available": 0, "blocked": 0})
+        return
+
+    if not categories:
+        categories.append({"name": "", "available": 0, "blocked": 0})
+
+    categories[-1]["available"] += available
+    categories[-1]["blocked"] += blocked
+
+
+def _count_with_selectolax(html, categories):
+    table = HTMLParser(html).css_first("table.setmain")
+    if table is None:
+        return None
+
+    counts = {
+        "available": len(table.css("a._available")),
+        "blocked": len(table.css("a._blocked"))
+    }
+
+    if categories:
+        counts["categories"] = []
+        for row in table.css("tr"):
+            _add_category_row(
+                counts["categories"],
+                row.text(strip=True),
+                len(row.css("a._available")),
+                len(row.css("a._blocked"))
+            )
+
+    return counts
+
+
+def _count_with_lxml(html, categories):
+    tables = lxml.html.fromstring(html).xpath(f"//table[{CLASS_XPATH.format('setmain')}]")
+    if not tables:
+        return None
+
+    table = tables[0]
+    available_xpath = f".//a[{CLASS_XPATH.format('_available')}]"
+    blocked_xpath = f".//a[{CLASS_XPATH.format('_blocked')}]"
+
+    counts = {
+        "available": int(table.xpath(f"count({available_xpath})")),
+        "blocked": int(table.xpath(f"count({blocked_xpath})"))
+    }
+
+    if categories:
+        counts["categories"] = []
+        for row in table.xpath("./tr | ./thead/tr | ./tbody/tr | ./tfoot/tr"):
+            _add_category_row(
+                counts["categories"],
+                row.text_content().strip(),
+                int(row.xpath(f"count({available_xpath})")),
+                int(row.xpath(f"count({blocked_xpath})"))
+            )
+
+    return counts
+
+
+def _count_with_html_parser(html, categories):
+    table = BeautifulSoup(html, "html.parser").find("table", class_="setmain")
+    if not table:
+        return None
+
+    counts = {
+        "available": len(table.find_all("a", class_="_available")),
+        "blocked": len(table.find_all("a", class_="_blocked"))
+    }
+
+    if categories:
+        counts["categories"] = []
+        for row in table.find_all("tr"):
+            _add_category_row(
+                counts["categories"],
+                row.get_text(strip=True),
+                len(row.find_all("a", class_="_available")),
+                len(row.find_all("a", class_="_blocked"))
+            )
+
+    return counts
+
+
+HTML_BACKENDS = {
+    "selectolax": _count_with_selectolax if HTMLParser else None,
+    "lxml": _count_with_lxml if lxml else None,
+    "html.parser": _count_with_html_parser
+}
+
+
+def available_backends():
+    return [name for name, backend in HTML_BACKENDS.items() if backend]
+
+
+def count_seats_in_html(html: str, categories=False, backend=None):
+    backend = backend or available_backends()[0]
+    return finish_seat_counts(HTML_BACKENDS[backend](html, categories))
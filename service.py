@@ -0,0 +1,275 @@
+import argparse
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlparse
+
+import cloudscraper
+
+from api import fetch_seat_counts, fetch_venues
+from clearance import add_clearance_arguments, clearance_from_args
+from discovery import fetch_movie_formats
+from metrics import inc, swallowed, to_prometheus
+from ratelimit import add_ratelimit_arguments, limiter_from_args
+from search import DEFAULT_CACHE_FILE, SearchCache, normalise_query, resolve_movies
+
+
+DEFAULT_PORT = 8080
+# How old a cached answer may be before a query triggers a new scrape.
+DEFAULT_MAX_AGE = 60
+DEFAULT_WORKERS = 8
+DEFAULT_MAX_ENTRIES = 50000
+# Titles resolve to the same slug for days, so the movie search ignores the query's max_age.
+MOVIE_MAX_AGE = 60 * 60
+
+
+def normalise_time(show_time: str) -> str:
+    return " ".join(show_time.split()).upper()
+
+
+class StaleCache:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, key, max_age):
+        entry = self._entries.get(key)
+        if entry is None or time.time() - entry[0] > max_age:
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, value):
+        entry = self._entries[key] = (time.time(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+
+    def __len__(self):
+        return len(self._calls)
+
+    async def do(self, key, make_coroutine):
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(make_coroutine())
+            self._calls[key] = future
+            future.add_done_callback(lambda _: self._calls.pop(key, None))
+            inc("service_total", event="scrape", kind=key[0])
+        else:
+            inc("service_total", event="coalesced", kind=key[0])
+        # A client that disconnects must not cancel the scrape the others are waiting on.
+        return await asyncio.shield(future)
+
+
+class AvailabilityService:
+    def __init__(self, session, max_age=DEFAULT_MAX_AGE, workers=DEFAULT_WORKERS, search_cache: SearchCache = None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.session = session
+        self.max_age = max_age
+        self.search_cache = search_cache
+        self.cache = StaleCache(max_entries)
+        self.flights = SingleFlight()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._semaphore = None
+        self.workers = workers
+
+    async def _run(self, func, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+        async with self._semaphore:
+            return await asyncio.get_event_loop().run_in_executor(self._executor, func, *args)
+
+    async def _cached(self, key, max_age, func, *args):
+        entry = self.cache.get(key, max_age)
+        if entry is not None:
+            inc("service_total", event="cache_hit", kind=key[0])
+            return entry
+
+        async def scrape():
+            # Another flight for the same key may have finished while this one was queued.
+            entry = self.cache.get(key, max_age)
+            if entry is not None:
+                return entry
+            value = await self._run(func, *args)
+            return self.cache.put(key, value) if value is not None else None
+
+        return await self.flights.do(key, scrape)
+
+    def _resolve(self, movie: str):
+        return resolve_movies([movie], self.session, self.search_cache)[movie]
+
+    async def movie(self, movie: str):
+        entry = await self._cached(("movie", normalise_query(movie)), MOVIE_MAX_AGE, self._resolve, movie)
+        return entry[1] if entry else None
+
+    async def seats(self, city: str, event_code: str, venue: dict, showtime: dict, max_age):
+        key = ("seats", city, event_code, venue["name"], normalise_time(showtime["time"]))
+        try:
+            entry = await self._cached(key, max_age, fetch_seat_counts, self.session, venue["venue_code"], showtime["session_id"])
+        except Exception as e:
+            swallowed("service.seats", e)
+            entry = None
+
+        if entry is None:
+            return {"time": showtime["time"], "session_id": showtime["session_id"], "error": "Could not fetch the seat layout"}
+
+        fetched_at, seat_data = entry
+        return {
+            "time": showtime["time"],
+            "session_id": showtime["session_id"],
+            "available_seats": seat_data["available"],
+            "blocked_seats": seat_data["blocked"],
+            "total_seats": seat_data["total"],
+            "age_seconds": round(time.time() - fetched_at, 1)
+        }
+
+    async def availability(self, city: str, movie: str, event_code: str = None, cinema: str = None, show_time: str = None, max_age=None):
+        max_age = self.max_age if max_age is None else max_age
+
+        found = await self.movie(movie)
+        if not found:
+            return HTTPStatus.NOT_FOUND, {"error": f"Movie not found: {movie}"}
+
+        entry = await self._cached(("formats", city, found["slug"]), max_age, fetch_movie_formats, self.session, city, found["slug"], found["id"])
+        if entry is None:
+            return HTTPStatus.BAD_GATEWAY, {"error": "Could not read the movie's formats"}
+
+        formats = [format for format in entry[1]["formats"] if event_code is None or format["eventCode"] == event_code]
+        results = []
+        for format in formats:
+            try:
+                entry = await self._cached(("venues", city, format["eventCode"]), max_age, fetch_venues, self.session, city, found["slug"], format["eventCode"])
+            except Exception as e:
+                swallowed("service.venues", e)
+                entry = None
+            if entry is None:
+                results.append({"format_info": format, "error": "Could not read the showtimes"})
+                continue
+
+            venues = [
+                venue for venue in entry[1]
+                if cinema is None or cinema.lower() in venue["name"].lower() or cinema == venue["venue_code"]
+            ]
+            matching = [
+                (venue, [showtime for showtime in venue["sessions"] if show_time is None or normalise_time(showtime["time"]) == normalise_time(show_time)])
+                for venue in venues
+            ]
+            showtimes = await asyncio.gather(*(
+                self.seats(city, format["eventCode"], venue, showtime, max_age)
+                for venue, sessions in matching for showtime in sessions
+            ))
+
+            showtimes = iter(showtimes)
+            cinemas = []
+            for venue, sessions in matching:
+                if sessions:
+                    cinemas.append({"name": venue["name"], "venue_code": venue["venue_code"], "showtimes": [next(showtimes) for _ in sessions]})
+            results.append({"format_info": format, "cinemas": cinemas})
+
+        return HTTPStatus.OK, {"city": city, "movie": found, "formats": results}
+
+    async def route(self, method: str, target: str):
+        url = urlparse(target)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+
+        if method != "GET":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "Only GET is supported"}
+
+        if url.path == "/availability":
+            if not query.get("city") or not query.get("movie"):
+                return HTTPStatus.BAD_REQUEST, {"error": "city and movie are required"}
+            try:
+                max_age = float(query["max_age"]) if "max_age" in query else None
+            except ValueError:
+                return HTTPStatus.BAD_REQUEST, {"error": "max_age must be a number of seconds"}
+            return await self.availability(query["city"], query["movie"], query.get("event"), query.get("cinema"), query.get("time"), max_age)
+
+        if url.path == "/health":
+            return HTTPStatus.OK, {"ok": True, "cached": len(self.cache), "in_flight": len(self.flights)}
+
+        if url.path == "/metrics":
+            return HTTPStatus.OK, to_prometheus()
+
+        return HTTPStatus.NOT_FOUND, {"error": f"Unknown path {url.path}"}
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1")
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+
+            try:
+                method, target, _ = request_line.split(" ", 2)
+                status, body = await self.route(method, target)
+            except ValueError:
+                status, body = HTTPStatus.BAD_REQUEST, {"error": "Malformed request"}
+            except Exception as e:
+                swallowed("service.route", e)
+                status, body = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)}
+
+            if isinstance(body, str):
+                payload, content_type = body.encode("utf-8"), "text/plain; version=0.0.4"
+            else:
+                payload, content_type = json.dumps(body, ensure_ascii=False).encode("utf-8"), "application/json"
+
+            writer.write(
+                f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: {content_type}; charset=utf-8\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: close\r\n\r\n".encode("latin-1") + payload
+            )
+            await writer.drain()
+        except ConnectionError as e:
+            swallowed("service.handle", e)
+        finally:
+            writer.close()
+
+    async def serve(self, port=DEFAULT_PORT, host="127.0.0.1"):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Serving seat availability on http://{host}:{server.sockets[0].getsockname()[1]}/availability?city=...&movie=...")
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer seat availability queries over HTTP from a cache, scraping at most once per key at a time")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--max-age", type=float, default=DEFAULT_MAX_AGE, help="Serve cached answers up to this many seconds old (queries can pass max_age)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Scrapes running at once")
+    parser.add_argument("--search-cache", default=DEFAULT_CACHE_FILE)
+    add_ratelimit_arguments(parser)
+    add_clearance_arguments(parser)
+    args = parser.parse_args()
+
+    session = cloudscraper.create_scraper()
+    limiter = limiter_from_args(args)
+    if limiter is not None:
+        limiter.install(session)
+    clearance = clearance_from_args(args)
+    if clearance is not None:
+        clearance.apply_session(session)
+
+    search_cache = SearchCache(args.search_cache)
+    service = AvailabilityService(session, args.max_age, args.workers, search_cache)
+    try:
+        asyncio.run(service.serve(args.port, args.host))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+        search_cache.close()
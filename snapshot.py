@@ -0,0 +1,92 @@
+from bs4 import BeautifulSoup
+
+from metrics import on_reset, swallowed, timed
+
+
+GENERATION_JS = """
+    (function() {
+        if (!window.__bmsSnapshot) {
+            const state = {doc: Math.random().toString(36).slice(2), gen: 0};
+            new MutationObserver(function() {
+                state.gen++;
+            }).observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+            window.__bmsSnapshot = state;
+        }
+        return window.__bmsSnapshot.doc + ':' + window.__bmsSnapshot.gen;
+    })();
+"""
+
+stats = {
+    "html_hits": 0,
+    "html_misses": 0,
+    "soup_hits": 0,
+    "soup_misses": 0
+}
+
+
+@on_reset
+def reset_stats():
+    for name in stats:
+        stats[name] = 0
+
+
+class PageSnapshot:
+    def __init__(self, key, html):
+        self.key = key
+        self.html = html
+        self.soup = None
+
+
+async def get_generation(page):
+    try:
+        return await page.evaluate(GENERATION_JS)
+    except Exception as e:
+        swallowed("snapshot.generation", e)
+        return None
+
+
+async def get_snapshot(page):
+    key = await get_generation(page)
+    snapshot = getattr(page, "_bms_snapshot", None)
+
+    if key is not None and snapshot is not None and snapshot.key == key:
+        stats["html_hits"] += 1
+        return snapshot
+
+    stats["html_misses"] += 1
+    with timed("get_content"):
+        html = await page.get_content()
+    snapshot = PageSnapshot(key, html)
+
+    # A page without a generation counter cannot be validated later, so it is not cached.
+    if key is not None:
+        page._bms_snapshot = snapshot
+
+    return snapshot
+
+
+async def get_html(page):
+    return (await get_snapshot(page)).html
+
+
+async def get_soup(page):
+    snapshot = await get_snapshot(page)
+
+    if snapshot.soup is not None:
+        stats["soup_hits"] += 1
+    else:
+        stats["soup_misses"] += 1
+        with timed("parse"):
+            snapshot.soup = BeautifulSoup(snapshot.html, "html.parser")
+
+    return snapshot.soup
+
+
+def snapshot_stats():
+    html_total = stats["html_hits"] + stats["html_misses"]
+    soup_total = stats["soup_hits"] + stats["soup_misses"]
+    return dict(
+        stats,
+        html_hit_rate=stats["html_hits"] / html_total if html_total else 0.0,
+        soup_hit_rate=stats["soup_hits"] / soup_total if soup_total else 0.0
+    )
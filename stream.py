@@ -0,0 +1,116 @@
+import argparse
+import json
+import time
+
+from models import Movie, Showtime
+
+
+class NDJSONWriter:
+    def __init__(self, filename: str, mode="a"):
+        self.filename = filename
+        self._file = open(filename, mode, encoding="utf-8")
+
+    def write(self, record: dict):
+        self._file.write(json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def showtime_record(city: str, format_info: dict, cinema_name: str, showtime: Showtime, scraped_at=None) -> dict:
+    return {
+        "city": city,
+        "movie_type": format_info["dimension"],
+        "language": format_info["language"],
+        "event_code": format_info["eventCode"],
+        "cinema": cinema_name,
+        "time": showtime.time,
+        "available_seats": showtime.available_seats,
+        "blocked_seats": showtime.blocked_seats,
+        "total_seats": showtime.total_seats,
+        "session_id": showtime.session_id,
+        "date": showtime.date,
+        "scraped_at": scraped_at or time.time()
+    }
+
+
+def iter_ndjson(filename: str):
+    with open(filename, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # The last line of a stream cut off mid-write is skipped.
+                continue
+
+
+def read_stream(stream_file: str, city: str = None, event_codes=None) -> dict:
+    formats = {}
+
+    for record in iter_ndjson(stream_file):
+        if city is not None and record["city"] != city:
+            continue
+        if event_codes is not None and record["event_code"] not in event_codes:
+            continue
+        # Formats are keyed by city and event code too, so a stream holding several movies or cities never merges them.
+        cinemas = formats.setdefault((record["city"], record["event_code"], record["movie_type"], record["language"]), {})
+        showtimes = cinemas.setdefault(record["cinema"], {})
+        showtimes[record["time"]] = Showtime(record["time"], record["available_seats"], record["blocked_seats"], record["total_seats"], record.get("session_id"), record.get("date"))
+
+    return formats
+
+
+def fill_from_stream(movie: Movie, stream_file: str) -> Movie:
+    # The crawl keeps which cinemas it read but not their showtimes, which are read back from the stream here.
+    streamed = {
+        event_code: cinemas
+        for (_, event_code, _, _), cinemas in read_stream(stream_file, movie.city, {format.event_code for format in movie.formats}).items()
+    }
+    return movie._replace(formats=tuple(
+        format._replace(cinemas=tuple(
+            cinema._replace(showtimes=tuple(streamed.get(format.event_code, {}).get(cinema.name, {}).values())) if cinema.scraped else cinema
+            for cinema in format.cinemas
+        ))
+        for format in movie.formats
+    ))
+
+
+def compile_ndjson(stream_file: str, output_file="output.json", city: str = None, event_codes=None):
+    output_data = [
+        {
+            "movie_type": movie_type,
+            "language": language,
+            "cinemas": [
+                {"name": name, "showtimes": [showtime.to_dict() for showtime in showtimes.values()]}
+                for name, showtimes in cinemas.items()
+            ]
+        }
+        for (_, _, movie_type, language), cinemas in read_stream(stream_file, city, event_codes).items()
+    ]
+
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(output_data, f, indent=4, ensure_ascii=False)
+
+    print(f"Compiled {stream_file} into {output_file}")
+    return output_data
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile an NDJSON showtime stream into the nested output.json format")
+    parser.add_argument("stream_file")
+    parser.add_argument("output_file", nargs="?", default="output.json")
+    parser.add_argument("--city", help="Only compile showtimes for this city")
+    parser.add_argument("--event-code", action="append", dest="event_codes", help="Only compile showtimes for this event code (repeatable)")
+    args = parser.parse_args()
+
+    compile_ndjson(args.stream_file, args.output_file, args.city, args.event_codes)
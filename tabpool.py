@@ -0,0 +1,36 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from metrics import swallowed, timed
+from ratelimit import rate_limited
+
+
+DEFAULT_MAX_TABS = 4
+
+
+class TabPool:
+    def __init__(self, browser, size=DEFAULT_MAX_TABS, blocker=None, limiter=None):
+        self.browser = browser
+        self.size = size
+        self.blocker = blocker
+        self.limiter = limiter
+        self._semaphore = asyncio.Semaphore(size)
+
+    @asynccontextmanager
+    async def tab(self, url):
+        async with self._semaphore:
+            with timed("navigate"):
+                if self.blocker is not None:
+                    page = await rate_limited(self.limiter, lambda: self.blocker.open_tab(self.browser, url))
+                else:
+                    page = await rate_limited(self.limiter, lambda: self.browser.get(url, new_tab=True))
+            try:
+                yield page
+            finally:
+                try:
+                    await page.close()
+                except Exception as e:
+                    swallowed("tabpool.close", e)
+
+    async def map(self, func, items):
+        return await asyncio.gather(*(func(item) for item in items))
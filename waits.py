@@ -0,0 +1,144 @@
+import asyncio
+import json
+import time
+
+from metrics import inc, swallowed, timed
+
+
+POLL_INTERVAL = 0.1
+
+SELECTOR_TIMEOUT = 10
+URL_CHANGE_TIMEOUT = 10
+SEAT_TABLE_TIMEOUT = 15
+NETWORK_IDLE_TIMEOUT = 10
+NETWORK_IDLE_TIME = 0.5
+
+CINEMA_LIST_SELECTOR = ".sc-e8nk8f-3.hStBrg"
+TIME_SLOT_PAGE_SELECTOR = ".showtime-section, .more-shows, .slick-slide"
+# A deep-linked seat layout shows either the seat table or the seat quantity popup first.
+SEAT_LAYOUT_SELECTOR = "table.setmain, #proceed-Qty"
+
+SEAT_TABLE_JS = """
+    (function() {
+        const table = document.querySelector('table.setmain');
+        if (!table) {
+            return -1;
+        }
+        const seat = table.querySelector('a');
+        if (!seat || seat === window.__bmsStaleSeat) {
+            return -1;
+        }
+        return table.querySelectorAll('a._available, a._blocked').length;
+    })();
+"""
+
+MARK_SEAT_TABLE_JS = """
+    (function() {
+        window.__bmsStaleSeat = document.querySelector('table.setmain a');
+        return true;
+    })();
+"""
+
+RESOURCE_COUNT_JS = """
+    (function() {
+        if (document.readyState !== 'complete') {
+            return -1;
+        }
+        return performance.getEntriesByType('resource').length;
+    })();
+"""
+
+
+async def wait_until(predicate, timeout=SELECTOR_TIMEOUT, interval=POLL_INTERVAL):
+    deadline = time.monotonic() + timeout
+    with timed("wait"):
+        while True:
+            try:
+                if await predicate():
+                    inc("waits_total", result="ok")
+                    return True
+            except Exception as e:
+                swallowed("wait_until", e)
+
+            if time.monotonic() >= deadline:
+                inc("waits_total", result="timeout")
+                return False
+
+            await asyncio.sleep(interval)
+
+
+async def wait_for_expression(page, expression, timeout=SELECTOR_TIMEOUT):
+    async def predicate():
+        return bool(await page.evaluate(expression))
+
+    return await wait_until(predicate, timeout)
+
+
+async def wait_for_selector(page, selector, timeout=SELECTOR_TIMEOUT):
+    expression = f"!!document.querySelector({json.dumps(selector)})"
+    return await wait_for_expression(page, expression, timeout)
+
+
+async def get_url(page):
+    try:
+        return await page.evaluate("location.href")
+    except Exception as e:
+        swallowed("get_url", e)
+        return page.url
+
+
+async def wait_for_url_change(page, old_url, timeout=URL_CHANGE_TIMEOUT):
+    async def predicate():
+        return await get_url(page) != old_url
+
+    return await wait_until(predicate, timeout)
+
+
+async def wait_for_time_slot_page(page, old_url, timeout=URL_CHANGE_TIMEOUT):
+    if not await wait_for_url_change(page, old_url, timeout):
+        return False
+    return await wait_for_selector(page, TIME_SLOT_PAGE_SELECTOR, timeout)
+
+
+async def mark_seat_table(page):
+    try:
+        await page.evaluate(MARK_SEAT_TABLE_JS)
+    except Exception as e:
+        swallowed("mark_seat_table", e)
+
+
+async def wait_for_seat_table(page, timeout=SEAT_TABLE_TIMEOUT):
+    last_count = None
+
+    async def predicate():
+        nonlocal last_count
+        count = await page.evaluate(SEAT_TABLE_JS)
+        if count is None or count <= 0:
+            last_count = None
+            return False
+
+        # The table is filled in progressively, so wait for two equal polls.
+        stable = count == last_count
+        last_count = count
+        return stable
+
+    return await wait_until(predicate, timeout)
+
+
+async def wait_for_network_idle(page, idle_time=NETWORK_IDLE_TIME, timeout=NETWORK_IDLE_TIMEOUT):
+    last_count = None
+    idle_since = None
+
+    async def predicate():
+        nonlocal last_count, idle_since
+        count = await page.evaluate(RESOURCE_COUNT_JS)
+        now = time.monotonic()
+
+        if count is None or count < 0 or count != last_count:
+            last_count = count
+            idle_since = now
+            return False
+
+        return now - idle_since >= idle_time
+
+    return await wait_until(predicate, timeout)